@@ -2,10 +2,14 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 from config import Config
 from extensions import db
+from utils.compression import init_compression
+from utils.json_provider import FastJSONProvider
+from utils.timing import init_timing
 
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
+    app.json = FastJSONProvider(app)
     
     # Initialize extensions
     db.init_app(app)
@@ -15,11 +19,17 @@ def create_app(config_class=Config):
     CORS(app, 
          resources={r"/api/*": {"origins": "*"}},
          methods=["GET", "POST", "PUT", "DELETE", "PATCH", "OPTIONS"],
-         allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With"],
+         allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "X-Requested-With", "Idempotency-Key"],
          supports_credentials=True,
-         expose_headers=["Content-Type", "Authorization"]
+         expose_headers=["Content-Type", "Authorization", "X-OHLCV-Symbol", "X-OHLCV-Count", "X-OHLCV-Layout", "Idempotent-Replayed"]
     )
     
+    # Compress large responses (opt-in via COMPRESS_ENABLED)
+    init_compression(app)
+    
+    # Per-stage latency (Server-Timing header + histograms for /api/admin/latency)
+    init_timing(app)
+    
     # Register blueprints
     from routes.auth import auth_bp
     from routes.challenges import challenges_bp
@@ -134,7 +144,7 @@ def create_app(config_class=Config):
         }), 403
     
     # Import models to register them with SQLAlchemy
-    from models import User, Challenge, Trade, Payment, Portfolio
+    from models import User, Challenge, Trade, Payment, Portfolio, ChallengeDailyBalance, Position, Order, JobRun, IdempotencyKey, LeaderboardSnapshot, LeaderboardSnapshotMonth
     
     # Initialize database tables (deferred to first request in production)
     with app.app_context():
@@ -144,6 +154,29 @@ def create_app(config_class=Config):
         except Exception as e:
             print(f"Warning: Could not create database tables: {str(e)}")
     
+    # Background jobs: mark-to-market rule checks (opt-in via RISK_MONITOR_ENABLED),
+    # resting order triggers, the daily UTC rollover, the leaderboard reload and
+    # the monthly leaderboard freeze
+    if app.config.get('RISK_MONITOR_ENABLED'):
+        from services.risk_monitor import start_risk_monitor
+        start_risk_monitor(app)
+    if app.config.get('ORDER_TRIGGERS_ENABLED'):
+        from services.order_book import start_order_book
+        start_order_book(app)
+    if app.config.get('EOD_ROLLOVER_ENABLED'):
+        from services.eod_rollover import start_eod_rollover
+        start_eod_rollover(app)
+    if app.config.get('LEADERBOARD_ENABLED'):
+        from services.leaderboard import start_leaderboard
+        start_leaderboard(app)
+    if app.config.get('LEADERBOARD_SNAPSHOTS_ENABLED'):
+        from services.leaderboard_snapshots import start_leaderboard_snapshots
+        start_leaderboard_snapshots(app)
+    if app.config.get('RISK_MONITOR_ENABLED') or app.config.get('ORDER_TRIGGERS_ENABLED'):
+        from services.price_feed import start_price_poller
+        from routes.market import get_price_for_symbol
+        start_price_poller(get_price_for_symbol, app.config.get('PRICE_POLL_INTERVAL', 60))
+    
     return app
 
 
@@ -28,3 +28,45 @@ class Config:
     
     # CORS Origins
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS', 'http://localhost:5173,http://localhost:3000,http://localhost:3001').split(',')
+    
+    # Response compression (opt-in) for large JSON payloads
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'false').lower() == 'true'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))  # bytes
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))  # gzip 1-9
+    COMPRESS_BROTLI_LEVEL = int(os.environ.get('COMPRESS_BROTLI_LEVEL', 4))  # brotli 0-11
+    COMPRESS_MIMETYPES = ['application/json']
+    COMPRESS_CACHE_SIZE = 256  # compressed payloads kept in memory
+    
+    # Mark-to-market risk monitor (opt-in, one background thread per process)
+    RISK_MONITOR_ENABLED = os.environ.get('RISK_MONITOR_ENABLED', 'false').lower() == 'true'
+    RISK_MONITOR_INTERVAL = float(os.environ.get('RISK_MONITOR_INTERVAL', 1.0))  # min seconds between revaluations
+    RISK_MONITOR_RELOAD_SECONDS = float(os.environ.get('RISK_MONITOR_RELOAD_SECONDS', 300))  # full reload from DB
+    PRICE_POLL_INTERVAL = float(os.environ.get('PRICE_POLL_INTERVAL', 60))  # refresh of held symbols
+    
+    # Resting limit/stop/take-profit orders triggered by the price feed
+    # (opt-in: one fill thread per process, plus the price poller)
+    ORDER_TRIGGERS_ENABLED = os.environ.get('ORDER_TRIGGERS_ENABLED', 'false').lower() == 'true'
+    ORDER_BOOK_SYNC_SECONDS = float(os.environ.get('ORDER_BOOK_SYNC_SECONDS', 30))  # re-sync of pending orders from the DB
+    
+    # In-memory leaderboard: periodic rebuild from the DB, trade events in between
+    # (opt-in: one reload thread per process; without it the board is built on
+    # first use and rebuilt by the first read once older than LEADERBOARD_RELOAD_SECONDS)
+    LEADERBOARD_ENABLED = os.environ.get('LEADERBOARD_ENABLED', 'false').lower() == 'true'
+    LEADERBOARD_RELOAD_SECONDS = float(os.environ.get('LEADERBOARD_RELOAD_SECONDS', 300))
+    
+    # Idempotency-Key handling for trade execution and checkout
+    IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 3600))
+    IDEMPOTENCY_WAIT_SECONDS = 10  # how long a concurrent retry waits for the first request
+    IDEMPOTENCY_MAX_ENTRIES = 10000
+    
+    # Per-stage request timing in a Server-Timing response header (opt-in: it
+    # exposes internal stage timings; histograms are recorded either way)
+    SERVER_TIMING_ENABLED = os.environ.get('SERVER_TIMING_ENABLED', 'false').lower() == 'true'
+    
+    # Daily UTC rollover job (day-open snapshots + overnight rule checks);
+    # opt-in: one scheduler thread per process (runs are claimed, so one worker does the work)
+    EOD_ROLLOVER_ENABLED = os.environ.get('EOD_ROLLOVER_ENABLED', 'false').lower() == 'true'
+    
+    # Daily job freezing the final ranking of each closed month
+    # (opt-in: one scheduler thread per process; without it past months are ranked live)
+    LEADERBOARD_SNAPSHOTS_ENABLED = os.environ.get('LEADERBOARD_SNAPSHOTS_ENABLED', 'false').lower() == 'true'
@@ -11,7 +11,7 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
 from extensions import db
-from models import User, Challenge, Trade, Payment, Portfolio
+from models import User, Challenge, Trade, Payment, Portfolio, ChallengeDailyBalance, Position, Order, JobRun, IdempotencyKey, LeaderboardSnapshot, LeaderboardSnapshotMonth
 from werkzeug.security import generate_password_hash
 
 def init_database():
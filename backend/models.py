@@ -21,7 +21,7 @@ class User(db.Model):
             'id': self.id,
             'username': self.username,
             'email': self.email,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'created_at': self.created_at,
             'is_admin': self.is_admin,
             'is_superadmin': self.is_superadmin
         }
@@ -32,6 +32,9 @@ class User(db.Model):
 
 class Challenge(db.Model):
     __tablename__ = 'challenges'
+    __table_args__ = (
+        db.Index('ix_challenges_created_at_status', 'created_at', 'status'),  # monthly leaderboard range scans
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -49,6 +52,9 @@ class Challenge(db.Model):
     # Relationships
     trades = db.relationship('Trade', backref='challenge', lazy=True, cascade='all, delete-orphan', order_by='Trade.created_at.desc()')
     payments = db.relationship('Payment', backref='challenge', lazy=True)
+    daily_balances = db.relationship('ChallengeDailyBalance', backref='challenge', lazy=True, cascade='all, delete-orphan')
+    positions = db.relationship('Position', backref='challenge', lazy=True, cascade='all, delete-orphan')
+    orders = db.relationship('Order', backref='challenge', lazy=True, cascade='all, delete-orphan')
     
     def to_dict(self):
         return {
@@ -61,8 +67,8 @@ class Challenge(db.Model):
             'max_daily_loss_percent': self.max_daily_loss_percent,
             'max_total_loss_percent': self.max_total_loss_percent,
             'profit_target_percent': self.profit_target_percent,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'ended_at': self.ended_at.isoformat() if self.ended_at else None,
+            'created_at': self.created_at,
+            'ended_at': self.ended_at,
             'failure_reason': self.failure_reason,
             'total_pnl': self.current_balance - self.starting_balance,
             'total_pnl_percent': ((self.current_balance - self.starting_balance) / self.starting_balance * 100) if self.starting_balance > 0 else 0
@@ -74,6 +80,9 @@ class Challenge(db.Model):
 
 class Trade(db.Model):
     __tablename__ = 'trades'
+    __table_args__ = (
+        db.Index('ix_trades_challenge_id_created_at_id', 'challenge_id', 'created_at', 'id'),  # history scans and keyset pages
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id'), nullable=False, index=True)
@@ -86,6 +95,20 @@ class Trade(db.Model):
     profit_loss = db.Column(db.Float, default=0.0)  # P&L for this trade
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
     
+    # Fields of to_dict(), in order; listings select these columns and
+    # serialize the rows directly instead of loading Trade objects
+    DICT_FIELDS = ('id', 'challenge_id', 'symbol', 'action', 'quantity', 'price',
+                   'total_value', 'balance_after_trade', 'profit_loss', 'created_at')
+    
+    @classmethod
+    def dict_columns(cls):
+        return [getattr(cls, field) for field in cls.DICT_FIELDS]
+    
+    @classmethod
+    def row_to_dict(cls, row):
+        """Serialize a row selected with dict_columns() like to_dict()"""
+        return dict(zip(cls.DICT_FIELDS, row))
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -97,13 +120,232 @@ class Trade(db.Model):
             'total_value': self.total_value,
             'balance_after_trade': self.balance_after_trade,
             'profit_loss': self.profit_loss,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
     
     def __repr__(self):
         return f'<Trade {self.id} - {self.symbol} - {self.action}>'
 
 
+class Position(db.Model):
+    """Open position of a challenge in one symbol, updated incrementally on each trade"""
+    __tablename__ = 'positions'
+    __table_args__ = (
+        db.UniqueConstraint('challenge_id', 'symbol', name='uq_positions_challenge_symbol'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id', ondelete='CASCADE'), nullable=False, index=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    quantity = db.Column(db.Float, default=0.0, nullable=False)  # Signed: negative for a short position
+    avg_cost = db.Column(db.Float, default=0.0, nullable=False)  # Average entry price of the open quantity
+    realized_pnl = db.Column(db.Float, default=0.0, nullable=False)  # Cumulative realized P&L in this symbol
+    opened_at = db.Column(db.DateTime, nullable=True)  # When the current open quantity was established
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'challenge_id': self.challenge_id,
+            'symbol': self.symbol,
+            'quantity': self.quantity,
+            'avg_cost': self.avg_cost,
+            'cost_basis': round(self.quantity * self.avg_cost, 2),
+            'realized_pnl': self.realized_pnl,
+            'opened_at': self.opened_at,
+            'updated_at': self.updated_at
+        }
+    
+    def __repr__(self):
+        return f'<Position {self.challenge_id} - {self.symbol} - {self.quantity}>'
+
+
+class Order(db.Model):
+    """Resting limit / stop / take-profit order, executed as a market trade once triggered"""
+    __tablename__ = 'orders'
+    __table_args__ = (
+        db.Index('ix_orders_status_symbol', 'status', 'symbol'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id', ondelete='CASCADE'), nullable=False, index=True)
+    symbol = db.Column(db.String(20), nullable=False)
+    action = db.Column(db.String(10), nullable=False)  # 'buy' or 'sell'
+    order_type = db.Column(db.String(20), nullable=False)  # 'limit', 'stop', 'take_profit'
+    quantity = db.Column(db.Float, nullable=False)
+    trigger_price = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20), default='pending', nullable=False)  # 'pending', 'filled', 'rejected', 'cancelled'
+    trade_id = db.Column(db.Integer, db.ForeignKey('trades.id', ondelete='SET NULL'), nullable=True)
+    fill_price = db.Column(db.Float, nullable=True)
+    reject_reason = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    triggered_at = db.Column(db.DateTime, nullable=True)
+    closed_at = db.Column(db.DateTime, nullable=True)  # Filled, rejected or cancelled
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'challenge_id': self.challenge_id,
+            'symbol': self.symbol,
+            'action': self.action,
+            'order_type': self.order_type,
+            'quantity': self.quantity,
+            'trigger_price': self.trigger_price,
+            'status': self.status,
+            'trade_id': self.trade_id,
+            'fill_price': self.fill_price,
+            'reject_reason': self.reject_reason,
+            'created_at': self.created_at,
+            'triggered_at': self.triggered_at,
+            'closed_at': self.closed_at
+        }
+    
+    def __repr__(self):
+        return f'<Order {self.id} - {self.order_type} {self.action} {self.symbol} @ {self.trigger_price}>'
+
+
+class ChallengeDailyBalance(db.Model):
+    """
+    Per-challenge, per-UTC-day balance rollup (OHLC, trade count, volume)
+    maintained as trades are written; also serves the daily equity curve
+    """
+    __tablename__ = 'challenge_daily_balances'
+    __table_args__ = (
+        db.UniqueConstraint('challenge_id', 'day', name='uq_challenge_daily_balances_challenge_day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    challenge_id = db.Column(db.Integer, db.ForeignKey('challenges.id', ondelete='CASCADE'), nullable=False, index=True)
+    day = db.Column(db.Date, nullable=False)  # UTC day
+    open_balance = db.Column(db.Float, nullable=False)  # Balance at the start of the day
+    high_balance = db.Column(db.Float, nullable=False)  # Highest balance reached during the day
+    low_balance = db.Column(db.Float, nullable=False)  # Lowest balance reached during the day
+    close_balance = db.Column(db.Float, nullable=False)  # Balance after the latest trade of the day
+    trade_count = db.Column(db.Integer, default=0, nullable=False)
+    volume = db.Column(db.Float, default=0.0, nullable=False)  # Sum of trade total_value
+    # Equity (cash + positions at market) at the day's opening mark, set by the risk monitor
+    open_equity = db.Column(db.Float, nullable=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'challenge_id': self.challenge_id,
+            'day': self.day,
+            'open_balance': self.open_balance,
+            'high_balance': self.high_balance,
+            'low_balance': self.low_balance,
+            'close_balance': self.close_balance,
+            'trade_count': self.trade_count,
+            'volume': self.volume,
+        }
+    
+    def __repr__(self):
+        return f'<ChallengeDailyBalance {self.challenge_id} - {self.day}>'
+
+
+class LeaderboardSnapshot(db.Model):
+    """Final monthly leaderboard ranking, frozen when the month closes"""
+    __tablename__ = 'leaderboard_snapshots'
+    __table_args__ = (
+        db.UniqueConstraint('month', 'rank', name='uq_leaderboard_snapshots_month_rank'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, nullable=False)  # first day of the UTC month
+    rank = db.Column(db.Integer, nullable=False)
+    # No foreign keys: the ranking outlives deleted users and challenges
+    challenge_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(80), nullable=True)
+    plan_type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # status when the month closed
+    starting_balance = db.Column(db.Float, nullable=False)
+    current_balance = db.Column(db.Float, nullable=False)  # balance when the month closed
+    profit_percent = db.Column(db.Float, nullable=False)
+    frozen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'rank': self.rank,
+            'user_id': self.user_id,
+            'username': self.username,
+            'challenge_id': self.challenge_id,
+            'profit_percent': round(self.profit_percent, 2),
+            'starting_balance': round(self.starting_balance, 2),
+            'current_balance': round(self.current_balance, 2),
+            'status': self.status,
+            'plan_type': self.plan_type,
+        }
+    
+    def __repr__(self):
+        return f'<LeaderboardSnapshot {self.month} #{self.rank} - {self.challenge_id}>'
+
+
+class LeaderboardSnapshotMonth(db.Model):
+    """A frozen month of leaderboard_snapshots (recorded even when the month ranked no one)"""
+    __tablename__ = 'leaderboard_snapshot_months'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    month = db.Column(db.Date, unique=True, nullable=False)  # first day of the UTC month
+    rows = db.Column(db.Integer, default=0, nullable=False)  # snapshot rows frozen
+    frozen_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<LeaderboardSnapshotMonth {self.month} - {self.rows} rows>'
+
+
+class JobRun(db.Model):
+    """Claim/record of one run of a scheduled job, shared by all workers"""
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        db.UniqueConstraint('job_name', 'run_key', name='uq_job_runs_job_run_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    job_name = db.Column(db.String(50), nullable=False)
+    run_key = db.Column(db.String(50), nullable=False)  # e.g., the UTC day for a daily job
+    status = db.Column(db.String(20), default='running', nullable=False)  # 'running', 'completed', 'failed'
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    details = db.Column(db.Text, nullable=True)  # JSON result or error message
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_name': self.job_name,
+            'run_key': self.run_key,
+            'status': self.status,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'details': self.details
+        }
+    
+    def __repr__(self):
+        return f'<JobRun {self.job_name} {self.run_key} - {self.status}>'
+
+
+class IdempotencyKey(db.Model):
+    """Claim and stored response of an Idempotency-Key, shared by all workers"""
+    __tablename__ = 'idempotency_keys'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'endpoint', 'idempotency_key', name='uq_idempotency_keys_user_endpoint_key'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)  # 0 when unauthenticated; no FK, rows expire anyway
+    endpoint = db.Column(db.String(255), nullable=False)  # request path
+    idempotency_key = db.Column(db.String(255), nullable=False)
+    fingerprint = db.Column(db.String(64), nullable=False)  # SHA-256 of the request body
+    status = db.Column(db.String(20), default='running', nullable=False)  # 'running', 'done'
+    response_status = db.Column(db.Integer, nullable=True)
+    response_body = db.Column(db.Text, nullable=True)  # JSON
+    response_headers = db.Column(db.Text, nullable=True)  # JSON
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    
+    def __repr__(self):
+        return f'<IdempotencyKey {self.user_id} {self.endpoint} {self.idempotency_key} - {self.status}>'
+
+
 class Payment(db.Model):
     __tablename__ = 'payments'
     
@@ -127,7 +369,7 @@ class Payment(db.Model):
             'payment_method': self.payment_method,
             'status': self.status,
             'transaction_id': self.transaction_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
+            'created_at': self.created_at
         }
     
     def __repr__(self):
@@ -150,5 +392,5 @@ class Portfolio(db.Model):
             'symbol': self.symbol,
             'quantity': self.quantity,
             'avg_price': self.avg_price,
-            'last_updated': self.last_updated.isoformat() if self.last_updated else None
+            'last_updated': self.last_updated
         }
@@ -1,6 +1,7 @@
 # Legacy routes module - kept for backward compatibility
 from flask import Blueprint
 from flask_restful import Api
+from utils.json_provider import output_json
 from .market_data import MarketData, SymbolSearch
 from .portfolio import PortfolioList, PortfolioDetail
 
@@ -11,6 +12,8 @@ portfolio_bp = Blueprint('portfolio', __name__)
 # Create API instances for each blueprint
 market_data_api = Api(market_data_bp)
 portfolio_api = Api(portfolio_bp)
+market_data_api.representation('application/json')(output_json)
+portfolio_api.representation('application/json')(output_json)
 
 # Register routes
 market_data_api.add_resource(MarketData, '/<string:symbol>')
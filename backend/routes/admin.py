@@ -1,10 +1,27 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from functools import wraps
+import math
+from datetime import date, datetime
 from models import db, User, Challenge
+from utils.timing import BUCKET_BOUNDS_MS, get_stage_histograms, reset_stage_histograms
+from services.replay import replay_challenges, DEFAULT_CHUNK_SIZE
+from services.eod_rollover import JOB_NAME as EOD_ROLLOVER_JOB, rollover_day
+from services.scheduler import run_claimed
+from services.challenge_cache import bump_challenge_version
+from services.trade_export import EXPORT_FORMATS, stream_trade_export
+from services.leaderboard_snapshots import closed_month, freeze_month
+from services.ledger import amend_trade, delete_trade
 
 admin_bp = Blueprint('admin', __name__)
 
+# HTTP status for ledger errors (anything else is a 400)
+LEDGER_ERROR_STATUS = {
+    'Trade not found': 404,
+    'Challenge not found': 404,
+    'Trade failed': 500,
+}
+
 
 def admin_required(fn):
     """Decorator to restrict access to admin users only"""
@@ -58,7 +75,7 @@ def get_all_users():
                 'username': user.username,
                 'email': user.email,
                 'is_admin': user.is_admin,
-                'created_at': user.created_at.isoformat() if user.created_at else None,
+                'created_at': user.created_at,
                 'challenges': [{
                     'id': c.id,
                     'plan_type': c.plan_type,
@@ -69,8 +86,8 @@ def get_all_users():
                     'max_loss_limit': c.max_total_loss_percent,
                     'daily_loss_limit': c.max_daily_loss_percent,
                     'profit_percent': ((c.current_balance - c.starting_balance) / c.starting_balance * 100) if c.starting_balance else 0,
-                    'created_at': c.created_at.isoformat() if c.created_at else None,
-                    'updated_at': c.ended_at.isoformat() if c.ended_at else None,
+                    'created_at': c.created_at,
+                    'updated_at': c.ended_at,
                 } for c in challenges]
             }
             
@@ -137,8 +154,8 @@ def get_all_challenges():
                 'max_loss_limit': challenge.max_total_loss_percent,
                 'daily_loss_limit': challenge.max_daily_loss_percent,
                 'profit_percent': ((challenge.current_balance - challenge.starting_balance) / challenge.starting_balance * 100) if challenge.starting_balance else 0,
-                'created_at': challenge.created_at.isoformat() if challenge.created_at else None,
-                'updated_at': challenge.ended_at.isoformat() if challenge.ended_at else None,
+                'created_at': challenge.created_at,
+                'updated_at': challenge.ended_at,
             })
         
         return jsonify({
@@ -176,6 +193,7 @@ def update_challenge_status(challenge_id):
         challenge.status = new_status
         
         db.session.commit()
+        bump_challenge_version(challenge.id)
         
         # Get user info for response
         user = User.query.get(challenge.user_id)
@@ -189,7 +207,7 @@ def update_challenge_status(challenge_id):
                 'username': user.username if user else 'Unknown',
                 'status': challenge.status,
                 'current_balance': challenge.current_balance,
-                'updated_at': challenge.updated_at.isoformat() if challenge.updated_at else None,
+                'updated_at': challenge.updated_at,
             }
         })
         
@@ -239,3 +257,173 @@ def get_admin_stats():
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/latency', methods=['GET'])
+@admin_required
+def get_latency_histograms():
+    """
+    Per-stage latency histograms (ms) by endpoint.
+    Stages: auth, price:<source>, db, rules, serialize, total.
+    Optional ?endpoint= filter (e.g. trades_new.executetrade).
+    """
+    endpoint = request.args.get('endpoint', '').strip() or None
+    return jsonify({
+        'success': True,
+        'bucket_bounds_ms': list(BUCKET_BOUNDS_MS),
+        'endpoints': get_stage_histograms(endpoint),
+    })
+
+
+@admin_bp.route('/latency', methods=['DELETE'])
+@admin_required
+def reset_latency_histograms():
+    """Clear the latency histograms of this process"""
+    reset_stage_histograms()
+    return jsonify({'success': True, 'message': 'Latency histograms reset'})
+
+
+@admin_bp.route('/replay', methods=['POST'])
+@admin_required
+def replay_challenge_rules():
+    """
+    Dry-run the challenge rules over the stored trade history.
+    Body (all optional):
+        challenge_ids: list of ids (default: all challenges)
+        status: only challenges currently in this status
+        rules: 'stored' (default) or 'plan_config' to apply the current PLAN_CONFIG
+        overrides: {plan_type: {max_daily_loss_percent, max_total_loss_percent, profit_target_percent}}
+        limit: max changes listed (default 1000)
+    Returns the challenges whose status would change, stored pass/fail decisions
+    the rules do not reproduce (possibly made outside the trade path) and counts
+    of skipped statuses (e.g. 'pending'); nothing is written.
+    """
+    from routes.challenges.challenges import PLAN_CONFIG
+
+    data = request.get_json(silent=True) or {}
+    challenge_ids = data.get('challenge_ids')
+    if challenge_ids is not None and (not isinstance(challenge_ids, list)
+                                      or not all(isinstance(i, int) for i in challenge_ids)):
+        return jsonify({'error': 'challenge_ids must be a list of integers'}), 400
+
+    rules = data.get('rules', 'stored')
+    if rules not in ('stored', 'plan_config'):
+        return jsonify({'error': "rules must be 'stored' or 'plan_config'"}), 400
+    rules_by_plan = {plan: dict(config) for plan, config in PLAN_CONFIG.items()} if rules == 'plan_config' else {}
+    for plan, fields in (data.get('overrides') or {}).items():
+        rules_by_plan.setdefault(plan, {}).update(fields or {})
+
+    try:
+        report = replay_challenges(
+            challenge_ids=challenge_ids,
+            status=data.get('status') or None,
+            rules_by_plan=rules_by_plan,
+            chunk_size=DEFAULT_CHUNK_SIZE,
+            limit=int(data.get('limit', 1000)),
+        )
+        return jsonify({'success': True, **report})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+
+@admin_bp.route('/rollover', methods=['POST'])
+@admin_required
+def run_day_rollover():
+    """
+    Run today's end-of-day rollover now (normally scheduled at 00:00 UTC).
+    Returns 409 if it already ran (or is running) on any worker.
+    """
+    now = datetime.utcnow()
+    try:
+        result = run_claimed(EOD_ROLLOVER_JOB, now.date().isoformat(), lambda: rollover_day(now))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    if result is None:
+        return jsonify({'error': 'Rollover already ran today', 'day': now.date().isoformat()}), 409
+    return jsonify({'success': True, 'result': result})
+
+
+@admin_bp.route('/leaderboard/snapshots', methods=['POST'])
+@admin_required
+def freeze_leaderboard_month():
+    """
+    Freeze the leaderboard of the month that just closed now (normally done on the
+    1st at 00:05 UTC). Body: {"year": 2026, "month": 9}. Older months are refused:
+    their balances have moved on since they closed, so a freeze would not be their
+    final ranking. Freezing an already frozen month changes nothing.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        month = date(int(data['year']), int(data['month']), 1)
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'error': 'year and month are required'}), 400
+    closed = closed_month(datetime.utcnow().date())
+    if month != closed:
+        return jsonify({'error': 'Only the month that just closed can be frozen', 'month': closed.isoformat()}), 400
+    try:
+        result = freeze_month(month)
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+    return jsonify({'success': True, 'result': result})
+
+
+@admin_bp.route('/trades/<int:trade_id>', methods=['DELETE'])
+@admin_required
+def delete_ledger_trade(trade_id):
+    """Delete a trade; later balances, rollups, the symbol's position and the challenge balance are rebalanced."""
+    result = delete_trade(trade_id)
+    if 'error' in result:
+        return jsonify(result), LEDGER_ERROR_STATUS.get(result['error'], 400)
+    return jsonify({'success': True, 'result': result})
+
+
+@admin_bp.route('/trades/<int:trade_id>', methods=['PATCH'])
+@admin_required
+def amend_ledger_trade(trade_id):
+    """
+    Amend a trade's quantity and/or price; the ledger after it is rebalanced.
+    Body: {"quantity": 5, "price": 101.5} (either may be omitted).
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        quantity = float(data['quantity']) if data.get('quantity') is not None else None
+        price = float(data['price']) if data.get('price') is not None else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'quantity and price must be numbers'}), 400
+    if any(value is not None and not math.isfinite(value) for value in (quantity, price)):
+        return jsonify({'error': 'quantity and price must be finite numbers'}), 400
+
+    result = amend_trade(trade_id, quantity=quantity, price=price)
+    if 'error' in result:
+        return jsonify(result), LEDGER_ERROR_STATUS.get(result['error'], 400)
+    return jsonify({'success': True, 'result': result})
+
+
+@admin_bp.route('/trades/export', methods=['GET'])
+@admin_required
+def export_all_trades():
+    """
+    Stream the trade ledger of all challenges (ordered by challenge, then time).
+    Query params (all optional):
+        format: csv (default) or ndjson
+        challenge_ids: comma-separated ids
+        status: only challenges currently in this status
+    """
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    challenge_ids = None
+    if request.args.get('challenge_ids'):
+        try:
+            challenge_ids = [int(i) for i in request.args['challenge_ids'].split(',')]
+        except ValueError:
+            return jsonify({'error': 'challenge_ids must be comma-separated integers'}), 400
+
+    return Response(
+        stream_with_context(stream_trade_export(fmt, challenge_ids, request.args.get('status') or None)),
+        mimetype=EXPORT_FORMATS[fmt],
+        headers={'Content-Disposition': f'attachment; filename="trades-{datetime.utcnow():%Y%m%d}.{fmt}"'},
+    )
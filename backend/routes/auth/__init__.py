@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from utils.json_provider import output_json
 from .auth import Register, Login, Logout, UserProfile, RefreshToken, Me
 
 # Create blueprint
@@ -7,6 +8,7 @@ auth_bp = Blueprint('auth', __name__)
 
 # Create API instance
 auth_api = Api(auth_bp)
+auth_api.representation('application/json')(output_json)
 
 # Register routes
 auth_api.add_resource(Register, '/register')
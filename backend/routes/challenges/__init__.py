@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from utils.json_provider import output_json
 from .challenges import ChallengeList, ChallengeDetail, CreateChallenge, StartChallenge
 
 # Create blueprint
@@ -7,6 +8,7 @@ challenges_bp = Blueprint('challenges', __name__)
 
 # Create API instance
 challenges_api = Api(challenges_bp)
+challenges_api.representation('application/json')(output_json)
 
 # Register routes
 challenges_api.add_resource(ChallengeList, '')
@@ -2,6 +2,7 @@ from flask_restful import Resource
 from flask import request, g
 from extensions import db
 from models import Challenge
+from services.challenge_cache import bump_challenge_version
 from utils.auth_utils import token_required
 
 # Plan configurations
@@ -72,6 +73,7 @@ class ChallengeList(Resource):
         try:
             db.session.add(challenge)
             db.session.commit()
+            bump_challenge_version(challenge.id)
             return {
                 'message': 'Challenge created successfully',
                 'challenge': challenge.to_dict()
@@ -113,6 +115,7 @@ class ChallengeDetail(Resource):
         
         try:
             db.session.commit()
+            bump_challenge_version(challenge.id)
             return {'message': 'Challenge updated', 'challenge': challenge.to_dict()}, 200
         except Exception as e:
             db.session.rollback()
@@ -130,6 +133,7 @@ class ChallengeDetail(Resource):
         try:
             db.session.delete(challenge)
             db.session.commit()
+            bump_challenge_version(challenge_id)
             return {'message': 'Challenge deleted successfully'}, 200
         except Exception as e:
             db.session.rollback()
@@ -172,6 +176,7 @@ class CreateChallenge(Resource):
         try:
             db.session.add(challenge)
             db.session.commit()
+            bump_challenge_version(challenge.id)
             return {
                 'message': 'Challenge created successfully',
                 'challenge': challenge.to_dict()
@@ -202,6 +207,7 @@ class StartChallenge(Resource):
         
         try:
             db.session.commit()
+            bump_challenge_version(challenge.id)
             return {
                 'message': 'Challenge started successfully',
                 'challenge': challenge.to_dict()
@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from utils.json_provider import output_json
 from .leaderboard import LeaderboardList, LeaderboardTop, UserRanking, MonthlyLeaderboard
 
 # Create blueprint
@@ -7,6 +8,7 @@ leaderboard_bp = Blueprint('leaderboard', __name__)
 
 # Create API instance
 leaderboard_api = Api(leaderboard_bp)
+leaderboard_api.representation('application/json')(output_json)
 
 # Register routes
 leaderboard_api.add_resource(LeaderboardList, '')
@@ -1,9 +1,12 @@
 from flask_restful import Resource
 from flask import request
-from sqlalchemy import func, case, extract
-from datetime import datetime
-from extensions import db
-from models import Challenge, User
+from datetime import date, datetime
+from routes.challenges.challenges import PLAN_CONFIG
+from services.leaderboard import PERIODS, get_leaderboard
+from services.leaderboard_snapshots import live_ranking, month_start, snapshot_ranking
+from utils.pagination import decode_rank_cursor, encode_rank_cursor
+
+MAX_LEADERBOARD_LIMIT = 100
 
 
 def _calculate_profit_percent(starting_balance, current_balance):
@@ -13,99 +16,124 @@ def _calculate_profit_percent(starting_balance, current_balance):
     return 0.0
 
 
+def _page_args():
+    """(offset, limit) from the query string, clamped to sane bounds."""
+    offset = max(request.args.get('offset', 0, type=int) or 0, 0)
+    limit = min(max(request.args.get('limit', 10, type=int) or 10, 1), MAX_LEADERBOARD_LIMIT)
+    return offset, limit
+
+
+def _dimension_args():
+    """(period, plan) from the query string; raises ValueError on unknown values."""
+    period = request.args.get('period', 'all')
+    plan = request.args.get('plan') or None
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}")
+    if plan is not None and plan not in PLAN_CONFIG:
+        raise ValueError(f"plan must be one of: {', '.join(PLAN_CONFIG)}")
+    return period, plan
+
+
 class LeaderboardList(Resource):
-    """Get leaderboard endpoint"""
+    """
+    GET /api/leaderboard?period=week|month|all&plan=Starter|Pro|Elite&limit=10&cursor=...
+    Active and passed challenges created this UTC week / this UTC month / ever
+    (default), optionally of one plan, ranked by profit percent from the
+    in-memory leaderboard. Follow next_cursor for the next page; offset=N
+    jumps to rank N+1 instead.
+    """
     def get(self):
-        return {'message': 'Leaderboard list endpoint - to be implemented'}, 200
+        offset, limit = _page_args()
+        try:
+            period, plan = _dimension_args()
+            cursor = request.args.get('cursor')
+            after = decode_rank_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        board = get_leaderboard()
+        rows, total, last = board.page(offset, limit, period, plan, after=after)
+        board.resolve_usernames(rows)
+        return {
+            'period': period,
+            'plan': plan,
+            'leaderboard': rows,
+            'count': len(rows),
+            'offset': rows[0]['rank'] - 1 if rows else offset,
+            'total': total,
+            'next_cursor': encode_rank_cursor(*last) if last else None,
+            'has_more': last is not None,
+        }, 200
 
 
 class LeaderboardTop(Resource):
-    """Get top performers endpoint"""
+    """
+    GET /api/leaderboard/top?limit=10&period=all&plan=
+    Top performers of a dimension from the in-memory leaderboard.
+    """
     def get(self):
-        query_params = request.args
-        limit = query_params.get('limit', 10, type=int)
-        return {'message': f'Top performers endpoint - to be implemented (limit: {limit})'}, 200
+        _, limit = _page_args()
+        try:
+            period, plan = _dimension_args()
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        board = get_leaderboard()
+        rows, total, _ = board.page(0, limit, period, plan)
+        board.resolve_usernames(rows)
+        return {'period': period, 'plan': plan, 'leaderboard': rows, 'count': len(rows), 'total': total}, 200
 
 
 class UserRanking(Resource):
-    """Get user ranking endpoint"""
+    """
+    GET /api/leaderboard/user/<user_id>?period=all&plan=
+    Rank of the user's best active or passed challenge in a dimension.
+    """
     def get(self, user_id):
-        return {'message': f'User ranking endpoint - to be implemented for user {user_id}'}, 200
+        try:
+            period, plan = _dimension_args()
+        except ValueError as e:
+            return {'error': str(e)}, 400
+        board = get_leaderboard()
+        row = board.user_rank(user_id, period, plan)
+        if row is None:
+            return {'error': 'User not ranked', 'message': f'User {user_id} has no ranked challenge for this period and plan'}, 404
+        board.resolve_usernames([row])
+        return row, 200
 
 
 class MonthlyLeaderboard(Resource):
     """
-    GET /api/leaderboard/monthly
-    
-    Returns top 10 performers for the current month.
-    - Queries challenges with status "passed" or "active"
-    - Calculates profit percentage
-    - Joins with users table to get usernames
-    - Orders by profit_percent DESC
-    - Filters by current month only
+    GET /api/leaderboard/monthly?year=2026&month=9&limit=10
+
+    Top performers among the challenges created in a UTC month (default: the
+    current month), by profit percent.
+    - Open months are ranked live from current balances
+    - Closed months are read from the ranking frozen when they closed
+      (falls back to a live ranking until the freeze job has run)
     """
     def get(self):
-        # Get current month and year
-        now = datetime.utcnow()
-        current_month = now.month
-        current_year = now.year
-
-        # Optional query params
-        limit = request.args.get('limit', 10, type=int)
-        
-        # SQLAlchemy ORM query with join, filter, and calculated profit_percent
-        # Calculate profit_percent as a computed column
-        profit_percent_expr = case(
-            (Challenge.starting_balance > 0,
-             ((Challenge.current_balance - Challenge.starting_balance) / Challenge.starting_balance) * 100),
-            else_=0.0
-        ).label('profit_percent')
-
-        # Query challenges joined with users, filtered by current month and status
-        query = db.session.query(
-            User.id.label('user_id'),
-            User.username,
-            Challenge.id.label('challenge_id'),
-            Challenge.starting_balance,
-            Challenge.current_balance,
-            Challenge.status,
-            Challenge.plan_type,
-            Challenge.created_at,
-            profit_percent_expr
-        ).join(
-            User, Challenge.user_id == User.id
-        ).filter(
-            Challenge.status.in_(['passed', 'active']),
-            extract('month', Challenge.created_at) == current_month,
-            extract('year', Challenge.created_at) == current_year
-        ).order_by(
-            profit_percent_expr.desc()
-        ).limit(limit)
-
-        results = query.all()
-
-        # Build response with rank
-        leaderboard = []
-        for rank, row in enumerate(results, start=1):
-            leaderboard.append({
-                'rank': rank,
-                'user_id': row.user_id,
-                'username': row.username,
-                'challenge_id': row.challenge_id,
-                'profit_percent': round(row.profit_percent, 2),
-                'starting_balance': round(row.starting_balance, 2),
-                'current_balance': round(row.current_balance, 2),
-                'status': row.status,
-                'plan_type': row.plan_type,
-            })
+        today = datetime.utcnow().date()
+        year = request.args.get('year', today.year, type=int)
+        month_number = request.args.get('month', today.month, type=int)
+        if not 1 <= month_number <= 12 or not 1 <= year <= 9999:
+            return {'error': 'Invalid period', 'message': 'month must be 1-12 and year a valid year'}, 400
+        limit = min(max(request.args.get('limit', 10, type=int) or 10, 1), MAX_LEADERBOARD_LIMIT)
+
+        month = date(year, month_number, 1)
+        leaderboard = None
+        if month < month_start(today):
+            leaderboard = snapshot_ranking(month, limit)
+        frozen = leaderboard is not None
+        if not frozen:
+            leaderboard = live_ranking(month, limit)
 
         return {
             'period': {
-                'month': current_month,
-                'year': current_year,
-                'month_name': now.strftime('%B'),
+                'month': month.month,
+                'year': month.year,
+                'month_name': month.strftime('%B'),
             },
             'leaderboard': leaderboard,
             'count': len(leaderboard),
+            'frozen': frozen,
         }, 200
-
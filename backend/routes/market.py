@@ -3,15 +3,23 @@ Market Routes
 Unified API for fetching market prices from both Moroccan and International stocks.
 Includes caching to handle Yahoo Finance rate limiting.
 """
-from flask import Blueprint, request, jsonify
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable
+
+from flask import Blueprint, request, jsonify, Response
 from services.morocco_scraper import scrape_morocco_stock, MOROCCO_STOCKS
 from services.market_data import get_realtime_price, get_cache_stats, clear_price_cache, get_historical_data
+from services.ohlcv import HISTORY_FORMATS, BINARY_LAYOUT, pack_columnar
+from services.symbol_index import search_symbols
 
 market_bp = Blueprint('market', __name__)
 
 # List of known Moroccan stock symbols
 MOROCCAN_SYMBOLS = set(MOROCCO_STOCKS.keys())
 
+# Upper bound on concurrent upstream fetches for one batched price lookup
+MAX_PRICE_FETCH_WORKERS = 8
+
 
 def is_moroccan_stock(symbol: str) -> bool:
     """
@@ -85,6 +93,27 @@ def get_price_for_symbol(symbol: str) -> dict:
         }
 
 
+def get_prices_for_symbols(symbols: Iterable[str]) -> Dict[str, dict]:
+    """
+    Get prices for several symbols in one batched lookup.
+    Symbols are de-duplicated; cached quotes return immediately and cache
+    misses are fetched concurrently instead of one after another.
+    
+    Args:
+        symbols: Stock symbols (any case)
+    
+    Returns:
+        Dict mapping each upper-cased symbol to its unified price data
+        (or an error dict, as returned by get_price_for_symbol)
+    """
+    unique = list(dict.fromkeys(s.upper().strip() for s in symbols if s and s.strip()))
+    if len(unique) <= 1:
+        return {symbol: get_price_for_symbol(symbol) for symbol in unique}
+    
+    with ThreadPoolExecutor(max_workers=min(MAX_PRICE_FETCH_WORKERS, len(unique))) as executor:
+        return dict(zip(unique, executor.map(get_price_for_symbol, unique)))
+
+
 @market_bp.route('/price/<symbol>', methods=['GET'])
 def get_single_price(symbol: str):
     """
@@ -172,8 +201,9 @@ def get_multiple_prices():
     prices = []
     errors = []
     
+    results = get_prices_for_symbols(symbols)
     for symbol in symbols:
-        result = get_price_for_symbol(symbol)
+        result = results[symbol.upper()]
         
         if 'error' in result:
             errors.append({
@@ -191,6 +221,44 @@ def get_multiple_prices():
     }), 200
 
 
+@market_bp.route('/search', methods=['GET'])
+def search():
+    """
+    Search symbols by ticker prefix or (fuzzy) company name.
+    
+    Answered from the in-memory symbol index, without calling Yahoo Finance.
+    
+    Query Parameters:
+        q: Ticker or name fragment (e.g., 'AA', 'attijari', 'micrsoft')
+        limit: Maximum number of results (default: 10, max: 50)
+    
+    Returns:
+        JSON with ranked matches:
+        {
+            "query": "attij",
+            "results": [
+                {"symbol": "ATW", "name": "Attijariwafa Bank", "exchange": "CSE", "score": 60.0}
+            ],
+            "count": 1
+        }
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({
+            'error': 'Missing parameter',
+            'message': 'Query parameter "q" is required'
+        }), 400
+    
+    limit = max(1, min(request.args.get('limit', 10, type=int), 50))
+    results = search_symbols(query, limit=limit)
+    
+    return jsonify({
+        'query': query,
+        'results': results,
+        'count': len(results)
+    }), 200
+
+
 @market_bp.route('/cache/stats', methods=['GET'])
 def cache_stats():
     """
@@ -235,6 +303,11 @@ def get_history(symbol: str):
     Query Parameters:
         period: Time period (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, max) - default: 1mo
         interval: Data interval (1m, 5m, 15m, 30m, 1h, 1d, 1wk, 1mo) - default: 1h
+        format: rows, columnar or binary - default: rows
+            rows: data is a list of {time, open, high, low, close, value, volume}
+            columnar: data is parallel arrays {t, o, h, l, c, v}
+            binary: application/octet-stream body packed as described in the
+                    X-OHLCV-Layout response header
     
     Returns:
         JSON with historical OHLCV data for charting
@@ -258,17 +331,39 @@ def get_history(symbol: str):
     if interval not in valid_intervals:
         interval = '1h'
     
+    # Validate format
+    fmt = request.args.get('format', 'rows')
+    if fmt not in HISTORY_FORMATS:
+        return jsonify({
+            'error': 'Invalid format',
+            'message': f'format must be one of: {", ".join(HISTORY_FORMATS)}'
+        }), 400
+    columnar = fmt != 'rows'
+    
     symbol_upper = symbol.upper().strip()
     
     # For Moroccan stocks, generate mock historical data
     if is_moroccan_stock(symbol_upper):
         from services.morocco_scraper import generate_mock_historical_data
-        result = generate_mock_historical_data(symbol_upper, period, interval)
+        result = generate_mock_historical_data(symbol_upper, period, interval, columnar=columnar)
     else:
         # Use yfinance for international stocks
-        result = get_historical_data(symbol_upper, period, interval)
+        result = get_historical_data(symbol_upper, period, interval, columnar=columnar)
     
     if 'error' in result:
         return jsonify(result), 404
     
+    if fmt == 'binary':
+        return Response(
+            pack_columnar(result['data']),
+            status=200,
+            mimetype='application/octet-stream',
+            headers={
+                'X-OHLCV-Symbol': result['symbol'],
+                'X-OHLCV-Count': str(result['count']),
+                'X-OHLCV-Layout': BINARY_LAYOUT,
+            }
+        )
+    
+    result['format'] = fmt
     return jsonify(result), 200
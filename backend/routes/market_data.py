@@ -1,8 +1,10 @@
 from flask_restful import Resource
+from flask import request
 import yfinance as yf
 import requests
 from bs4 import BeautifulSoup
 import logging
+from services.symbol_index import search_symbols
 
 logger = logging.getLogger(__name__)
 
@@ -70,20 +72,9 @@ class MarketData(Resource):
 
 class SymbolSearch(Resource):
     def get(self, query):
-        """Search for symbols"""
-        try:
-            # Using yfinance search functionality
-            ticker = yf.Ticker(query.upper())
-            info = ticker.info
-            
-            if 'symbol' in info:
-                return [{
-                    'symbol': info.get('symbol', query.upper()),
-                    'name': info.get('longName', ''),
-                    'exchange': info.get('exchange', '')
-                }]
-            else:
-                return []
-        except Exception as e:
-            return []
-
+        """Search for symbols in the local symbol index (no network I/O)"""
+        limit = request.args.get('limit', 10, type=int)
+        return [
+            {'symbol': r['symbol'], 'name': r['name'], 'exchange': r['exchange']}
+            for r in search_symbols(query, limit=max(1, min(limit, 50)))
+        ]
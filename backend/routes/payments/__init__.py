@@ -1,5 +1,6 @@
 from flask import Blueprint
 from flask_restful import Api
+from utils.json_provider import output_json
 from .payments import (
     PaymentPlans, MockCheckout, PayPalWebhook,
     PaymentList, PaymentDetail, ProcessPayment
@@ -10,6 +11,7 @@ payments_bp = Blueprint('payments', __name__)
 
 # Create API instance
 payments_api = Api(payments_bp)
+payments_api.representation('application/json')(output_json)
 
 # Register routes
 payments_api.add_resource(PaymentPlans, '/plans')
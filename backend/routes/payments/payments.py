@@ -4,6 +4,8 @@ from flask import request, g
 from extensions import db
 from models import Payment, Challenge, User
 from utils.auth_utils import token_required
+from utils.idempotency import idempotent
+from services.challenge_cache import bump_challenge_version
 
 # Pricing plans configuration
 PRICING_PLANS = {
@@ -65,8 +67,9 @@ class MockCheckout(Resource):
     """Mock payment checkout endpoint"""
     
     @token_required
+    @idempotent
     def post(self):
-        """Process mock payment and create challenge"""
+        """Process mock payment and create challenge (honours Idempotency-Key)"""
         data = request.get_json()
         
         if not data:
@@ -149,6 +152,7 @@ class MockCheckout(Resource):
             
             db.session.add(payment)
             db.session.commit()
+            bump_challenge_version(challenge.id)
             
             return {
                 'success': True,
@@ -331,6 +335,7 @@ class ProcessPayment(Resource):
         # Process payment (similar to mock-checkout logic)
         try:
             payment.status = 'completed'
+            created = False
             
             # If challenge doesn't exist, create it
             if not payment.challenge_id:
@@ -356,8 +361,11 @@ class ProcessPayment(Resource):
                     db.session.add(challenge)
                     db.session.flush()
                     payment.challenge_id = challenge.id
+                    created = True
             
             db.session.commit()
+            if created:
+                bump_challenge_version(payment.challenge_id)
             
             return {
                 'success': True,
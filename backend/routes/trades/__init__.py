@@ -1,17 +1,25 @@
 from flask import Blueprint
 from flask_restful import Api
-from .trades import TradeList, TradeDetail, ExecuteTrade, TradeHistory, ChallengeDetails
+from utils.json_provider import output_json
+from .trades import TradeList, TradeDetail, ExecuteTrade, ExecuteTradeBatch, TradeHistory, ChallengeDetails, ChallengePositions, ChallengeAnalytics, EquityCurve, TradeExport, OrderList, OrderDetail
 
 # Create blueprint for new trades routes
 trades_bp = Blueprint('trades_new', __name__)
 
 # Create API instance
 trades_api = Api(trades_bp)
+trades_api.representation('application/json')(output_json)
 
 # Register routes
 trades_api.add_resource(TradeList, '')
 trades_api.add_resource(ExecuteTrade, '/execute')
+trades_api.add_resource(ExecuteTradeBatch, '/execute-batch')
 trades_api.add_resource(TradeDetail, '/<int:trade_id>')
 trades_api.add_resource(TradeHistory, '/history/<int:challenge_id>')
 trades_api.add_resource(ChallengeDetails, '/challenges/<int:challenge_id>')
-
+trades_api.add_resource(ChallengePositions, '/positions/<int:challenge_id>')
+trades_api.add_resource(ChallengeAnalytics, '/analytics/<int:challenge_id>')
+trades_api.add_resource(EquityCurve, '/equity/<int:challenge_id>')
+trades_api.add_resource(TradeExport, '/export/<int:challenge_id>')
+trades_api.add_resource(OrderList, '/orders')
+trades_api.add_resource(OrderDetail, '/orders/<int:order_id>')
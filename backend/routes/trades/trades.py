@@ -1,11 +1,31 @@
 from flask_restful import Resource
-from flask import request, g
+from flask import request, g, Response, stream_with_context
 from extensions import db
-from models import Trade, Challenge
+from models import Trade, Challenge, Order
 from utils.auth_utils import token_required
-from services.challenge_engine import execute_trade, check_challenge_rules, _get_today_trades
-from routes.market import get_price_for_symbol
-from datetime import datetime
+from utils.idempotency import idempotent
+from utils.timing import stage
+from utils.pagination import keyset_page, parse_page_args
+from services.challenge_engine import (
+    execute_trade, execute_trade_batch, get_positions, MAX_BATCH_ORDERS, QUANTITY_EPSILON, _as_number,
+    _get_day_snapshot,
+)
+from services.challenge_cache import get_cached_details, get_challenge_version, store_details
+from services.analytics import get_challenge_analytics
+from services.equity import get_equity_curve
+from services.trade_export import EXPORT_FORMATS, stream_trade_export
+from services.order_book import place_order, cancel_order, get_orders, ORDER_STATUSES
+from routes.market import get_price_for_symbol, get_prices_for_symbols
+from datetime import date, datetime
+
+# HTTP status for trade pipeline errors (anything else is a 400)
+TRADE_ERROR_STATUS = {
+    'Challenge not found': 404,
+    'Unauthorized': 403,
+    'Trade failed': 500,
+    'Order not found': 404,
+    'Order not pending': 409,
+}
 
 
 class TradeList(Resource):
@@ -14,15 +34,27 @@ class TradeList(Resource):
 
     def get(self):
         user = g.current_user
-        # Get all trades for user's challenges
-        challenges = Challenge.query.filter_by(user_id=user.id).all()
-        challenge_ids = [c.id for c in challenges]
-        trades = Trade.query.filter(Trade.challenge_id.in_(challenge_ids)).order_by(Trade.created_at.desc()).all()
-        return {'trades': [t.to_dict() for t in trades], 'count': len(trades)}, 200
+        try:
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        # One statement: trades joined to the user's challenges, selected as
+        # plain column tuples (no Trade objects / identity map)
+        query = db.session.query(*Trade.dict_columns()).join(
+            Challenge, Challenge.id == Trade.challenge_id
+        ).filter(Challenge.user_id == user.id)
+        rows, next_cursor = keyset_page(query, Trade.created_at, Trade.id, limit, cursor)
+        return {
+            'trades': [Trade.row_to_dict(row) for row in rows],
+            'count': len(rows),
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+        }, 200
 
 
 class TradeDetail(Resource):
-    """Get or delete a specific trade"""
+    """Get a specific trade (amend and delete are admin only, see routes/admin.py)"""
     method_decorators = [token_required]
 
     def get(self, trade_id):
@@ -35,27 +67,17 @@ class TradeDetail(Resource):
             return {'error': 'Unauthorized'}, 403
         return trade.to_dict(), 200
 
-    def delete(self, trade_id):
-        trade = Trade.query.get(trade_id)
-        if not trade:
-            return {'error': 'Trade not found'}, 404
-        # Verify ownership
-        challenge = Challenge.query.get(trade.challenge_id)
-        if not challenge or challenge.user_id != g.current_user.id:
-            return {'error': 'Unauthorized'}, 403
-        db.session.delete(trade)
-        db.session.commit()
-        return {'message': 'Trade deleted'}, 200
-
 
 class ExecuteTrade(Resource):
     """
     POST /api/trades/execute
     Execute a new trade for a challenge.
-    Requires authentication.
+    Requires authentication. Retries with the same Idempotency-Key header
+    get the stored response instead of trading again.
     """
     method_decorators = [token_required]
 
+    @idempotent
     def post(self):
         user = g.current_user
         data = request.get_json() or {}
@@ -75,15 +97,20 @@ class ExecuteTrade(Resource):
         if quantity is None:
             return {'error': 'Missing field', 'message': 'quantity is required'}, 400
 
-        # Verify challenge exists and belongs to user
-        challenge = Challenge.query.get(challenge_id)
-        if not challenge:
+        # Cheap ownership check before the price fetch (column only, no ORM load);
+        # the trade pipeline re-checks it under the row lock
+        with stage('auth'):
+            owner_id = db.session.query(Challenge.user_id).filter(Challenge.id == challenge_id).scalar()
+        if owner_id is None:
             return {'error': 'Challenge not found', 'message': f'Challenge {challenge_id} does not exist'}, 404
-        if challenge.user_id != user.id:
+        if owner_id != user.id:
             return {'error': 'Unauthorized', 'message': 'This challenge does not belong to you'}, 403
 
-        # Fetch real-time price for symbol
-        price_data = get_price_for_symbol(symbol)
+        # Fetch real-time price for symbol (timed per source: cache hits are
+        # reported by the source that filled the cache)
+        with stage('price') as price_stage:
+            price_data = get_price_for_symbol(symbol)
+            price_stage.desc = price_data.get('source')
         if 'error' in price_data:
             return {'error': 'Price fetch failed', 'message': price_data.get('message', 'Could not fetch price'), 'symbol': symbol}, 400
 
@@ -91,31 +118,24 @@ class ExecuteTrade(Resource):
         if current_price is None or current_price <= 0:
             return {'error': 'Invalid price', 'message': f'Invalid price received for {symbol}'}, 400
 
-        # Execute the trade (this also triggers check_challenge_rules via decorator)
+        # Execute the trade: locks the challenge, writes the trade, checks the
+        # rules and commits once
         result = execute_trade(
             challenge_id=challenge_id,
             symbol=symbol,
             action=action,
-            quantity=float(quantity),
-            current_price=float(current_price)
+            quantity=_as_number(quantity),
+            current_price=_as_number(current_price),
+            user_id=user.id
         )
 
         if 'error' in result:
-            return result, 400
-
-        # Refresh challenge to get updated status
-        challenge = Challenge.query.get(challenge_id)
+            return result, TRADE_ERROR_STATUS.get(result['error'], 400)
 
         return {
             'message': 'Trade executed successfully',
             'trade': result.get('trade'),
-            'challenge': {
-                'id': challenge.id,
-                'current_balance': challenge.current_balance,
-                'starting_balance': challenge.starting_balance,
-                'status': challenge.status,
-                'pnl_percent': result.get('pnl_percent'),
-            },
+            'challenge': result.get('challenge'),
             'rule_check': result.get('rule_check'),
             'price_info': {
                 'symbol': symbol.upper(),
@@ -126,10 +146,79 @@ class ExecuteTrade(Resource):
         }, 201
 
 
+class ExecuteTradeBatch(Resource):
+    """
+    POST /api/trades/execute-batch
+    Execute several orders for one challenge in a single transaction.
+    Body: {"challenge_id": 1, "orders": [{"symbol": "AAPL", "action": "buy", "quantity": 2}, ...]}
+    Prices are fetched in one batched lookup and the rules are checked once,
+    after the last order. Either every order executes or none does.
+    Requires authentication.
+    """
+    method_decorators = [token_required]
+
+    def post(self):
+        user = g.current_user
+        data = request.get_json() or {}
+
+        challenge_id = data.get('challenge_id')
+        orders = data.get('orders')
+
+        if not challenge_id:
+            return {'error': 'Missing field', 'message': 'challenge_id is required'}, 400
+        if not isinstance(orders, list) or not orders:
+            return {'error': 'Missing field', 'message': 'orders must be a non-empty list'}, 400
+        if len(orders) > MAX_BATCH_ORDERS:
+            return {'error': 'Invalid batch', 'message': f'At most {MAX_BATCH_ORDERS} orders per batch'}, 400
+        if not all(isinstance(order, dict) for order in orders):
+            return {'error': 'Invalid batch', 'message': 'Each order must be an object'}, 400
+
+        # Cheap ownership check before the price fetch (column only, no ORM load)
+        with stage('auth'):
+            owner_id = db.session.query(Challenge.user_id).filter(Challenge.id == challenge_id).scalar()
+        if owner_id is None:
+            return {'error': 'Challenge not found', 'message': f'Challenge {challenge_id} does not exist'}, 404
+        if owner_id != user.id:
+            return {'error': 'Unauthorized', 'message': 'This challenge does not belong to you'}, 403
+
+        # One batched price lookup for all distinct symbols
+        with stage('price', 'batch'):
+            price_data = get_prices_for_symbols(str(order.get('symbol') or '') for order in orders)
+        price_errors = [
+            {'symbol': symbol, 'message': quote.get('message', 'Could not fetch price')}
+            for symbol, quote in price_data.items()
+            if 'error' in quote or not quote.get('current_price') or quote['current_price'] <= 0
+        ]
+        if price_errors:
+            return {'error': 'Price fetch failed', 'message': 'Could not fetch prices for all symbols', 'symbols': price_errors}, 400
+
+        prices = {symbol: float(quote['current_price']) for symbol, quote in price_data.items()}
+        result = execute_trade_batch(challenge_id, orders, prices, user_id=user.id)
+
+        if 'error' in result:
+            return result, TRADE_ERROR_STATUS.get(result['error'], 400)
+
+        return {
+            'message': f"{len(result['results'])} trades executed successfully",
+            'results': result.get('results'),
+            'challenge': result.get('challenge'),
+            'rule_check': result.get('rule_check'),
+            'price_info': {
+                symbol: {
+                    'price_used': prices[symbol],
+                    'source': quote.get('source'),
+                    'market': quote.get('market'),
+                }
+                for symbol, quote in price_data.items()
+            }
+        }, 201
+
+
 class TradeHistory(Resource):
     """
-    GET /api/trades/history/<challenge_id>
-    Return all trades for a challenge with P&L calculations.
+    GET /api/trades/history/<challenge_id>?limit=50&cursor=...
+    Return one page of a challenge's trades (newest first) with P&L calculations.
+    Pass the returned next_cursor to get the following page.
     """
     method_decorators = [token_required]
 
@@ -143,8 +232,14 @@ class TradeHistory(Resource):
         if challenge.user_id != user.id:
             return {'error': 'Unauthorized'}, 403
 
-        # Get all trades ordered by created_at DESC
-        trades = Trade.query.filter_by(challenge_id=challenge_id).order_by(Trade.created_at.desc()).all()
+        try:
+            limit, cursor = parse_page_args(request.args)
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+        # One page ordered by (created_at, id) DESC, seeking past the cursor
+        query = Trade.query.filter_by(challenge_id=challenge_id)
+        trades, next_cursor = keyset_page(query, Trade.created_at, Trade.id, limit, cursor)
 
         # Calculate P&L for each trade
         trades_with_pnl = []
@@ -162,31 +257,97 @@ class TradeHistory(Resource):
         # Overall stats
         total_pnl = challenge.current_balance - challenge.starting_balance
         total_pnl_percent = (total_pnl / challenge.starting_balance * 100) if challenge.starting_balance > 0 else 0
+        summary = {
+            'starting_balance': challenge.starting_balance,
+            'current_balance': challenge.current_balance,
+            'total_pnl': round(total_pnl, 2),
+            'total_pnl_percent': round(total_pnl_percent, 2),
+            'status': challenge.status,
+        }
+        if cursor is None:
+            # Total trade count on the first page only, so later pages stay a pure seek
+            summary['trades_count'] = db.session.query(db.func.count(Trade.id)).filter(
+                Trade.challenge_id == challenge_id
+            ).scalar()
 
         return {
             'challenge_id': challenge_id,
             'trades': trades_with_pnl,
             'count': len(trades),
-            'summary': {
-                'starting_balance': challenge.starting_balance,
-                'current_balance': challenge.current_balance,
-                'total_pnl': round(total_pnl, 2),
-                'total_pnl_percent': round(total_pnl_percent, 2),
-                'status': challenge.status,
-            }
+            'next_cursor': next_cursor,
+            'has_more': next_cursor is not None,
+            'summary': summary,
         }, 200
 
 
+def _challenge_details(challenge):
+    """Challenge fields, total and daily P&L and today's activity (the ChallengeDetails payload)."""
+    # Today's figures come from the day's balance snapshot (no row: nothing happened today)
+    snapshot = _get_day_snapshot(challenge, create=False)
+    if snapshot is not None:
+        today_trades_count = snapshot.trade_count
+        starting_balance_today = snapshot.open_balance
+        end_balance_today = snapshot.close_balance
+    else:
+        today_trades_count = 0
+        starting_balance_today = challenge.current_balance
+        end_balance_today = challenge.current_balance
+    daily_pnl = end_balance_today - starting_balance_today
+
+    daily_pnl_percent = (daily_pnl / starting_balance_today * 100) if starting_balance_today > 0 else 0
+
+    # Total P&L
+    total_pnl = challenge.current_balance - challenge.starting_balance
+    total_pnl_percent = (total_pnl / challenge.starting_balance * 100) if challenge.starting_balance > 0 else 0
+
+    return {
+        'challenge': {
+            'id': challenge.id,
+            'user_id': challenge.user_id,
+            'plan_type': challenge.plan_type,
+            'starting_balance': challenge.starting_balance,
+            'current_balance': challenge.current_balance,
+            'status': challenge.status,
+            'max_daily_loss_percent': challenge.max_daily_loss_percent,
+            'max_total_loss_percent': challenge.max_total_loss_percent,
+            'profit_target_percent': challenge.profit_target_percent,
+            'created_at': challenge.created_at,
+            'ended_at': challenge.ended_at,
+        },
+        'performance': {
+            'total_pnl': round(total_pnl, 2),
+            'total_pnl_percent': round(total_pnl_percent, 2),
+            'daily_pnl': round(daily_pnl, 2),
+            'daily_pnl_percent': round(daily_pnl_percent, 2),
+        },
+        'today': {
+            'trades_count': today_trades_count,
+            'starting_balance': round(starting_balance_today, 2),
+            'current_balance': round(end_balance_today, 2),
+        }
+    }
+
+
 class ChallengeDetails(Resource):
     """
     GET /api/trades/challenges/<challenge_id>
     Return challenge details with balance, profit%, status, today's trades and daily P&L.
+    Served from the challenge details cache until the next write to the challenge.
     """
     method_decorators = [token_required]
 
     def get(self, challenge_id):
         user = g.current_user
 
+        cached = get_cached_details(challenge_id)
+        if cached is not None:
+            owner_id, details = cached
+            if owner_id != user.id:
+                return {'error': 'Unauthorized'}, 403
+            return details, 200
+
+        version = get_challenge_version(challenge_id)
+
         # Verify challenge exists and belongs to user
         challenge = Challenge.query.get(challenge_id)
         if not challenge:
@@ -194,56 +355,190 @@ class ChallengeDetails(Resource):
         if challenge.user_id != user.id:
             return {'error': 'Unauthorized'}, 403
 
-        # Get today's trades
-        today_trades = _get_today_trades(challenge_id)
-        today_trades_count = len(today_trades)
-
-        # Calculate daily P&L
-        if today_trades:
-            # Starting balance today = balance before first trade of today
-            first_trade = today_trades[0]
-            # Reconstruct starting balance: balance_after_trade +/- trade effect
-            if first_trade.action == 'buy':
-                starting_balance_today = first_trade.balance_after_trade + first_trade.total_value
-            else:
-                starting_balance_today = first_trade.balance_after_trade - first_trade.total_value
-            end_balance_today = today_trades[-1].balance_after_trade
-            daily_pnl = end_balance_today - starting_balance_today
-        else:
-            starting_balance_today = challenge.current_balance
-            end_balance_today = challenge.current_balance
-            daily_pnl = 0.0
+        details = _challenge_details(challenge)
+        store_details(challenge_id, version, challenge.user_id, details)
+        return details, 200
 
-        daily_pnl_percent = (daily_pnl / starting_balance_today * 100) if starting_balance_today > 0 else 0
 
-        # Total P&L
-        total_pnl = challenge.current_balance - challenge.starting_balance
-        total_pnl_percent = (total_pnl / challenge.starting_balance * 100) if challenge.starting_balance > 0 else 0
+class ChallengePositions(Resource):
+    """
+    GET /api/trades/positions/<challenge_id>
+    Return the open positions of a challenge with average cost and realized P&L.
+    """
+    method_decorators = [token_required]
+
+    def get(self, challenge_id):
+        user = g.current_user
+
+        # Verify challenge exists and belongs to user
+        challenge = Challenge.query.get(challenge_id)
+        if not challenge:
+            return {'error': 'Challenge not found'}, 404
+        if challenge.user_id != user.id:
+            return {'error': 'Unauthorized'}, 403
+
+        # One indexed read: flat rows only contribute their realized P&L
+        positions = get_positions(challenge_id)
+        open_positions = [p for p in positions if abs(p.quantity) >= QUANTITY_EPSILON]
+        realized_pnl = sum(p.realized_pnl or 0.0 for p in positions)
 
         return {
-            'challenge': {
-                'id': challenge.id,
-                'user_id': challenge.user_id,
-                'plan_type': challenge.plan_type,
-                'starting_balance': challenge.starting_balance,
-                'current_balance': challenge.current_balance,
-                'status': challenge.status,
-                'max_daily_loss_percent': challenge.max_daily_loss_percent,
-                'max_total_loss_percent': challenge.max_total_loss_percent,
-                'profit_target_percent': challenge.profit_target_percent,
-                'created_at': challenge.created_at.isoformat() if challenge.created_at else None,
-                'ended_at': challenge.ended_at.isoformat() if challenge.ended_at else None,
-            },
-            'performance': {
-                'total_pnl': round(total_pnl, 2),
-                'total_pnl_percent': round(total_pnl_percent, 2),
-                'daily_pnl': round(daily_pnl, 2),
-                'daily_pnl_percent': round(daily_pnl_percent, 2),
-            },
-            'today': {
-                'trades_count': today_trades_count,
-                'starting_balance': round(starting_balance_today, 2),
-                'current_balance': round(end_balance_today, 2),
-            }
+            'challenge_id': challenge_id,
+            'positions': [p.to_dict() for p in open_positions],
+            'count': len(open_positions),
+            'realized_pnl': round(realized_pnl, 2),
         }, 200
 
+
+class ChallengeAnalytics(Resource):
+    """
+    GET /api/trades/analytics/<challenge_id>
+    Return performance analytics of a challenge (win rate, profit factor, drawdown,
+    Sharpe/Sortino, hold time, per-symbol attribution), cached until the next trade.
+    """
+    method_decorators = [token_required]
+
+    def get(self, challenge_id):
+        user = g.current_user
+
+        # Verify challenge exists and belongs to user
+        challenge = Challenge.query.get(challenge_id)
+        if not challenge:
+            return {'error': 'Challenge not found'}, 404
+        if challenge.user_id != user.id:
+            return {'error': 'Unauthorized'}, 403
+
+        return get_challenge_analytics(challenge), 200
+
+
+class EquityCurve(Resource):
+    """
+    GET /api/trades/equity/<challenge_id>?resolution=day|hour|trade&from=YYYY-MM-DD&to=YYYY-MM-DD
+    Return the challenge balance over time; daily points come from the daily rollups.
+    """
+    method_decorators = [token_required]
+
+    def get(self, challenge_id):
+        user = g.current_user
+
+        # Verify challenge exists and belongs to user
+        challenge = Challenge.query.get(challenge_id)
+        if not challenge:
+            return {'error': 'Challenge not found'}, 404
+        if challenge.user_id != user.id:
+            return {'error': 'Unauthorized'}, 403
+
+        try:
+            start, end = (date.fromisoformat(request.args[k]) if request.args.get(k) else None for k in ('from', 'to'))
+        except ValueError:
+            return {'error': 'Invalid date', 'message': "'from' and 'to' must be YYYY-MM-DD"}, 400
+
+        result = get_equity_curve(challenge, request.args.get('resolution', 'day'), start, end)
+        if 'error' in result:
+            return result, 400
+        return result, 200
+
+
+class TradeExport(Resource):
+    """
+    GET /api/trades/export/<challenge_id>?format=csv|ndjson
+    Stream the full trade ledger of a challenge as a download.
+    """
+    method_decorators = [token_required]
+
+    def get(self, challenge_id):
+        user = g.current_user
+
+        # Verify challenge exists and belongs to user
+        challenge = Challenge.query.get(challenge_id)
+        if not challenge:
+            return {'error': 'Challenge not found'}, 404
+        if challenge.user_id != user.id:
+            return {'error': 'Unauthorized'}, 403
+
+        fmt = request.args.get('format', 'csv')
+        if fmt not in EXPORT_FORMATS:
+            return {'error': 'Invalid format', 'message': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}, 400
+
+        return Response(
+            stream_with_context(stream_trade_export(fmt, challenge_ids=[challenge_id])),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={'Content-Disposition': f'attachment; filename="challenge-{challenge_id}-trades.{fmt}"'},
+        )
+
+
+class OrderList(Resource):
+    """
+    GET  /api/trades/orders?challenge_id=<id>&status=<status>
+    POST /api/trades/orders
+    List or place resting orders. A placed order stays pending until a quote
+    crosses its trigger_price, then executes as a market trade at that quote:
+      limit: buy at or below / sell at or above trigger_price
+      stop: buy at or above / sell at or below trigger_price
+      take_profit: buy at or below / sell at or above trigger_price
+    Requires authentication.
+    """
+    method_decorators = [token_required]
+
+    def get(self):
+        user = g.current_user
+        challenge_id = request.args.get('challenge_id', type=int)
+        status = request.args.get('status')
+
+        if not challenge_id:
+            return {'error': 'Missing parameter', 'message': 'challenge_id is required'}, 400
+        if status and status not in ORDER_STATUSES:
+            return {'error': 'Invalid status', 'message': f"status must be one of {', '.join(ORDER_STATUSES)}"}, 400
+
+        owner_id = db.session.query(Challenge.user_id).filter(Challenge.id == challenge_id).scalar()
+        if owner_id is None:
+            return {'error': 'Challenge not found'}, 404
+        if owner_id != user.id:
+            return {'error': 'Unauthorized'}, 403
+
+        orders = get_orders(challenge_id, status)
+        return {'challenge_id': challenge_id, 'orders': [o.to_dict() for o in orders], 'count': len(orders)}, 200
+
+    def post(self):
+        user = g.current_user
+        data = request.get_json() or {}
+
+        challenge_id = data.get('challenge_id')
+        if not challenge_id:
+            return {'error': 'Missing field', 'message': 'challenge_id is required'}, 400
+
+        result = place_order(
+            challenge_id=challenge_id,
+            symbol=data.get('symbol'),
+            action=data.get('action'),
+            order_type=data.get('order_type'),
+            quantity=data.get('quantity'),
+            trigger_price=data.get('trigger_price'),
+            user_id=user.id
+        )
+        if 'error' in result:
+            return result, TRADE_ERROR_STATUS.get(result['error'], 400)
+
+        return {'message': 'Order placed', 'order': result}, 201
+
+
+class OrderDetail(Resource):
+    """
+    GET    /api/trades/orders/<order_id>
+    DELETE /api/trades/orders/<order_id>  (cancel a pending order)
+    """
+    method_decorators = [token_required]
+
+    def get(self, order_id):
+        order = Order.query.get(order_id)
+        if not order:
+            return {'error': 'Order not found'}, 404
+        if order.challenge.user_id != g.current_user.id:
+            return {'error': 'Unauthorized'}, 403
+        return order.to_dict(), 200
+
+    def delete(self, order_id):
+        result = cancel_order(order_id, user_id=g.current_user.id)
+        if 'error' in result:
+            return result, TRADE_ERROR_STATUS.get(result['error'], 400)
+        return {'message': 'Order cancelled', 'order': result}, 200
@@ -0,0 +1,123 @@
+"""
+Trade Listing Benchmark
+Compares the two ways GET /api/trades has built a user's trade listing:
+  before: load the user's Challenge objects, then Trade objects via IN, then to_dict()
+  after:  one trades JOIN challenges query selecting plain column tuples
+
+Builds a throwaway SQLite fixture (100k trades by default) and prints rows/second
+for a full listing and for one keyset page.
+
+Usage (from backend/):
+    python scripts/benchmark_trade_list.py [--trades 100000] [--repeat 5] [--db /tmp/bench_trades.db]
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from extensions import db
+from models import User, Challenge, Trade
+from utils.pagination import MAX_PAGE_SIZE, keyset_page
+
+CHALLENGES_PER_USER = 10
+OTHER_USERS = 20
+
+
+def build_fixture(n_trades: int) -> int:
+    """Create the fixture and return the benchmarked user's id."""
+    db.drop_all()
+    db.create_all()
+    users = [User(username=f'bench{i}', email=f'bench{i}@example.com', password_hash='x')
+             for i in range(OTHER_USERS + 1)]
+    db.session.add_all(users)
+    db.session.flush()
+    challenges = [Challenge(user_id=u.id, plan_type='starter', starting_balance=5000, current_balance=5000)
+                  for u in users for _ in range(CHALLENGES_PER_USER)]
+    db.session.add_all(challenges)
+    db.session.commit()
+
+    # The benchmarked user owns all n_trades; every other user gets a tenth as many
+    target_ids = [c.id for c in challenges if c.user_id == users[0].id]
+    other_ids = [c.id for c in challenges if c.user_id != users[0].id]
+    rng = random.Random(42)
+    start = datetime(2025, 1, 1)
+    rows = []
+    for i in range(n_trades + n_trades // 10):
+        rows.append({
+            'challenge_id': rng.choice(target_ids if i < n_trades else other_ids),
+            'symbol': rng.choice(('AAPL', 'TSLA', 'BTC-USD', 'IAM', 'ATW')),
+            'action': rng.choice(('buy', 'sell')),
+            'quantity': 1.0,
+            'price': 100.0,
+            'total_value': 100.0,
+            'balance_after_trade': 5000.0,
+            'profit_loss': 0.0,
+            'created_at': start + timedelta(seconds=i),
+        })
+    db.session.execute(Trade.__table__.insert(), rows)
+    db.session.commit()
+    return users[0].id
+
+
+def list_before(user_id: int, limit=None):
+    challenge_ids = [c.id for c in Challenge.query.filter_by(user_id=user_id).all()]
+    query = Trade.query.filter(Trade.challenge_id.in_(challenge_ids)).order_by(Trade.created_at.desc(), Trade.id.desc())
+    if limit:
+        query = query.limit(limit)
+    return [t.to_dict() for t in query.all()]
+
+
+def list_after(user_id: int, limit=None):
+    query = db.session.query(*Trade.dict_columns()).join(
+        Challenge, Challenge.id == Trade.challenge_id
+    ).filter(Challenge.user_id == user_id)
+    if limit:
+        rows, _ = keyset_page(query, Trade.created_at, Trade.id, limit, None)
+    else:
+        rows = query.order_by(Trade.created_at.desc(), Trade.id.desc()).all()
+    return [Trade.row_to_dict(row) for row in rows]
+
+
+def measure(func, user_id: int, repeat: int, limit=None):
+    best = float('inf')
+    count = 0
+    for _ in range(repeat):
+        db.session.expunge_all()  # start every run with an empty identity map
+        started = time.perf_counter()
+        count = len(func(user_id, limit))
+        best = min(best, time.perf_counter() - started)
+        db.session.rollback()
+    return count, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--trades', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', default='/tmp/bench_trades.db')
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.abspath(args.db)}'
+    db.init_app(app)
+    with app.app_context():
+        print(f'Building fixture: {args.trades} trades for the benchmarked user ...')
+        user_id = build_fixture(args.trades)
+        for label, limit in (('full listing', None), (f'page of {MAX_PAGE_SIZE}', MAX_PAGE_SIZE)):
+            print(f'\n{label}:')
+            results = {}
+            for name, func in (('before', list_before), ('after', list_after)):
+                count, elapsed = measure(func, user_id, args.repeat, limit)
+                results[name] = elapsed
+                print(f'  {name:6} {count:>7} rows  {elapsed * 1000:9.1f} ms  {count / elapsed:>12,.0f} rows/s')
+            print(f'  speedup x{results["before"] / results["after"]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
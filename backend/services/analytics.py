@@ -0,0 +1,240 @@
+"""
+Challenge Performance Analytics
+Loads a challenge's trade ledger into NumPy arrays once and computes, in
+vectorized passes:
+- Win rate and profit factor over closing trades (realized P&L != 0)
+- Max drawdown of the balance curve
+- Sharpe and Sortino ratios on daily returns (last balance of each trading day)
+- Average hold time of round trips (flat -> open -> flat, per symbol)
+- Per-symbol attribution (trades, volume, realized P&L, wins)
+
+Results are cached per challenge. An entry is dropped when a trade is written
+(trade listener) and also carries a version of the ledger it covers (trade
+count, newest id, quantity and value sums, challenge balance): any insert,
+delete or amend changes it, so a worker that missed the event recomputes
+instead of serving a stale result. Entries also expire after
+ANALYTICS_TTL_SECONDS.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+from extensions import db
+from models import Challenge, Trade
+from services.challenge_engine import QUANTITY_EPSILON, register_trade_listener
+
+TRADING_DAYS_PER_YEAR = 252
+MAX_CACHED_CHALLENGES = 1024
+ANALYTICS_TTL_SECONDS = 30
+
+# challenge_id -> (ledger version, stored at, analytics)
+_analytics_cache: "OrderedDict[int, Tuple[Tuple, float, Dict[str, Any]]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def invalidate_analytics(challenge_id: int) -> None:
+    with _cache_lock:
+        _analytics_cache.pop(challenge_id, None)
+
+
+def _on_trade(event: Dict[str, Any]) -> None:
+    invalidate_analytics(event['challenge_id'])
+
+
+register_trade_listener(_on_trade)
+
+
+def _ledger_version(challenge: Challenge) -> Tuple:
+    """Changes with every insert, delete or amend of the challenge's trades (one aggregate query)."""
+    count, latest, quantity, value = db.session.query(
+        func.count(Trade.id), func.max(Trade.id), func.sum(Trade.quantity), func.sum(Trade.total_value)
+    ).filter(Trade.challenge_id == challenge.id).one()
+    return count, latest, quantity, value, challenge.current_balance
+
+
+def _load_ledger(challenge_id: int) -> Dict[str, np.ndarray]:
+    rows = db.session.query(
+        Trade.created_at, Trade.symbol, Trade.action, Trade.quantity,
+        Trade.total_value, Trade.profit_loss, Trade.balance_after_trade,
+    ).filter(Trade.challenge_id == challenge_id).order_by(Trade.created_at.asc(), Trade.id.asc()).all()
+    n = len(rows)
+    return {
+        'created': np.array([r[0] for r in rows], dtype='datetime64[us]'),
+        'symbol': np.array([r[1] for r in rows], dtype=object),
+        'signed_qty': np.fromiter((r[3] if r[2] == 'buy' else -r[3] for r in rows), dtype=np.float64, count=n),
+        'value': np.fromiter((r[4] for r in rows), dtype=np.float64, count=n),
+        'pnl': np.fromiter((r[5] or 0.0 for r in rows), dtype=np.float64, count=n),
+        'balance': np.fromiter((r[6] for r in rows), dtype=np.float64, count=n),
+    }
+
+
+def _ratio(numerator: float, denominator: float) -> Optional[float]:
+    return round(numerator / denominator, 4) if denominator else None
+
+
+def _pnl_stats(pnl: np.ndarray) -> Dict[str, Any]:
+    closing = pnl[pnl != 0]
+    wins = closing[closing > 0]
+    losses = closing[closing < 0]
+    gross_profit = float(wins.sum())
+    gross_loss = float(-losses.sum())
+    return {
+        'closing_trades': int(closing.size),
+        'winning_trades': int(wins.size),
+        'losing_trades': int(losses.size),
+        'win_rate': round(wins.size / closing.size * 100, 2) if closing.size else 0.0,
+        'gross_profit': round(gross_profit, 2),
+        'gross_loss': round(gross_loss, 2),
+        'profit_factor': _ratio(gross_profit, gross_loss),
+        'average_win': round(float(wins.mean()), 2) if wins.size else 0.0,
+        'average_loss': round(float(losses.mean()), 2) if losses.size else 0.0,
+        'realized_pnl': round(float(closing.sum()), 2),
+    }
+
+
+def _drawdown(balance: np.ndarray, starting_balance: float) -> Dict[str, Any]:
+    curve = np.concatenate(([starting_balance], balance))
+    peaks = np.maximum.accumulate(curve)
+    drawdown = peaks - curve
+    trough = int(np.argmax(drawdown))
+    peak_value = float(peaks[trough])
+    return {
+        'max_drawdown': round(float(drawdown[trough]), 2),
+        'max_drawdown_percent': round(float(drawdown[trough]) / peak_value * 100, 2) if peak_value > 0 else 0.0,
+    }
+
+
+def _daily_ratios(created: np.ndarray, balance: np.ndarray, starting_balance: float) -> Dict[str, Any]:
+    """Sharpe and Sortino (annualized, zero risk-free rate) on day-over-day balance returns."""
+    days = created.astype('datetime64[D]')
+    # Last balance of each trading day: first occurrence in the reversed arrays
+    _, last_from_end = np.unique(days[::-1], return_index=True)
+    closes = balance[::-1][last_from_end]
+    previous = np.concatenate(([starting_balance], closes[:-1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns = np.where(previous > 0, closes / previous - 1.0, 0.0)
+
+    sharpe = sortino = None
+    if returns.size >= 2:
+        mean = returns.mean()
+        std = returns.std(ddof=1)
+        downside = np.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        scale = np.sqrt(TRADING_DAYS_PER_YEAR)
+        sharpe = round(float(mean / std * scale), 4) if std > 0 else None
+        sortino = round(float(mean / downside * scale), 4) if downside > 0 else None
+    return {
+        'trading_days': int(returns.size),
+        'average_daily_return_percent': round(float(returns.mean()) * 100, 4) if returns.size else 0.0,
+        'sharpe_ratio': sharpe,
+        'sortino_ratio': sortino,
+    }
+
+
+def _hold_times(created: np.ndarray, symbol_codes: np.ndarray, signed_qty: np.ndarray) -> Dict[str, Any]:
+    """Round trips per symbol: a position opens when it leaves flat and closes when it is flat again or flips."""
+    order = np.lexsort((np.arange(symbol_codes.size), symbol_codes))
+    codes = symbol_codes[order]
+    times = created[order]
+    qty = signed_qty[order]
+
+    # Running position within each symbol group
+    running = np.cumsum(qty)
+    group_start = np.concatenate(([True], codes[1:] != codes[:-1]))
+    start_idx = np.maximum.accumulate(np.where(group_start, np.arange(codes.size), 0))
+    offset = running[start_idx] - qty[start_idx]
+    position = running - offset
+    position[np.abs(position) < QUANTITY_EPSILON] = 0.0
+    previous = np.where(group_start, 0.0, np.concatenate(([0.0], position[:-1])))
+
+    flipped = (previous * position) < 0
+    closes = np.flatnonzero((previous != 0) & ((position == 0) | flipped))
+    opens = np.flatnonzero((position != 0) & ((previous == 0) | flipped))
+
+    # The last open of a symbol that is still held has no close
+    group_end = np.concatenate((codes[1:] != codes[:-1], [True]))
+    still_open_groups = codes[group_end & (position != 0)]
+    if still_open_groups.size:
+        last_open = np.ones(opens.size, dtype=bool)
+        last_open[:-1] = codes[opens[:-1]] != codes[opens[1:]]
+        opens = opens[~(last_open & np.isin(codes[opens], still_open_groups))]
+
+    if not closes.size:
+        return {'round_trips': 0, 'average_hold_seconds': None}
+    held = (times[closes] - times[opens]).astype('timedelta64[us]').astype(np.int64) / 1e6
+    return {'round_trips': int(closes.size), 'average_hold_seconds': round(float(held.mean()), 1)}
+
+
+def _by_symbol(symbols: np.ndarray, symbol_codes: np.ndarray, value: np.ndarray, pnl: np.ndarray) -> list:
+    size = symbols.size
+    trades = np.bincount(symbol_codes, minlength=size)
+    volume = np.bincount(symbol_codes, weights=value, minlength=size)
+    realized = np.bincount(symbol_codes, weights=pnl, minlength=size)
+    wins = np.bincount(symbol_codes, weights=(pnl > 0).astype(np.float64), minlength=size)
+    closing = np.bincount(symbol_codes, weights=(pnl != 0).astype(np.float64), minlength=size)
+    total_realized = float(np.abs(realized).sum())
+    rows = [
+        {
+            'symbol': symbols[i],
+            'trades': int(trades[i]),
+            'volume': round(float(volume[i]), 2),
+            'realized_pnl': round(float(realized[i]), 2),
+            'win_rate': round(float(wins[i] / closing[i] * 100), 2) if closing[i] else 0.0,
+            'pnl_share_percent': round(float(abs(realized[i]) / total_realized * 100), 2) if total_realized else 0.0,
+        }
+        for i in range(size)
+    ]
+    return sorted(rows, key=lambda r: r['realized_pnl'], reverse=True)
+
+
+def compute_analytics(challenge: Challenge) -> Dict[str, Any]:
+    """Compute the analytics of a challenge from its full ledger (no cache)."""
+    ledger = _load_ledger(challenge.id)
+    starting_balance = challenge.starting_balance or 0.0
+    result: Dict[str, Any] = {
+        'challenge_id': challenge.id,
+        'trades': int(ledger['value'].size),
+        'volume': round(float(ledger['value'].sum()), 2),
+    }
+    if not ledger['value'].size:
+        result.update(_pnl_stats(ledger['pnl']))
+        result.update({'max_drawdown': 0.0, 'max_drawdown_percent': 0.0, 'trading_days': 0,
+                       'average_daily_return_percent': 0.0, 'sharpe_ratio': None, 'sortino_ratio': None,
+                       'round_trips': 0, 'average_hold_seconds': None, 'by_symbol': []})
+        return result
+
+    symbols, symbol_codes = np.unique(ledger['symbol'].astype(str), return_inverse=True)
+    result.update(_pnl_stats(ledger['pnl']))
+    result.update(_drawdown(ledger['balance'], starting_balance))
+    result.update(_daily_ratios(ledger['created'], ledger['balance'], starting_balance))
+    result.update(_hold_times(ledger['created'], symbol_codes, ledger['signed_qty']))
+    result['by_symbol'] = _by_symbol(symbols.astype(object), symbol_codes, ledger['value'], ledger['pnl'])
+    return result
+
+
+def get_challenge_analytics(challenge: Challenge) -> Dict[str, Any]:
+    """
+    Cached analytics of a challenge (call inside an app context).
+
+    Returns:
+        dict: trade counts, win rate, profit factor, drawdown, Sharpe/Sortino,
+        hold time and per-symbol attribution, plus 'cached'
+    """
+    version = _ledger_version(challenge)
+    with _cache_lock:
+        entry = _analytics_cache.get(challenge.id)
+        if (entry is not None and entry[0] == version
+                and time.monotonic() - entry[1] <= ANALYTICS_TTL_SECONDS):
+            _analytics_cache.move_to_end(challenge.id)
+            return {**entry[2], 'cached': True}
+
+    result = compute_analytics(challenge)
+    with _cache_lock:
+        _analytics_cache[challenge.id] = (version, time.monotonic(), result)
+        _analytics_cache.move_to_end(challenge.id)
+        while len(_analytics_cache) > MAX_CACHED_CHALLENGES:
+            _analytics_cache.popitem(last=False)
+    return {**result, 'cached': False}
@@ -0,0 +1,112 @@
+"""
+Challenge Details Cache
+Computed challenge summaries (GET /api/trades/challenges/<id>) kept in memory
+per challenge, tagged with a version number.
+- Writers bump the version after they commit: creation, trades (via the trade listener),
+  trade deletion, status updates, the risk monitor and the day rollover
+- A read is a dictionary lookup while the stored version is current, for the
+  same UTC day (the summary has "today" figures)
+- The cache is per process; CACHE_TTL_SECONDS bounds how long a summary can
+  miss a write made by another worker
+Other in-memory views of challenges (the leaderboard) register a change
+listener to hear about the bumps that do not come from a trade event.
+"""
+import logging
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from services.challenge_engine import register_trade_listener
+
+logger = logging.getLogger(__name__)
+
+CACHE_TTL_SECONDS = 30
+
+# Bumped by bulk writers that touch many challenges at once
+_epoch = 0
+# challenge_id -> version
+_versions: Dict[int, int] = {}
+# challenge_id -> (version token, day, stored at, owner user_id, details)
+_entries: Dict[int, Tuple[Tuple[int, int], date, float, int, Dict[str, Any]]] = {}
+_lock = threading.Lock()
+# Called with the bumped challenge ids, or None when every challenge was bumped
+_change_listeners: List[Callable[[Optional[Tuple[int, ...]]], None]] = []
+
+
+def register_change_listener(listener: Callable[[Optional[Tuple[int, ...]]], None]) -> None:
+    """
+    Register a callback called after each bump that is not a trade (creation, status
+    updates, rule checks, the risk monitor, the day rollover, deletion) with the
+    bumped challenge ids, or None for a bulk bump. Trades reach listeners through
+    challenge_engine's trade events instead.
+    """
+    if listener not in _change_listeners:
+        _change_listeners.append(listener)
+
+
+def _notify_change_listeners(challenge_ids: Optional[Tuple[int, ...]]) -> None:
+    for listener in list(_change_listeners):
+        try:
+            listener(challenge_ids)
+        except Exception as e:
+            logger.warning(f"Challenge change listener failed for {challenge_ids or 'all challenges'}: {e}")
+
+
+def get_challenge_version(challenge_id: int) -> Tuple[int, int]:
+    """Current version token; read it before loading the data to be cached."""
+    with _lock:
+        return _epoch, _versions.get(challenge_id, 0)
+
+
+def _bump(challenge_ids: Tuple[int, ...]) -> None:
+    with _lock:
+        for challenge_id in challenge_ids:
+            _versions[challenge_id] = _versions.get(challenge_id, 0) + 1
+            _entries.pop(challenge_id, None)
+
+
+def bump_challenge_version(*challenge_ids: int) -> None:
+    """Mark challenges as written (call after the commit)."""
+    _bump(challenge_ids)
+    if challenge_ids:
+        _notify_change_listeners(challenge_ids)
+
+
+def bump_all_challenge_versions() -> None:
+    """Mark every challenge as written (bulk updates)."""
+    global _epoch
+    with _lock:
+        _epoch += 1
+        _entries.clear()
+    _notify_change_listeners(None)
+
+
+def get_cached_details(challenge_id: int) -> Optional[Tuple[int, Dict[str, Any]]]:
+    """(owner user_id, details) if a current entry exists, else None."""
+    with _lock:
+        entry = _entries.get(challenge_id)
+        if entry is None:
+            return None
+        version, day, stored_at, user_id, details = entry
+        if (version != (_epoch, _versions.get(challenge_id, 0))
+                or day != datetime.utcnow().date()
+                or time.monotonic() - stored_at > CACHE_TTL_SECONDS):
+            del _entries[challenge_id]
+            return None
+        return user_id, details
+
+
+def store_details(challenge_id: int, version: Tuple[int, int], user_id: int, details: Dict[str, Any]) -> None:
+    """Cache details computed at `version` (dropped if a write happened meanwhile)."""
+    with _lock:
+        if version != (_epoch, _versions.get(challenge_id, 0)):
+            return
+        _entries[challenge_id] = (version, datetime.utcnow().date(), time.monotonic(), user_id, details)
+
+
+def _on_trade(event: Dict[str, Any]) -> None:
+    _bump((event['challenge_id'],))
+
+
+register_trade_listener(_on_trade)
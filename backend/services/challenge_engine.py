@@ -2,73 +2,173 @@
 Challenge Engine Service
 Implements trade execution and rule checks for challenges.
 """
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional, List
+import logging
+import math
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Any, Optional, List, Tuple
+
+from sqlalchemy.exc import IntegrityError
 
 from extensions import db
-from models import Challenge, Trade
+from models import Challenge, Trade, ChallengeDailyBalance, Position
+from utils.timing import stage
+
+logger = logging.getLogger(__name__)
+
+# Quantities smaller than this are treated as a flat position
+QUANTITY_EPSILON = 1e-9
+
+# Maximum number of orders accepted by execute_trade_batch
+MAX_BATCH_ORDERS = 50
+
+# Callbacks notified after each committed trade (e.g., the risk monitor)
+_trade_listeners: List[Callable[[Dict[str, Any]], None]] = []
+
+
+def register_trade_listener(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """
+    Register a callback called with a trade event after each committed trade:
+    {challenge_id, user_id, plan_type, created_at, symbol, position_quantity, avg_cost,
+     current_balance, starting_balance, max_daily_loss_percent, max_total_loss_percent, status}
+    Listeners run on the request thread and must be cheap.
+    """
+    if listener not in _trade_listeners:
+        _trade_listeners.append(listener)
+
+
+def _trade_event(challenge: Challenge, position: Position) -> Dict[str, Any]:
+    """Trade event passed to the listeners (built before commit expires the instances)."""
+    return {
+        "challenge_id": challenge.id,
+        "user_id": challenge.user_id,
+        "plan_type": challenge.plan_type,
+        "created_at": challenge.created_at,
+        "symbol": position.symbol,
+        "position_quantity": position.quantity,
+        "avg_cost": position.avg_cost,
+        "current_balance": challenge.current_balance,
+        "starting_balance": challenge.starting_balance,
+        "max_daily_loss_percent": challenge.max_daily_loss_percent,
+        "max_total_loss_percent": challenge.max_total_loss_percent,
+        "status": challenge.status,
+    }
+
+
+def _notify_trade_listeners(event: Dict[str, Any]) -> None:
+    for listener in list(_trade_listeners):
+        try:
+            listener(event)
+        except Exception as e:
+            logger.warning(f"Trade listener failed for challenge {event.get('challenge_id')}: {e}")
+
+
+def _as_number(value: Any) -> Optional[float]:
+    """float(value) for numbers and numeric strings; None otherwise (bools included)."""
+    if isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_positive_number(value: Any) -> bool:
+    """True for finite numbers > 0 (rejects None, bools, strings, NaN and infinities)."""
+    return (isinstance(value, (int, float)) and not isinstance(value, bool)
+            and math.isfinite(value) and value > 0)
 
 
 def _validate_trade_input(action: str, quantity: float, current_price: float) -> Optional[Dict[str, Any]]:
-    """Validate basic trade inputs."""
+    """Validate basic trade inputs (shared by trades, batches, resting orders and amends)."""
     if action not in {"buy", "sell"}:
         return {"error": "Invalid action", "message": "Action must be 'buy' or 'sell'"}
-    if quantity is None or quantity <= 0:
-        return {"error": "Invalid quantity", "message": "Quantity must be > 0"}
-    if current_price is None or current_price <= 0:
-        return {"error": "Invalid price", "message": "Current price must be > 0"}
+    if not _is_positive_number(quantity):
+        return {"error": "Invalid quantity", "message": "Quantity must be a finite number > 0"}
+    if not _is_positive_number(current_price):
+        return {"error": "Invalid price", "message": "Current price must be a finite number > 0"}
     return None
 
 
-def after_trade_check_rules(func):
+def _lock_challenge(challenge_id: int) -> Optional[Challenge]:
     """
-    Decorator that runs check_challenge_rules() after a trade is executed.
-    Assumes the first positional argument is challenge_id.
+    Load a challenge and lock its row until the current transaction ends.
+    - PostgreSQL: SELECT ... FOR UPDATE
+    - SQLite: BEGIN IMMEDIATE (takes the database write lock up front)
+    Concurrent trades on the same challenge are serialized, so each one reads
+    the balance written by the previous one.
     """
-    def wrapper(*args, **kwargs):
-        result = func(*args, **kwargs)
-        try:
-            # Determine challenge_id from args or result
-            if args and isinstance(args[0], int):
-                challenge_id = args[0]
-            else:
-                challenge_id = kwargs.get("challenge_id") or (result.get("challenge_id") if isinstance(result, dict) else None)
-            if challenge_id:
-                rules_result = check_challenge_rules(challenge_id)
-                # Attach rule check outcome to the result if possible
-                if isinstance(result, dict):
-                    result["rule_check"] = rules_result
-        except Exception as e:
-            # Non-fatal; include error info
-            if isinstance(result, dict):
-                result["rule_check_error"] = str(e)
-        return result
-    return wrapper
+    connection = db.session.connection()
+    if connection.dialect.name == "sqlite":
+        dbapi_connection = connection.connection.dbapi_connection
+        if not dbapi_connection.in_transaction:
+            connection.exec_driver_sql("BEGIN IMMEDIATE")
+        return db.session.get(Challenge, challenge_id, populate_existing=True)
+    return db.session.get(Challenge, challenge_id, with_for_update=True, populate_existing=True)
 
 
-@after_trade_check_rules
-def execute_trade(challenge_id: int, symbol: str, action: str, quantity: float, current_price: float) -> Dict[str, Any]:
+def _fold_position(held: float, avg_cost: float, action: str, quantity: float,
+                   price: float) -> Tuple[float, float, float, bool]:
     """
-    Execute a trade for a challenge.
-    - Get challenge from database
-    - Verify challenge is active
-    - Calculate trade value
-    - Update challenge.current_balance
-    - Create Trade record
-    - Calculate profit/loss percentage (vs initial starting_balance)
-    - Return trade confirmation
+    Fold one trade into a position given as (signed quantity, average cost).
+    Buys and sells that extend the position move the average cost; trades in the
+    opposite direction realize P&L on the closed quantity against the average cost
+    (a trade larger than the position flips it at the trade price).
+
+    Returns:
+        Tuple[float, float, float, bool]: New quantity, new average cost, realized
+        P&L, and whether the position was opened (or flipped) by this trade
     """
-    # Validate inputs
-    validation_error = _validate_trade_input(action, quantity, current_price)
-    if validation_error:
-        return validation_error
+    signed = quantity if action == "buy" else -quantity
+    new_quantity = held + signed
 
-    # Fetch challenge
-    challenge: Optional[Challenge] = Challenge.query.get(challenge_id)
-    if not challenge:
-        return {"error": "Challenge not found", "message": f"Challenge {challenge_id} does not exist"}
-    if challenge.status != "active":
-        return {"error": "Challenge inactive", "message": f"Challenge {challenge_id} status is '{challenge.status}'"}
+    if abs(held) < QUANTITY_EPSILON or (held > 0) == (signed > 0):
+        # Opening or adding to the position
+        new_avg_cost = (abs(held) * avg_cost + quantity * price) / abs(new_quantity)
+        return new_quantity, new_avg_cost, 0.0, abs(held) < QUANTITY_EPSILON
+
+    # Reducing, closing or flipping the position
+    closed = min(abs(held), quantity)
+    direction = 1.0 if held > 0 else -1.0
+    realized = (price - avg_cost) * closed * direction
+    if abs(new_quantity) < QUANTITY_EPSILON:
+        return 0.0, 0.0, realized, False
+    if (new_quantity > 0) != (held > 0):
+        return new_quantity, price, realized, True
+    return new_quantity, avg_cost, realized, False
+
+
+def _update_position(challenge: Challenge, symbol: str, action: str, quantity: float,
+                     price: float, now: datetime) -> Tuple[Position, float]:
+    """
+    Fold a trade into the challenge's position in `symbol` (no commit), see _fold_position.
+
+    Returns:
+        Tuple[Position, float]: The updated position and the realized P&L of this trade
+    """
+    position = Position.query.filter_by(challenge_id=challenge.id, symbol=symbol).first()
+    if position is None:
+        position = Position(challenge_id=challenge.id, symbol=symbol, quantity=0.0, avg_cost=0.0, realized_pnl=0.0)
+        db.session.add(position)
+
+    new_quantity, avg_cost, realized, opened = _fold_position(
+        position.quantity or 0.0, position.avg_cost or 0.0, action, quantity, price
+    )
+    position.avg_cost = avg_cost
+    if opened:
+        position.opened_at = now
+    elif new_quantity == 0.0:
+        position.opened_at = None
+
+    position.quantity = new_quantity
+    position.realized_pnl = round((position.realized_pnl or 0.0) + realized, 2)
+    return position, round(realized, 2)
+
+
+def _apply_trade(challenge: Challenge, snapshot: ChallengeDailyBalance, symbol: str, action: str,
+                 quantity: float, current_price: float, now: datetime) -> Tuple[Trade, Position]:
+    """Apply one validated trade to a locked challenge, its position and day snapshot (no commit)."""
+    symbol = symbol.upper().strip()
+    position, realized_pnl = _update_position(challenge, symbol, action, float(quantity), float(current_price), now)
 
     # Compute trade value
     total_value = round(quantity * current_price, 2)
@@ -82,81 +182,271 @@ def execute_trade(challenge_id: int, symbol: str, action: str, quantity: float,
     # Create trade record
     trade = Trade(
         challenge_id=challenge.id,
-        symbol=symbol.upper().strip(),
+        symbol=symbol,
         action=action,
         quantity=float(quantity),
         price=float(current_price),
         total_value=total_value,
         balance_after_trade=new_balance,
-        created_at=datetime.utcnow(),
+        profit_loss=realized_pnl,
+        created_at=now,
     )
 
-    # Persist changes
     challenge.current_balance = new_balance
+    _record_trade_in_snapshot(snapshot, new_balance, total_value)
     db.session.add(trade)
-    db.session.add(challenge)
-    db.session.commit()
+    return trade, position
 
-    # Calculate PnL percent vs initial starting balance
+
+def _challenge_summary(challenge: Challenge) -> Dict[str, Any]:
+    """Balance and status fields returned to the trade routes."""
     pnl_percent = 0.0
     if challenge.starting_balance and challenge.starting_balance > 0:
         pnl_percent = ((challenge.current_balance - challenge.starting_balance) / challenge.starting_balance) * 100
-
     return {
-        "challenge_id": challenge.id,
-        "trade": trade.to_dict(),
+        "id": challenge.id,
         "current_balance": challenge.current_balance,
-        "pnl_percent": round(pnl_percent, 2),
+        "starting_balance": challenge.starting_balance,
         "status": challenge.status,
+        "pnl_percent": round(pnl_percent, 2),
     }
 
 
+def execute_trade(challenge_id: int, symbol: str, action: str, quantity: float, current_price: float,
+                  user_id: Optional[int] = None,
+                  before_commit: Optional[Callable[[Trade], None]] = None) -> Dict[str, Any]:
+    """
+    Execute a trade for a challenge in a single transaction.
+    - Lock the challenge row (and verify ownership when user_id is given)
+    - Verify challenge is active
+    - Calculate trade value and update challenge.current_balance
+    - Create Trade record and update the day snapshot
+    - Check challenge rules in memory
+    - Commit once and return the trade confirmation, rule check and challenge summary
+
+    before_commit, if given, runs in the same transaction once the trade is
+    flushed (e.g. to mark a resting order filled); raising rolls the trade back.
+    """
+    # Validate inputs
+    validation_error = _validate_trade_input(action, quantity, current_price)
+    if validation_error:
+        return validation_error
+
+    try:
+        with stage("db"):
+            challenge = _lock_challenge(challenge_id)
+            if not challenge:
+                db.session.rollback()
+                return {"error": "Challenge not found", "message": f"Challenge {challenge_id} does not exist"}
+            if user_id is not None and challenge.user_id != user_id:
+                db.session.rollback()
+                return {"error": "Unauthorized", "message": "This challenge does not belong to you"}
+            if challenge.status != "active":
+                db.session.rollback()
+                return {"error": "Challenge inactive", "message": f"Challenge {challenge_id} status is '{challenge.status}'"}
+
+            # Day-open snapshot (rolled over on the first trade of a UTC day)
+            now = datetime.utcnow()
+            snapshot = _get_day_snapshot(challenge, now)
+
+            trade, position = _apply_trade(challenge, snapshot, symbol, action, quantity, current_price, now)
+
+        with stage("rules"):
+            rule_check = _evaluate_rules(challenge, snapshot, now)
+
+        # Flush to assign the trade id, then build the response before committing
+        # (committing expires the instances and would force reloads)
+        with stage("db"):
+            db.session.flush()
+            if before_commit is not None:
+                before_commit(trade)
+        summary = _challenge_summary(challenge)
+        result = {
+            "challenge_id": challenge.id,
+            "trade": trade.to_dict(),
+            "current_balance": challenge.current_balance,
+            "pnl_percent": summary["pnl_percent"],
+            "status": challenge.status,
+            "challenge": summary,
+            "rule_check": rule_check,
+        }
+        event = _trade_event(challenge, position)
+        with stage("db"):
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception(f"Trade failed for challenge {challenge_id}")
+        return {"error": "Trade failed", "message": "The trade could not be executed"}
+
+    _notify_trade_listeners(event)
+    return result
+
+
+def execute_trade_batch(challenge_id: int, orders: List[Dict[str, Any]], prices: Dict[str, float],
+                        user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Execute several orders for one challenge in a single transaction.
+    - Validate every order up front (nothing runs if one is invalid)
+    - Lock the challenge row once and apply the orders in sequence
+    - Evaluate the challenge rules once, after the last order
+    - Commit once
+
+    Args:
+        challenge_id: Challenge to trade on
+        orders: List of {symbol, action, quantity}
+        prices: Execution price per upper-cased symbol
+        user_id: Owner to verify (optional)
+
+    Returns:
+        dict with per-order results, the challenge summary and the rule check,
+        or an error dict (with per-order 'results' for validation errors)
+    """
+    if not orders:
+        return {"error": "Invalid batch", "message": "orders must be a non-empty list"}
+    if len(orders) > MAX_BATCH_ORDERS:
+        return {"error": "Invalid batch", "message": f"At most {MAX_BATCH_ORDERS} orders per batch"}
+
+    normalized = []
+    results = []
+    for index, order in enumerate(orders):
+        symbol = str(order.get("symbol") or "").upper().strip()
+        action = order.get("action")
+        quantity = _as_number(order.get("quantity"))
+        error = None
+        if not symbol:
+            error = {"error": "Missing field", "message": "symbol is required"}
+        else:
+            error = _validate_trade_input(action, quantity, prices.get(symbol))
+        results.append({"index": index, "symbol": symbol, "status": "rejected" if error else "valid", **(error or {})})
+        normalized.append((symbol, action, quantity))
+    if any(r["status"] == "rejected" for r in results):
+        return {"error": "Invalid batch", "message": "One or more orders are invalid", "results": results}
+
+    try:
+        challenge = _lock_challenge(challenge_id)
+        if not challenge:
+            db.session.rollback()
+            return {"error": "Challenge not found", "message": f"Challenge {challenge_id} does not exist"}
+        if user_id is not None and challenge.user_id != user_id:
+            db.session.rollback()
+            return {"error": "Unauthorized", "message": "This challenge does not belong to you"}
+        if challenge.status != "active":
+            db.session.rollback()
+            return {"error": "Challenge inactive", "message": f"Challenge {challenge_id} status is '{challenge.status}'"}
+
+        now = datetime.utcnow()
+        snapshot = _get_day_snapshot(challenge, now)
+
+        applied = []
+        positions: Dict[str, Position] = {}
+        for symbol, action, quantity in normalized:
+            trade, position = _apply_trade(challenge, snapshot, symbol, action, quantity, prices[symbol], now)
+            applied.append(trade)
+            positions[symbol] = position
+        rule_check = _evaluate_rules(challenge, snapshot, now)
+
+        db.session.flush()
+        summary = _challenge_summary(challenge)
+        result = {
+            "challenge_id": challenge.id,
+            "results": [
+                {"index": index, "symbol": trade.symbol, "status": "executed", "trade": trade.to_dict()}
+                for index, trade in enumerate(applied)
+            ],
+            "current_balance": challenge.current_balance,
+            "pnl_percent": summary["pnl_percent"],
+            "status": challenge.status,
+            "challenge": summary,
+            "rule_check": rule_check,
+        }
+        events = [_trade_event(challenge, position) for position in positions.values()]
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception(f"Trade batch failed for challenge {challenge_id}")
+        return {"error": "Trade failed", "message": "The trades could not be executed"}
+
+    for event in events:
+        _notify_trade_listeners(event)
+    return result
+
+
+def get_positions(challenge_id: int, open_only: bool = False) -> List[Position]:
+    """Positions of a challenge from one indexed read (optionally only non-flat ones)."""
+    query = Position.query.filter(Position.challenge_id == challenge_id)
+    if open_only:
+        query = query.filter(Position.quantity != 0)
+    return query.order_by(Position.symbol.asc()).all()
+
+
 def _get_start_of_day(dt: Optional[datetime] = None) -> datetime:
     dt = dt or datetime.utcnow()
     return dt.replace(hour=0, minute=0, second=0, microsecond=0)
 
 
-def _get_today_trades(challenge_id: int) -> List[Trade]:
-    start_of_day = _get_start_of_day()
-    return Trade.query.filter(Trade.challenge_id == challenge_id, Trade.created_at >= start_of_day).order_by(Trade.created_at.asc()).all()
+def _get_day_snapshot(challenge: Challenge, now: Optional[datetime] = None, create: bool = True) -> Optional[ChallengeDailyBalance]:
+    """
+    Get the challenge's balance snapshot for the UTC day of `now`.
+    Snapshots are normally opened by the end-of-day rollover job; when missing
+    and `create` is set, the day is rolled over here: the open balance is the
+    balance after the last trade before the day started (or the starting
+    balance if there is none), which is a single indexed lookup once per day.
+    """
+    day_start = _get_start_of_day(now)
+    day: date = day_start.date()
+    snapshot = ChallengeDailyBalance.query.filter_by(challenge_id=challenge.id, day=day).first()
+    if snapshot is not None or not create:
+        return snapshot
+
+    last_before = Trade.query.filter(
+        Trade.challenge_id == challenge.id, Trade.created_at < day_start
+    ).order_by(Trade.created_at.desc()).first()
+    open_balance = last_before.balance_after_trade if last_before else challenge.starting_balance
 
+    snapshot = ChallengeDailyBalance(
+        challenge_id=challenge.id,
+        day=day,
+        open_balance=open_balance,
+        high_balance=max(open_balance, challenge.current_balance),
+        low_balance=min(open_balance, challenge.current_balance),
+        close_balance=challenge.current_balance,
+        trade_count=0,
+        volume=0.0,
+    )
+    # Savepoint: the rollover job may insert the same row concurrently
+    try:
+        with db.session.begin_nested():
+            db.session.add(snapshot)
+    except IntegrityError:
+        snapshot = ChallengeDailyBalance.query.filter_by(challenge_id=challenge.id, day=day).first()
+    return snapshot
 
-def _get_last_trade_before_today(challenge_id: int) -> Optional[Trade]:
-    start_of_day = _get_start_of_day()
-    return Trade.query.filter(Trade.challenge_id == challenge_id, Trade.created_at < start_of_day).order_by(Trade.created_at.desc()).first()
 
+def _record_trade_in_snapshot(snapshot: ChallengeDailyBalance, new_balance: float, total_value: float) -> None:
+    """Fold a trade's resulting balance and value into the day snapshot."""
+    snapshot.close_balance = new_balance
+    snapshot.high_balance = max(snapshot.high_balance, new_balance)
+    snapshot.low_balance = min(snapshot.low_balance, new_balance)
+    snapshot.trade_count = (snapshot.trade_count or 0) + 1
+    snapshot.volume = round((snapshot.volume or 0.0) + total_value, 2)
 
-def check_challenge_rules(challenge_id: int) -> Dict[str, Any]:
+
+def _evaluate_rules(challenge: Challenge, snapshot: Optional[ChallengeDailyBalance],
+                    now: Optional[datetime] = None) -> Dict[str, Any]:
     """
-    Check challenge rules:
+    Evaluate challenge rules against in-memory state and apply any status change
+    to the challenge (the caller commits):
       * Daily loss > max_daily_loss_percent -> fail (reason: max_daily_loss)
       * Total loss > max_total_loss_percent -> fail (reason: max_total_loss)
       * Profit > profit_target_percent -> pass (reason: profit_target)
-    Updates challenge status if rules are triggered and returns the status update.
     """
-    challenge: Optional[Challenge] = Challenge.query.get(challenge_id)
-    if not challenge:
-        return {"error": "Challenge not found", "message": f"Challenge {challenge_id} does not exist"}
-
-    # Establish starting balance for the day
-    last_before = _get_last_trade_before_today(challenge_id)
-    if last_before:
-        starting_balance_today = last_before.balance_after_trade
-    else:
-        # Fallback: if the challenge existed before today, use current_balance as of start of day; lacking a snapshot, use current state
-        # If created today, use initial starting_balance
-        start_of_day = _get_start_of_day()
-        if challenge.created_at and challenge.created_at < start_of_day:
-            starting_balance_today = challenge.current_balance
-        else:
-            starting_balance_today = challenge.starting_balance
-
-    # Today's end balance
-    today_trades = _get_today_trades(challenge_id)
-    if today_trades:
-        end_balance_today = today_trades[-1].balance_after_trade
+    # Day-open balance from the daily snapshot; without one there were no
+    # trades today, so the balance has not moved since the day opened
+    if snapshot is not None:
+        starting_balance_today = snapshot.open_balance
     else:
-        end_balance_today = starting_balance_today
+        starting_balance_today = challenge.current_balance
+    end_balance_today = challenge.current_balance
 
     # Daily loss percent
     daily_loss_percent = 0.0
@@ -189,9 +479,9 @@ def check_challenge_rules(challenge_id: int) -> Dict[str, Any]:
     # Apply updates if needed
     if status_change and challenge.status != status_change:
         challenge.status = status_change
-        challenge.ended_at = datetime.utcnow()
-        db.session.add(challenge)
-        db.session.commit()
+        challenge.ended_at = now or datetime.utcnow()
+        if status_change == "failed":
+            challenge.failure_reason = reason
 
     return {
         "challenge_id": challenge.id,
@@ -203,6 +493,28 @@ def check_challenge_rules(challenge_id: int) -> Dict[str, Any]:
             "profit_percent": round(profit_percent, 2),
             "starting_balance_today": round(starting_balance_today, 2) if starting_balance_today is not None else None,
             "end_balance_today": round(end_balance_today, 2) if end_balance_today is not None else None,
+            "low_balance_today": round(snapshot.low_balance, 2) if snapshot is not None else round(end_balance_today, 2),
+            "trades_today": snapshot.trade_count if snapshot is not None else 0,
         },
         "updated": bool(status_change),
     }
+
+
+def check_challenge_rules(challenge_id: int) -> Dict[str, Any]:
+    """
+    Check challenge rules (see _evaluate_rules) for a stored challenge.
+    Updates challenge status if rules are triggered and returns the status update.
+    """
+    challenge: Optional[Challenge] = Challenge.query.get(challenge_id)
+    if not challenge:
+        return {"error": "Challenge not found", "message": f"Challenge {challenge_id} does not exist"}
+
+    snapshot = _get_day_snapshot(challenge, create=False)
+    result = _evaluate_rules(challenge, snapshot)
+
+    if db.session.is_modified(challenge):
+        db.session.commit()
+        from services.challenge_cache import bump_challenge_version  # the cache module imports this one
+        bump_challenge_version(challenge_id)
+
+    return result
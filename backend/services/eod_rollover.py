@@ -0,0 +1,116 @@
+"""
+End-of-Day Rollover Service
+Runs at each UTC day boundary (see services/scheduler.py) for all challenges:
+1. Evaluates the rules that may have been breached overnight, in bulk:
+   the closed day's daily loss from its snapshot, then total loss, then the
+   profit target (same priority as challenge_engine._evaluate_rules)
+2. Opens the new day's balance snapshot of every still-active challenge
+   with one INSERT ... SELECT
+Every statement is guarded (status = 'active', snapshot not already present),
+so a re-run or a run racing with trades does not change anything twice.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import Date, DateTime, Float, Integer, literal, select
+
+from extensions import db
+from models import Challenge, ChallengeDailyBalance
+from services.challenge_cache import bump_all_challenge_versions
+
+JOB_NAME = 'eod_rollover'
+
+
+def rollover_day(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Close the previous UTC day and open the current one (call inside an app context).
+
+    Returns:
+        dict: {day, failed_max_daily_loss, failed_max_total_loss, passed_profit_target, snapshots_opened}
+    """
+    now = now or datetime.utcnow()
+    day: date = now.date()
+    previous_day = day - timedelta(days=1)
+
+    challenges = Challenge.__table__
+    snapshots = ChallengeDailyBalance.__table__
+    active = challenges.c.status == 'active'
+
+    # 1a. Daily loss over the day that just closed
+    daily_breach = select(literal(1)).where(
+        snapshots.c.challenge_id == challenges.c.id,
+        snapshots.c.day == previous_day,
+        snapshots.c.open_balance > 0,
+        (snapshots.c.open_balance - snapshots.c.close_balance) * 100
+        > snapshots.c.open_balance * challenges.c.max_daily_loss_percent,
+    ).exists()
+    failed_daily = db.session.execute(
+        challenges.update().where(active, daily_breach)
+        .values(status='failed', failure_reason='max_daily_loss', ended_at=now)
+    ).rowcount
+
+    # 1b. Total loss against the starting balance
+    failed_total = db.session.execute(
+        challenges.update().where(
+            active,
+            challenges.c.starting_balance > 0,
+            (challenges.c.starting_balance - challenges.c.current_balance) * 100
+            > challenges.c.starting_balance * challenges.c.max_total_loss_percent,
+        ).values(status='failed', failure_reason='max_total_loss', ended_at=now)
+    ).rowcount
+
+    # 1c. Profit target
+    passed = db.session.execute(
+        challenges.update().where(
+            active,
+            challenges.c.starting_balance > 0,
+            (challenges.c.current_balance - challenges.c.starting_balance) * 100
+            > challenges.c.starting_balance * challenges.c.profit_target_percent,
+        ).values(status='passed', ended_at=now)
+    ).rowcount
+
+    # 2. Day-open snapshots for every still-active challenge without one
+    missing = ~select(literal(1)).where(
+        snapshots.c.challenge_id == challenges.c.id,
+        snapshots.c.day == day,
+    ).exists()
+    opened = db.session.execute(
+        snapshots.insert().from_select(
+            ['challenge_id', 'day', 'open_balance', 'high_balance', 'low_balance', 'close_balance',
+             'trade_count', 'volume', 'updated_at'],
+            select(
+                challenges.c.id,
+                literal(day, Date),
+                challenges.c.current_balance,
+                challenges.c.current_balance,
+                challenges.c.current_balance,
+                challenges.c.current_balance,
+                literal(0, Integer),
+                literal(0.0, Float),
+                literal(now, DateTime),
+            ).where(active, missing),
+        )
+    ).rowcount
+
+    db.session.commit()
+    if failed_daily or failed_total or passed:
+        bump_all_challenge_versions()
+    return {
+        'day': day.isoformat(),
+        'failed_max_daily_loss': failed_daily,
+        'failed_max_total_loss': failed_total,
+        'passed_profit_target': passed,
+        'snapshots_opened': opened,
+    }
+
+
+def start_eod_rollover(app):
+    """Start the app's daily rollover job (idempotent)."""
+    from services.scheduler import DailyJob
+
+    job = app.extensions.get(JOB_NAME)
+    if job is None:
+        job = DailyJob(app, JOB_NAME, rollover_day)
+        app.extensions[JOB_NAME] = job
+    job.start()
+    return job
@@ -0,0 +1,123 @@
+"""
+Equity Curve Service
+Balance-over-time series of a challenge at three resolutions:
+  * day   - straight from the daily rollups (challenge_daily_balances), one row per day
+  * hour  - OHLC buckets built from the trades of a bounded window, seeded with
+            the rollup open balance of its first day
+  * trade - balance_after_trade of every trade in a bounded window
+Intraday resolutions read at most MAX_INTRADAY_DAYS of trades through the
+(challenge_id, created_at, id) index.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from extensions import db
+from models import Challenge, ChallengeDailyBalance, Trade
+
+RESOLUTIONS = ('trade', 'hour', 'day')
+DEFAULT_INTRADAY_DAYS = 7
+MAX_INTRADAY_DAYS = 31
+
+
+def _daily_points(challenge_id: int, start: Optional[date], end: Optional[date]) -> List[Dict[str, Any]]:
+    query = db.session.query(
+        ChallengeDailyBalance.day, ChallengeDailyBalance.open_balance, ChallengeDailyBalance.high_balance,
+        ChallengeDailyBalance.low_balance, ChallengeDailyBalance.close_balance,
+        ChallengeDailyBalance.trade_count, ChallengeDailyBalance.volume,
+    ).filter(ChallengeDailyBalance.challenge_id == challenge_id)
+    if start:
+        query = query.filter(ChallengeDailyBalance.day >= start)
+    if end:
+        query = query.filter(ChallengeDailyBalance.day <= end)
+    return [
+        {'t': day, 'open': open_, 'high': high, 'low': low, 'close': close, 'trade_count': count, 'volume': volume}
+        for day, open_, high, low, close, count, volume in query.order_by(ChallengeDailyBalance.day.asc()).all()
+    ]
+
+
+def _open_balance_at(challenge: Challenge, start: date) -> float:
+    """Balance when `start` began: its rollup open, else the last earlier rollup close."""
+    row = db.session.query(
+        ChallengeDailyBalance.day, ChallengeDailyBalance.open_balance, ChallengeDailyBalance.close_balance
+    ).filter(
+        ChallengeDailyBalance.challenge_id == challenge.id, ChallengeDailyBalance.day <= start
+    ).order_by(ChallengeDailyBalance.day.desc()).first()
+    if row is None:
+        return challenge.starting_balance
+    day, open_balance, close_balance = row
+    return open_balance if day == start else close_balance
+
+
+def _window_trades(challenge_id: int, start: date, end: date) -> List[tuple]:
+    """(id, created_at, balance_after_trade, total_value) of the window's trades, oldest first."""
+    return db.session.query(
+        Trade.id, Trade.created_at, Trade.balance_after_trade, Trade.total_value
+    ).filter(
+        Trade.challenge_id == challenge_id,
+        Trade.created_at >= datetime.combine(start, datetime.min.time()),
+        Trade.created_at < datetime.combine(end + timedelta(days=1), datetime.min.time()),
+    ).order_by(Trade.created_at.asc(), Trade.id.asc()).all()
+
+
+def _hourly_points(trades: List[tuple], open_balance: float) -> List[Dict[str, Any]]:
+    points: List[Dict[str, Any]] = []
+    previous_close = open_balance
+    for _, created_at, balance, value in trades:
+        hour = created_at.replace(minute=0, second=0, microsecond=0)
+        if not points or points[-1]['t'] != hour:
+            points.append({'t': hour, 'open': previous_close, 'high': previous_close, 'low': previous_close,
+                           'close': previous_close, 'trade_count': 0, 'volume': 0.0})
+        bucket = points[-1]
+        bucket['high'] = max(bucket['high'], balance)
+        bucket['low'] = min(bucket['low'], balance)
+        bucket['close'] = balance
+        bucket['trade_count'] += 1
+        bucket['volume'] = round(bucket['volume'] + value, 2)
+        previous_close = balance
+    return points
+
+
+def get_equity_curve(challenge: Challenge, resolution: str = 'day',
+                     start: Optional[date] = None, end: Optional[date] = None) -> Dict[str, Any]:
+    """
+    Build the equity curve of a challenge.
+
+    Args:
+        challenge: Challenge (ownership already verified)
+        resolution: 'trade', 'hour' or 'day'
+        start, end: Inclusive UTC day range; intraday resolutions default to the
+            last DEFAULT_INTRADAY_DAYS and are limited to MAX_INTRADAY_DAYS
+
+    Returns:
+        dict: {challenge_id, resolution, from, to, starting_balance, current_balance, points, count}
+        or an error dict
+    """
+    if resolution not in RESOLUTIONS:
+        return {'error': 'Invalid resolution', 'message': f"resolution must be one of: {', '.join(RESOLUTIONS)}"}
+    if start and end and start > end:
+        return {'error': 'Invalid range', 'message': "'from' must not be after 'to'"}
+
+    if resolution == 'day':
+        points = _daily_points(challenge.id, start, end)
+    else:
+        end = end or datetime.utcnow().date()
+        start = start or end - timedelta(days=DEFAULT_INTRADAY_DAYS - 1)
+        if (end - start).days + 1 > MAX_INTRADAY_DAYS:
+            return {'error': 'Invalid range', 'message': f'{resolution} resolution covers at most {MAX_INTRADAY_DAYS} days'}
+        trades = _window_trades(challenge.id, start, end)
+        if resolution == 'hour':
+            points = _hourly_points(trades, _open_balance_at(challenge, start))
+        else:
+            points = [{'t': created_at, 'trade_id': trade_id, 'balance': balance, 'volume': value}
+                      for trade_id, created_at, balance, value in trades]
+
+    return {
+        'challenge_id': challenge.id,
+        'resolution': resolution,
+        'from': start,
+        'to': end,
+        'starting_balance': challenge.starting_balance,
+        'current_balance': challenge.current_balance,
+        'points': points,
+        'count': len(points),
+    }
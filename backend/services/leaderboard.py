@@ -0,0 +1,534 @@
+"""
+Leaderboard Service
+In-memory rankings of challenges by profit percent, served without DB queries.
+- RankedSet: sorted (score, id) keys held in fixed-size blocks of two parallel
+  typed arrays (16 bytes a key, no per-key Python objects) with a Fenwick tree
+  over the block sizes, so insert/remove, "rank of key" and "key at rank" are
+  O(log n) (plus a short in-block memmove)
+- Leaderboard: one RankedSet per (period, plan) dimension - challenges created
+  this week / this month / ever, for all plans or one plan_type. All of them
+  are rebuilt from the DB on first use and by the first read once the board
+  is older than LEADERBOARD_RELOAD_SECONDS (or on that interval by a thread,
+  with LEADERBOARD_ENABLED), which is how writes made by other workers
+  arrive. In between they are updated incrementally: from the trade events
+  of challenge_engine, and from the change events of challenge_cache
+  (creations, status updates, rule checks, deletions), which re-read just
+  those challenges; a bulk change (the day rollover) makes the next read
+  rebuild everything. Updates that arrive while a rebuild reads the DB are
+  replayed on its result.
+  The week and month sets are re-filtered in memory when a new UTC week or
+  month starts
+A user's rank is the rank of their best challenge in the dimension.
+"""
+import bisect
+import logging
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from datetime import time as day_time
+from functools import partial
+from itertools import islice
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from flask import current_app
+
+from extensions import db
+from models import Challenge, User
+from services.challenge_cache import register_change_listener
+from services.challenge_engine import register_trade_listener
+
+logger = logging.getLogger(__name__)
+
+RANKED_STATUSES = ('active', 'passed')
+PERIODS = ('week', 'month', 'all')
+
+# Target block length of RankedSet (blocks split at twice this size)
+BLOCK_SIZE = 512
+
+# (score, id): ascending score first, ties by ascending id
+Key = Tuple[float, int]
+# (period, plan_type or None for all plans)
+Dimension = Tuple[str, Optional[str]]
+Block = Tuple[array, array]
+
+
+class RankedSet:
+    """Sorted set of unique (float score, int id) keys with O(log n) rank and select."""
+
+    def __init__(self, keys: Optional[List[Key]] = None):
+        self._build(sorted(keys or []))
+
+    @staticmethod
+    def _block(keys: List[Key]) -> Block:
+        return array('d', [key[0] for key in keys]), array('q', [key[1] for key in keys])
+
+    @staticmethod
+    def _bisect(block: Block, key: Key) -> int:
+        """Position of `key` in a block (bisect_left on (score, id))."""
+        scores, ids = block
+        lo = bisect.bisect_left(scores, key[0])
+        hi = bisect.bisect_right(scores, key[0], lo)
+        return bisect.bisect_left(ids, key[1], lo, hi)
+
+    def _build(self, keys: List[Key]) -> None:
+        self._blocks: List[Block] = [self._block(keys[i:i + BLOCK_SIZE]) for i in range(0, len(keys), BLOCK_SIZE)]
+        self._maxes: List[Key] = [(scores[-1], ids[-1]) for scores, ids in self._blocks]
+        self._len = len(keys)
+        self._rebuild_index()
+
+    def _rebuild_index(self) -> None:
+        # Fenwick tree (1-based) over block lengths
+        n = len(self._blocks)
+        tree = [0] * (n + 1)
+        for i, (scores, _) in enumerate(self._blocks, start=1):
+            tree[i] += len(scores)
+            parent = i + (i & -i)
+            if parent <= n:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _tree_add(self, block_index: int, delta: int) -> None:
+        i = block_index + 1
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _tree_prefix(self, block_index: int) -> int:
+        """Number of keys in blocks before `block_index`."""
+        total, i = 0, block_index
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def _tree_find(self, index: int) -> Tuple[int, int]:
+        """(block index, offset in block) of the key at 0-based position `index`."""
+        position, remaining = 0, index
+        step = 1 << (len(self._tree) - 1).bit_length()
+        while step:
+            nxt = position + step
+            if nxt < len(self._tree) and self._tree[nxt] <= remaining:
+                position = nxt
+                remaining -= self._tree[nxt]
+            step >>= 1
+        return position, remaining
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, key: Key) -> bool:
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return False
+        scores, ids = block = self._blocks[i]
+        j = self._bisect(block, key)
+        return j < len(scores) and scores[j] == key[0] and ids[j] == key[1]
+
+    def add(self, key: Key) -> None:
+        if not self._blocks:
+            self._build([key])
+            return
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            i -= 1
+        scores, ids = block = self._blocks[i]
+        j = self._bisect(block, key)
+        scores.insert(j, key[0])
+        ids.insert(j, key[1])
+        self._maxes[i] = (scores[-1], ids[-1])
+        self._len += 1
+        if len(scores) > 2 * BLOCK_SIZE:
+            self._blocks[i:i + 1] = [(scores[:BLOCK_SIZE], ids[:BLOCK_SIZE]), (scores[BLOCK_SIZE:], ids[BLOCK_SIZE:])]
+            self._maxes[i:i + 1] = [(scores[BLOCK_SIZE - 1], ids[BLOCK_SIZE - 1]), (scores[-1], ids[-1])]
+            self._rebuild_index()
+        else:
+            self._tree_add(i, 1)
+
+    def discard(self, key: Key) -> bool:
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return False
+        scores, ids = block = self._blocks[i]
+        j = self._bisect(block, key)
+        if j == len(scores) or scores[j] != key[0] or ids[j] != key[1]:
+            return False
+        del scores[j]
+        del ids[j]
+        self._len -= 1
+        if scores:
+            self._maxes[i] = (scores[-1], ids[-1])
+            self._tree_add(i, -1)
+        else:
+            del self._blocks[i]
+            del self._maxes[i]
+            self._rebuild_index()
+        return True
+
+    def rank(self, key: Key) -> int:
+        """0-based position of `key` (or where it would be inserted)."""
+        i = bisect.bisect_left(self._maxes, key)
+        if i == len(self._blocks):
+            return self._len
+        return self._tree_prefix(i) + self._bisect(self._blocks[i], key)
+
+    def iter_from(self, index: int) -> Iterator[Key]:
+        """Keys in order starting at 0-based position `index`."""
+        if index >= self._len:
+            return
+        block_index, offset = self._tree_find(max(index, 0))
+        for scores, ids in self._blocks[block_index:]:
+            yield from islice(zip(scores, ids), offset, None)
+            offset = 0
+
+
+def period_start(period: str, now: datetime) -> Optional[datetime]:
+    """Start of the UTC week (Monday) or month containing `now`; None for 'all'."""
+    day = now.date()
+    if period == 'week':
+        day -= timedelta(days=day.weekday())
+    elif period == 'month':
+        day = day.replace(day=1)
+    else:
+        return None
+    return datetime.combine(day, day_time.min)
+
+
+def _profit_percent(starting_balance: Optional[float], current_balance: Optional[float]) -> float:
+    if starting_balance and starting_balance > 0:
+        return ((current_balance or 0.0) - starting_balance) / starting_balance * 100
+    return 0.0
+
+
+class Leaderboard:
+    """Rankings of active and passed challenges by profit percent (ties: older challenge first)."""
+
+    def __init__(self, app, reload_interval: float = 300.0):
+        self.app = app
+        self.reload_interval = reload_interval
+        self.loaded_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()  # one rebuild at a time
+        self._pending: Optional[List[Callable[[], None]]] = None  # updates received during a rebuild
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._ranks: Dict[Dimension, RankedSet] = {}
+        self._starts: Dict[str, Optional[datetime]] = {}  # period -> window start of its sets
+        self._entries: Dict[int, Dict[str, Any]] = {}  # challenge_id -> entry
+        self._by_user: Dict[int, Set[int]] = {}  # user_id -> ranked challenge ids
+        self._usernames: Dict[int, str] = {}
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(entry: Dict[str, Any]) -> Key:
+        return -entry['profit_percent'], entry['challenge_id']
+
+    @staticmethod
+    def _dimensions(entry: Dict[str, Any], starts: Dict[str, Optional[datetime]]) -> List[Dimension]:
+        """Dimensions the entry is ranked in, given the window start of each period."""
+        dimensions = []
+        for period in PERIODS:
+            start = starts.get(period)
+            if start is not None and (entry['created_at'] is None or entry['created_at'] < start):
+                continue
+            dimensions.append((period, None))
+            if entry['plan_type']:
+                dimensions.append((period, entry['plan_type']))
+        return dimensions
+
+    def _build_ranks(self, entries: Dict[int, Dict[str, Any]], starts: Dict[str, Optional[datetime]],
+                     periods: Tuple[str, ...] = PERIODS) -> Dict[Dimension, RankedSet]:
+        keys: Dict[Dimension, List[Key]] = {}
+        for entry in entries.values():
+            key = self._key(entry)
+            for dimension in self._dimensions(entry, starts):
+                if dimension[0] in periods:
+                    keys.setdefault(dimension, []).append(key)
+        return {dimension: RankedSet(dimension_keys) for dimension, dimension_keys in keys.items()}
+
+    @staticmethod
+    def _read_entries(challenge_ids: Optional[Tuple[int, ...]] = None) -> Tuple[Dict[int, Dict[str, Any]], Dict[int, str]]:
+        """(challenge_id -> entry, user_id -> username) of the ranked challenges (all, or among `challenge_ids`)."""
+        query = db.session.query(
+            Challenge.id, Challenge.user_id, User.username, Challenge.plan_type, Challenge.status,
+            Challenge.starting_balance, Challenge.current_balance, Challenge.created_at,
+        ).join(User, User.id == Challenge.user_id).filter(Challenge.status.in_(RANKED_STATUSES))
+        if challenge_ids is not None:
+            query = query.filter(Challenge.id.in_(challenge_ids))
+
+        entries: Dict[int, Dict[str, Any]] = {}
+        usernames: Dict[int, str] = {}
+        for challenge_id, user_id, username, plan_type, status, starting, current, created_at in query.all():
+            entries[challenge_id] = {
+                'challenge_id': challenge_id, 'user_id': user_id, 'plan_type': plan_type, 'status': status,
+                'starting_balance': starting, 'current_balance': current, 'created_at': created_at,
+                'profit_percent': _profit_percent(starting, current),
+            }
+            usernames[user_id] = username
+        return entries, usernames
+
+    def load(self) -> None:
+        """
+        Rebuild from the DB (call inside an app context). Updates received while the
+        DB is read may be missing from what it returns, so they are replayed on it.
+        """
+        with self._load_lock:
+            self._load()
+
+    def _load(self) -> None:
+        with self._lock:
+            self._pending = []
+        try:
+            entries, usernames = self._read_entries()
+            by_user: Dict[int, Set[int]] = {}
+            for challenge_id, entry in entries.items():
+                by_user.setdefault(entry['user_id'], set()).add(challenge_id)
+            now = datetime.utcnow()
+            starts = {period: period_start(period, now) for period in PERIODS}
+            ranks = self._build_ranks(entries, starts)
+
+            with self._lock:
+                self._entries, self._by_user, self._ranks, self._starts = entries, by_user, ranks, starts
+                self._usernames.update(usernames)
+                self.loaded_at = time.monotonic()
+                for apply in self._pending:
+                    apply()
+        finally:
+            with self._lock:
+                self._pending = None
+
+    def _stale(self) -> bool:
+        loaded_at = self.loaded_at
+        return loaded_at is None or time.monotonic() - loaded_at > self.reload_interval
+
+    def ensure_loaded(self) -> None:
+        """Load on first use, and reload once older than reload_interval (writes of other workers)."""
+        if not self._stale():
+            return
+        with self._load_lock:
+            if self._stale():  # not reloaded by a concurrent read meanwhile
+                self._load()
+
+    def _roll_periods(self) -> None:
+        """Re-filter the week/month sets once a new UTC week or month has started (lock held)."""
+        now = datetime.utcnow()
+        starts = {period: period_start(period, now) for period in PERIODS}
+        rolled = tuple(period for period in PERIODS if starts[period] != self._starts.get(period))
+        if not rolled:
+            return
+        self._starts = starts
+        for dimension in [dimension for dimension in self._ranks if dimension[0] in rolled]:
+            del self._ranks[dimension]
+        self._ranks.update(self._build_ranks(self._entries, starts, rolled))
+
+    def _remove(self, challenge_id: int) -> Optional[Dict[str, Any]]:
+        entry = self._entries.pop(challenge_id, None)
+        if entry is not None:
+            key = self._key(entry)
+            for dimension in self._dimensions(entry, self._starts):
+                ranks = self._ranks.get(dimension)
+                if ranks is not None:
+                    ranks.discard(key)
+            user_challenges = self._by_user.get(entry['user_id'])
+            if user_challenges is not None:
+                user_challenges.discard(challenge_id)
+                if not user_challenges:
+                    del self._by_user[entry['user_id']]
+        return entry
+
+    def _add(self, entry: Dict[str, Any]) -> None:
+        challenge_id = entry['challenge_id']
+        self._entries[challenge_id] = entry
+        self._by_user.setdefault(entry['user_id'], set()).add(challenge_id)
+        key = self._key(entry)
+        for dimension in self._dimensions(entry, self._starts):
+            self._ranks.setdefault(dimension, RankedSet()).add(key)
+
+    def _update(self, apply: Callable[[], None]) -> None:
+        """Apply an update, and queue it for replay if a rebuild is reading the DB."""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(apply)
+            apply()
+
+    def _apply_trade(self, event: Dict[str, Any]) -> None:
+        challenge_id = event['challenge_id']
+        self._roll_periods()
+        previous = self._remove(challenge_id)
+        if event.get('status') not in RANKED_STATUSES:
+            return
+        entry = dict(previous) if previous else {
+            'challenge_id': challenge_id, 'user_id': event.get('user_id'),
+            'plan_type': event.get('plan_type'), 'created_at': event.get('created_at'),
+        }
+        entry.update(
+            status=event['status'],
+            starting_balance=event['starting_balance'],
+            current_balance=event['current_balance'],
+            profit_percent=_profit_percent(event['starting_balance'], event['current_balance']),
+        )
+        self._add(entry)
+
+    def _apply_changes(self, challenge_ids: Tuple[int, ...], entries: Dict[int, Dict[str, Any]],
+                       usernames: Dict[int, str]) -> None:
+        self._roll_periods()
+        for challenge_id in challenge_ids:
+            self._remove(challenge_id)
+        for entry in entries.values():
+            self._add(dict(entry))
+        self._usernames.update(usernames)
+
+    def _mark_stale(self) -> None:
+        self.loaded_at = None
+
+    def on_trade(self, event: Dict[str, Any]) -> None:
+        """Trade listener: re-rank the challenge in each of its dimensions (cheap, no DB access)."""
+        self._update(partial(self._apply_trade, event))
+
+    def on_challenges_changed(self, challenge_ids: Optional[Tuple[int, ...]]) -> None:
+        """
+        Challenge change listener: re-read the challenges and re-rank them (or drop
+        the ones no longer ranked or deleted). A bulk change (None) marks the board
+        stale, so the next read or the reload thread rebuilds it.
+        """
+        if challenge_ids is None:
+            self._update(self._mark_stale)
+            return
+        with self._lock:
+            idle = self.loaded_at is None and self._pending is None
+        if idle:
+            return  # not built yet: the first load reads them
+        entries, usernames = self._read_entries(challenge_ids)
+        self._update(partial(self._apply_changes, challenge_ids, entries, usernames))
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _row(self, rank: int, challenge_id: int) -> Dict[str, Any]:
+        entry = self._entries[challenge_id]
+        return {
+            'rank': rank,
+            'user_id': entry['user_id'],
+            'username': self._usernames.get(entry['user_id']),
+            'challenge_id': challenge_id,
+            'profit_percent': round(entry['profit_percent'], 2),
+            'starting_balance': round(entry['starting_balance'], 2),
+            'current_balance': round(entry['current_balance'], 2),
+            'status': entry['status'],
+            'plan_type': entry['plan_type'],
+        }
+
+    def page(self, offset: int = 0, limit: int = 10, period: str = 'all', plan: Optional[str] = None,
+             after: Optional[Key] = None) -> Tuple[List[Dict[str, Any]], int, Optional[Key]]:
+        """
+        One page of a dimension's ranking.
+
+        Args:
+            offset: 0-based rank to start at (ignored when `after` is given)
+            limit: Page size
+            period, plan: Dimension ('week' | 'month' | 'all', plan_type or None for all plans)
+            after: Key of the previous page's last row; the page starts right after it,
+                   even if that challenge has moved or left the ranking since
+
+        Returns:
+            Tuple of (rows, total ranked in the dimension, key of the last row or None on the last page)
+        """
+        with self._lock:
+            self._roll_periods()
+            ranks = self._ranks.get((period, plan))
+            if ranks is None:
+                return [], 0, None
+            if after is not None:
+                offset = ranks.rank(after) + (1 if after in ranks else 0)
+            rows: List[Dict[str, Any]] = []
+            last: Optional[Key] = None
+            for position, key in enumerate(ranks.iter_from(offset), start=offset + 1):
+                if len(rows) >= limit:
+                    return rows, len(ranks), last
+                rows.append(self._row(position, key[1]))
+                last = key
+            return rows, len(ranks), None
+
+    def user_rank(self, user_id: int, period: str = 'all', plan: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Row of the user's best-ranked challenge in the dimension, or None if the user has none ranked there."""
+        with self._lock:
+            self._roll_periods()
+            ranks = self._ranks.get((period, plan))
+            challenge_ids = self._by_user.get(user_id)
+            if not ranks or not challenge_ids:
+                return None
+            keys = [key for key in (self._key(self._entries[cid]) for cid in challenge_ids) if key in ranks]
+            if not keys:
+                return None
+            best = min(keys)
+            row = self._row(ranks.rank(best) + 1, best[1])
+            row['ranked_challenges'] = len(keys)
+            row['total'] = len(ranks)
+            return row
+
+    def resolve_usernames(self, rows: List[Dict[str, Any]]) -> None:
+        """Fill usernames of users first seen through a trade event (until the next reload)."""
+        missing = {row['user_id'] for row in rows if row['username'] is None}
+        if not missing:
+            return
+        names = dict(db.session.query(User.id, User.username).filter(User.id.in_(missing)).all())
+        with self._lock:
+            self._usernames.update(names)
+        for row in rows:
+            if row['username'] is None:
+                row['username'] = names.get(row['user_id'])
+
+    # ------------------------------------------------------------------
+    # Thread
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='leaderboard', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    self.load()
+            except Exception as e:
+                logger.exception(f"Leaderboard reload failed: {e}")
+            self._stop.wait(self.reload_interval)
+
+
+_leaderboard_lock = threading.Lock()
+
+
+def _create_leaderboard(app) -> Leaderboard:
+    with _leaderboard_lock:
+        board = app.extensions.get('leaderboard')
+        if board is None:
+            board = Leaderboard(app, reload_interval=app.config.get('LEADERBOARD_RELOAD_SECONDS', 300.0))
+            register_trade_listener(board.on_trade)
+            register_change_listener(board.on_challenges_changed)
+            app.extensions['leaderboard'] = board
+    return board
+
+
+def get_leaderboard() -> Leaderboard:
+    """The current app's leaderboard, loaded from the DB on first use."""
+    board = current_app.extensions.get('leaderboard') or _create_leaderboard(current_app._get_current_object())
+    board.ensure_loaded()
+    return board
+
+
+def start_leaderboard(app) -> Leaderboard:
+    """Create the app's leaderboard and start its periodic reload (idempotent)."""
+    board = _create_leaderboard(app)
+    board.start()
+    return board
@@ -0,0 +1,160 @@
+"""
+Monthly Leaderboard Service
+Ranks the active and passed challenges created in a UTC month by profit percent.
+- An open month is ranked live, filtered with a half-open created_at range
+  that the (created_at, status) index of challenges serves directly
+- A daily job (see services/scheduler.py) freezes the final ranking of the
+  month that just closed into leaderboard_snapshots with one INSERT ... SELECT,
+  so a past month is a single read of the (month, rank) index
+- Each freeze also records its month in leaderboard_snapshot_months, so a
+  month that ranked no one reads as frozen and empty
+The freeze is guarded (month unique in leaderboard_snapshot_months), so a
+re-run changes nothing.
+"""
+from datetime import date, datetime, time, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import Date, DateTime, case, func, literal, select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import Challenge, LeaderboardSnapshot, LeaderboardSnapshotMonth, User
+from services.leaderboard import RANKED_STATUSES
+
+JOB_NAME = 'leaderboard_snapshot'
+
+# After the day rollover (00:00:05 UTC), so the statuses it settles are frozen
+FREEZE_AT = time(0, 5)
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def next_month(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def closed_month(day: date) -> date:
+    """The month that closed most recently before `day` (the one the freeze job handles)."""
+    return month_start(month_start(day) - timedelta(days=1))
+
+
+def _profit_percent_expr():
+    return case(
+        (Challenge.starting_balance > 0,
+         (Challenge.current_balance - Challenge.starting_balance) / Challenge.starting_balance * 100),
+        else_=0.0,
+    )
+
+
+def _month_filter(month: date):
+    """Challenges created in `month` (half-open range, no function on the column)."""
+    return (
+        Challenge.created_at >= datetime.combine(month, time.min),
+        Challenge.created_at < datetime.combine(next_month(month), time.min),
+        Challenge.status.in_(RANKED_STATUSES),
+    )
+
+
+def live_ranking(month: date, limit: int = 10) -> List[Dict[str, Any]]:
+    """Top `limit` challenges created in `month`, ranked from their current balances."""
+    profit = _profit_percent_expr()
+    rows = db.session.query(
+        Challenge.user_id, User.username, Challenge.id, Challenge.starting_balance,
+        Challenge.current_balance, Challenge.status, Challenge.plan_type, profit,
+    ).join(User, Challenge.user_id == User.id).filter(*_month_filter(month)).order_by(
+        profit.desc(), Challenge.id.asc()
+    ).limit(limit).all()
+
+    return [
+        {
+            'rank': rank,
+            'user_id': user_id,
+            'username': username,
+            'challenge_id': challenge_id,
+            'profit_percent': round(profit_percent, 2),
+            'starting_balance': round(starting_balance, 2),
+            'current_balance': round(current_balance, 2),
+            'status': status,
+            'plan_type': plan_type,
+        }
+        for rank, (user_id, username, challenge_id, starting_balance, current_balance, status, plan_type, profit_percent)
+        in enumerate(rows, start=1)
+    ]
+
+
+def snapshot_ranking(month: date, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+    """Top `limit` rows of the frozen ranking of `month` ([] if it ranked no one), or None if it is not frozen."""
+    rows = LeaderboardSnapshot.query.filter(LeaderboardSnapshot.month == month).order_by(
+        LeaderboardSnapshot.rank.asc()
+    ).limit(limit).all()
+    if rows:
+        return [row.to_dict() for row in rows]
+    frozen = db.session.query(LeaderboardSnapshotMonth.id).filter(LeaderboardSnapshotMonth.month == month).scalar()
+    return [] if frozen is not None else None
+
+
+def freeze_month(month: date, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Freeze the ranking of `month` as it stands now (call inside an app context).
+
+    Returns:
+        dict: {month, rows_frozen, already_frozen}
+    """
+    now = now or datetime.utcnow()
+    month = month_start(month)
+    snapshots = LeaderboardSnapshot.__table__
+    profit = _profit_percent_expr()
+
+    # The month row claims the freeze; it commits together with the ranking rows
+    marker = LeaderboardSnapshotMonth(month=month, rows=0, frozen_at=now)
+    try:
+        db.session.add(marker)
+        db.session.flush()
+    except IntegrityError:
+        db.session.rollback()
+        return {'month': month.isoformat(), 'rows_frozen': 0, 'already_frozen': True}
+
+    # Also skips months frozen before leaderboard_snapshot_months existed
+    not_frozen = ~select(literal(1)).where(snapshots.c.month == month).exists()
+    frozen = db.session.execute(
+        snapshots.insert().from_select(
+            ['month', 'rank', 'challenge_id', 'user_id', 'username', 'plan_type', 'status',
+             'starting_balance', 'current_balance', 'profit_percent', 'frozen_at'],
+            select(
+                literal(month, Date),
+                func.row_number().over(order_by=(profit.desc(), Challenge.id.asc())),
+                Challenge.id,
+                Challenge.user_id,
+                User.username,
+                Challenge.plan_type,
+                Challenge.status,
+                Challenge.starting_balance,
+                Challenge.current_balance,
+                profit,
+                literal(now, DateTime),
+            ).join(User, Challenge.user_id == User.id).where(*_month_filter(month), not_frozen),
+        )
+    ).rowcount
+    marker.rows = frozen
+    db.session.commit()
+    return {'month': month.isoformat(), 'rows_frozen': frozen, 'already_frozen': False}
+
+
+def freeze_closed_month(now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Freeze the month before the one of `now` (daily job; a no-op once frozen)."""
+    now = now or datetime.utcnow()
+    return freeze_month(closed_month(now.date()), now)
+
+
+def start_leaderboard_snapshots(app):
+    """Start the app's daily month-freeze job (idempotent)."""
+    from services.scheduler import DailyJob
+
+    job = app.extensions.get(JOB_NAME)
+    if job is None:
+        job = DailyJob(app, JOB_NAME, freeze_closed_month, at=FREEZE_AT)
+        app.extensions[JOB_NAME] = job
+    job.start()
+    return job
@@ -0,0 +1,222 @@
+"""
+Ledger Rebalancing Service
+Deleting or amending a trade changes everything recorded after it. Both
+operations run in one transaction with the challenge row locked, and they
+recompute the affected suffix of the ledger:
+- balance_after_trade of every later trade, with one set-based UPDATE
+  driven by a running-sum window function, and challenge.current_balance
+- The daily balance rollups from the trade's day onwards
+- The position and per-trade realized P&L of the trade's symbol (replayed in
+  memory: average cost is path dependent, so it has no window-function form)
+- The challenge rules, when the challenge is still active
+"""
+import logging
+from datetime import datetime, time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import Numeric, and_, case, cast, func, literal, select, tuple_, update
+
+from extensions import db
+from models import Challenge, ChallengeDailyBalance, Position, Trade
+from services.challenge_engine import (
+    _evaluate_rules, _fold_position, _get_day_snapshot, _lock_challenge, _notify_trade_listeners,
+    _trade_event, _validate_trade_input,
+)
+
+logger = logging.getLogger(__name__)
+
+LedgerKey = Tuple[datetime, int]
+
+
+def _balance_before(challenge: Challenge, key: LedgerKey) -> float:
+    """Balance after the last trade ordered before `key` (or the starting balance)."""
+    balance = db.session.query(Trade.balance_after_trade).filter(
+        Trade.challenge_id == challenge.id, tuple_(Trade.created_at, Trade.id) < tuple_(*key)
+    ).order_by(Trade.created_at.desc(), Trade.id.desc()).limit(1).scalar()
+    return challenge.starting_balance if balance is None else balance
+
+
+def _rebalance_balances(challenge: Challenge, key: LedgerKey) -> int:
+    """
+    Recompute balance_after_trade from `key` onwards and the challenge balance.
+
+    Returns:
+        Number of trades updated
+    """
+    trades = Trade.__table__
+    base = _balance_before(challenge, key)
+    cash = case((trades.c.action == 'sell', trades.c.total_value), else_=-trades.c.total_value)
+    in_suffix = and_(trades.c.challenge_id == challenge.id, tuple_(trades.c.created_at, trades.c.id) >= tuple_(*key))
+
+    running = select(
+        trades.c.id,
+        (literal(base) + func.sum(cash).over(order_by=(trades.c.created_at, trades.c.id))).label('balance'),
+    ).where(in_suffix).subquery()
+    updated = db.session.execute(
+        trades.update().where(trades.c.id == running.c.id)
+        .values(balance_after_trade=cast(func.round(cast(running.c.balance, Numeric), 2), trades.c.balance_after_trade.type))
+    ).rowcount
+
+    suffix_cash = db.session.execute(select(func.coalesce(func.sum(cash), 0.0)).where(in_suffix)).scalar()
+    challenge.current_balance = round(base + float(suffix_cash), 2)
+    return updated
+
+
+def _rebuild_rollups(challenge: Challenge, since: datetime) -> None:
+    """Recompute the daily rollups from the day of `since` onwards."""
+    day_start = datetime.combine(since.date(), time.min)
+    snapshots = ChallengeDailyBalance.query.filter(
+        ChallengeDailyBalance.challenge_id == challenge.id, ChallengeDailyBalance.day >= day_start.date()
+    ).order_by(ChallengeDailyBalance.day.asc()).all()
+    if not snapshots:
+        return
+
+    rows = db.session.query(Trade.created_at, Trade.balance_after_trade, Trade.total_value).filter(
+        Trade.challenge_id == challenge.id, Trade.created_at >= day_start
+    ).order_by(Trade.created_at.asc(), Trade.id.asc()).all()
+    by_day: Dict[Any, list] = {}
+    for created_at, balance, value in rows:
+        by_day.setdefault(created_at.date(), []).append((balance, value))
+
+    previous_close = _balance_before(challenge, (day_start, 0))
+    for snapshot in snapshots:
+        day_trades = by_day.get(snapshot.day, [])
+        balances = [balance for balance, _ in day_trades]
+        snapshot.open_balance = previous_close
+        snapshot.high_balance = max([previous_close] + balances)
+        snapshot.low_balance = min([previous_close] + balances)
+        snapshot.close_balance = balances[-1] if balances else previous_close
+        snapshot.trade_count = len(day_trades)
+        snapshot.volume = round(sum(value for _, value in day_trades), 2)
+        previous_close = snapshot.close_balance
+
+
+def _rebuild_position(challenge: Challenge, symbol: str) -> Position:
+    """Replay the symbol's trades into its position and the trades' realized P&L."""
+    position = Position.query.filter_by(challenge_id=challenge.id, symbol=symbol).first()
+    if position is None:
+        position = Position(challenge_id=challenge.id, symbol=symbol)
+        db.session.add(position)
+
+    quantity, avg_cost, realized_total = 0.0, 0.0, 0.0
+    opened_at: Optional[datetime] = None
+    changed = []
+    rows = db.session.query(
+        Trade.id, Trade.action, Trade.quantity, Trade.price, Trade.profit_loss, Trade.created_at
+    ).filter(Trade.challenge_id == challenge.id, Trade.symbol == symbol).order_by(
+        Trade.created_at.asc(), Trade.id.asc()
+    ).all()
+    for trade_id, action, trade_quantity, price, stored_pnl, created_at in rows:
+        quantity, avg_cost, realized, opened = _fold_position(quantity, avg_cost, action, trade_quantity, price)
+        if opened:
+            opened_at = created_at
+        elif quantity == 0.0:
+            opened_at = None
+        realized = round(realized, 2)
+        realized_total = round(realized_total + realized, 2)
+        if stored_pnl != realized:
+            changed.append({'id': trade_id, 'profit_loss': realized})
+    if changed:
+        db.session.execute(update(Trade), changed)
+
+    position.quantity = quantity
+    position.avg_cost = avg_cost
+    position.realized_pnl = realized_total
+    position.opened_at = opened_at
+    return position
+
+
+def _rebalance(challenge: Challenge, key: LedgerKey, symbol: str) -> Dict[str, Any]:
+    """Recompute everything after `key` (no commit) and return the trade event to publish."""
+    db.session.flush()
+    updated = _rebalance_balances(challenge, key)
+    _rebuild_rollups(challenge, key[0])
+    position = _rebuild_position(challenge, symbol)
+    rule_check = None
+    if challenge.status == 'active':
+        rule_check = _evaluate_rules(challenge, _get_day_snapshot(challenge, create=False))
+    db.session.flush()
+    return {
+        'event': _trade_event(challenge, position),
+        'trades_rebalanced': updated,
+        'current_balance': challenge.current_balance,
+        'status': challenge.status,
+        'rule_check': rule_check,
+    }
+
+
+def _locked_trade(trade_id: int, user_id: Optional[int]) -> Tuple[Optional[Trade], Optional[Challenge], Optional[Dict[str, Any]]]:
+    trade = db.session.get(Trade, trade_id)
+    if trade is None:
+        return None, None, {"error": "Trade not found", "message": f"Trade {trade_id} does not exist"}
+    challenge = _lock_challenge(trade.challenge_id)
+    if challenge is None:
+        return None, None, {"error": "Challenge not found", "message": f"Challenge {trade.challenge_id} does not exist"}
+    if user_id is not None and challenge.user_id != user_id:
+        return None, None, {"error": "Unauthorized", "message": "This trade does not belong to you"}
+    return trade, challenge, None
+
+
+def delete_trade(trade_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Delete a trade and rebalance the rest of its challenge's ledger in one transaction.
+
+    Returns:
+        dict: {challenge_id, trade_id, trades_rebalanced, current_balance, status, rule_check}
+        or an error dict
+    """
+    try:
+        trade, challenge, error = _locked_trade(trade_id, user_id)
+        if error:
+            db.session.rollback()
+            return error
+        key, symbol = (trade.created_at, trade.id), trade.symbol
+        db.session.delete(trade)
+        result = _rebalance(challenge, key, symbol)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception(f"Deleting trade {trade_id} failed")
+        return {"error": "Trade failed", "message": "The trade could not be deleted"}
+
+    _notify_trade_listeners(result.pop('event'))
+    return {'challenge_id': challenge.id, 'trade_id': trade_id, **result}
+
+
+def amend_trade(trade_id: int, quantity: Optional[float] = None, price: Optional[float] = None,
+                user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Change a trade's quantity and/or price and rebalance the ledger from it onwards.
+
+    Returns:
+        dict: {challenge_id, trade, trades_rebalanced, current_balance, status, rule_check}
+        or an error dict
+    """
+    if quantity is None and price is None:
+        return {"error": "Missing field", "message": "quantity or price is required"}
+    try:
+        trade, challenge, error = _locked_trade(trade_id, user_id)
+        if error:
+            db.session.rollback()
+            return error
+        new_quantity = trade.quantity if quantity is None else quantity
+        new_price = trade.price if price is None else price
+        validation_error = _validate_trade_input(trade.action, new_quantity, new_price)
+        if validation_error:
+            db.session.rollback()
+            return validation_error
+
+        trade.quantity = float(new_quantity)
+        trade.price = float(new_price)
+        trade.total_value = round(trade.quantity * trade.price, 2)
+        result = _rebalance(challenge, (trade.created_at, trade.id), trade.symbol)
+        db.session.refresh(trade)
+        trade_dict = trade.to_dict()
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        logger.exception(f"Amending trade {trade_id} failed")
+        return {"error": "Trade failed", "message": "The trade could not be amended"}
+
+    _notify_trade_listeners(result.pop('event'))
+    return {'challenge_id': challenge.id, 'trade': trade_dict, **result}
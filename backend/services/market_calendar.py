@@ -0,0 +1,231 @@
+"""
+Market Calendar Service
+Trading sessions and holidays for the venues we quote, used to size price
+cache TTLs: while a market is open quotes follow the live cache duration,
+and once it closes they stay cached until the next session opens.
+"""
+import logging
+from datetime import date, datetime, time, timedelta
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Set
+from zoneinfo import ZoneInfo
+
+logger = logging.getLogger(__name__)
+
+# Keep treating a market as open for a few minutes after the close so the
+# final prints of the session are still fetched.
+SETTLE_MINUTES = 15
+
+# Upper bound for a closed-market TTL (long weekends plus holidays)
+MAX_CLOSED_TTL_SECONDS = 5 * 24 * 3600
+
+# Exchange codes
+US = 'US'
+CSE = 'CSE'  # Casablanca Stock Exchange
+CRYPTO = 'CRYPTO'
+
+# Quote currencies for crypto pairs on Yahoo Finance (e.g., BTC-USD)
+_CRYPTO_QUOTES = ('-USD', '-USDT', '-EUR', '-GBP', '-BTC', '-ETH')
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-th given weekday of a month (n=-1 for the last one)."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    """Gregorian Easter Sunday (anonymous Gregorian algorithm)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+
+def _observed(day: date) -> date:
+    """NYSE rule: Saturday holidays move to Friday, Sunday holidays to Monday."""
+    if day.weekday() == 5:
+        return day - timedelta(days=1)
+    if day.weekday() == 6:
+        return day + timedelta(days=1)
+    return day
+
+
+@lru_cache(maxsize=16)
+def us_holidays(year: int) -> Set[date]:
+    """NYSE/NASDAQ full-day holidays for a year."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3),    # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),    # Washington's Birthday
+        _easter(year) - timedelta(days=2),  # Good Friday
+        _nth_weekday(year, 5, 0, -1),   # Memorial Day
+        _observed(date(year, 7, 4)),    # Independence Day
+        _nth_weekday(year, 9, 0, 1),    # Labor Day
+        _nth_weekday(year, 11, 3, 4),   # Thanksgiving
+        _observed(date(year, 12, 25)),  # Christmas
+    }
+    # New Year's Day is not moved back to Friday when it falls on a Saturday
+    new_year = date(year, 1, 1)
+    if new_year.weekday() == 6:
+        holidays.add(new_year + timedelta(days=1))
+    elif new_year.weekday() < 5:
+        holidays.add(new_year)
+    if year >= 2022:
+        holidays.add(_observed(date(year, 6, 19)))  # Juneteenth
+    return holidays
+
+
+# Moroccan religious holidays follow the lunar calendar; dates are the
+# expected ones and should be checked against the official announcements.
+# Only the years listed here are covered: for other years these days count as
+# trading days, which errs towards the short live TTL (a warning is logged).
+_CSE_LUNAR_HOLIDAYS = {
+    2026: [
+        date(2026, 3, 20), date(2026, 3, 21),  # Eid al-Fitr
+        date(2026, 5, 27), date(2026, 5, 28),  # Eid al-Adha
+        date(2026, 6, 16),                     # Islamic New Year
+        date(2026, 8, 25), date(2026, 8, 26),  # Mawlid
+    ],
+    2027: [
+        date(2027, 3, 10), date(2027, 3, 11),
+        date(2027, 5, 17), date(2027, 5, 18),
+        date(2027, 6, 6),
+        date(2027, 8, 15), date(2027, 8, 16),
+    ],
+}
+
+
+@lru_cache(maxsize=16)
+def cse_holidays(year: int) -> Set[date]:
+    """Casablanca Stock Exchange holidays for a year."""
+    fixed = [
+        (1, 1),    # New Year's Day
+        (1, 11),   # Independence Manifesto Day
+        (1, 14),   # Amazigh New Year
+        (5, 1),    # Labour Day
+        (7, 30),   # Throne Day
+        (8, 14),   # Oued Ed-Dahab Day
+        (8, 20),   # Revolution of the King and the People
+        (8, 21),   # Youth Day
+        (11, 6),   # Green March
+        (11, 18),  # Independence Day
+    ]
+    holidays = {date(year, month, day) for month, day in fixed}
+    if year not in _CSE_LUNAR_HOLIDAYS:
+        logger.warning(f"No CSE lunar holiday dates for {year}; add them to _CSE_LUNAR_HOLIDAYS")
+    holidays.update(_CSE_LUNAR_HOLIDAYS.get(year, []))
+    return holidays
+
+
+class ExchangeCalendar:
+    """Regular weekday session with a holiday list, in the exchange's local time."""
+
+    def __init__(self, code: str, timezone: str, open_time: time, close_time: time,
+                 holidays: Optional[Callable[[int], Set[date]]] = None, always_open: bool = False):
+        self.code = code
+        self.tz = ZoneInfo(timezone)
+        self.open_time = open_time
+        self.close_time = close_time
+        self.holidays = holidays or (lambda year: set())
+        self.always_open = always_open
+
+    def is_trading_day(self, day: date) -> bool:
+        return day.weekday() < 5 and day not in self.holidays(day.year)
+
+    def _to_local(self, now: datetime) -> datetime:
+        # Naive datetimes are UTC, like the rest of the backend (datetime.utcnow)
+        if now.tzinfo is None:
+            now = now.replace(tzinfo=ZoneInfo('UTC'))
+        return now.astimezone(self.tz)
+
+    def is_open(self, now: Optional[datetime] = None) -> bool:
+        """Whether the session is open (including the settle window after the close)."""
+        if self.always_open:
+            return True
+        local = self._to_local(now or datetime.utcnow())
+        if not self.is_trading_day(local.date()):
+            return False
+        settle_close = (datetime.combine(local.date(), self.close_time) + timedelta(minutes=SETTLE_MINUTES)).time()
+        return self.open_time <= local.time() < settle_close
+
+    def next_open(self, now: Optional[datetime] = None) -> datetime:
+        """Next session open as a naive UTC datetime."""
+        local = self._to_local(now or datetime.utcnow())
+        day = local.date()
+        if local.time() >= self.open_time:
+            day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        opening = datetime.combine(day, self.open_time, tzinfo=self.tz)
+        return opening.astimezone(ZoneInfo('UTC')).replace(tzinfo=None)
+
+
+CALENDARS: Dict[str, ExchangeCalendar] = {
+    US: ExchangeCalendar(US, 'America/New_York', time(9, 30), time(16, 0), us_holidays),
+    CSE: ExchangeCalendar(CSE, 'Africa/Casablanca', time(9, 30), time(15, 30), cse_holidays),
+    CRYPTO: ExchangeCalendar(CRYPTO, 'UTC', time(0, 0), time(23, 59), always_open=True),
+}
+
+
+def get_exchange_for_symbol(symbol: str) -> Optional[str]:
+    """
+    Map a symbol to its exchange calendar code.
+
+    Returns:
+        'CSE', 'US', 'CRYPTO', or None when the venue is unknown
+        (indices, futures, FX, non-US listings), which keeps live TTLs.
+    """
+    from services.morocco_scraper import MOROCCO_STOCKS
+
+    symbol_upper = (symbol or '').upper().strip()
+    if not symbol_upper:
+        return None
+    if symbol_upper in MOROCCO_STOCKS:
+        return CSE
+    if symbol_upper.endswith(_CRYPTO_QUOTES):
+        return CRYPTO
+    if any(ch in symbol_upper for ch in '=^.'):
+        return None
+    return US
+
+
+def is_market_open(symbol: str, now: Optional[datetime] = None) -> bool:
+    """Whether the market for a symbol is currently trading."""
+    exchange = get_exchange_for_symbol(symbol)
+    if exchange is None:
+        return True
+    return CALENDARS[exchange].is_open(now)
+
+
+def cache_ttl_seconds(symbol: str, live_ttl: float, now: Optional[datetime] = None) -> float:
+    """
+    Cache TTL for a quote of the given symbol.
+
+    Args:
+        symbol: Stock/crypto symbol
+        live_ttl: TTL to use while the market is open
+        now: Current UTC time (defaults to datetime.utcnow())
+
+    Returns:
+        live_ttl during the session, otherwise the seconds until the next
+        session opens (capped at MAX_CLOSED_TTL_SECONDS)
+    """
+    exchange = get_exchange_for_symbol(symbol)
+    if exchange is None:
+        return live_ttl
+    calendar = CALENDARS[exchange]
+    now = now or datetime.utcnow()
+    if calendar.is_open(now):
+        return live_ttl
+    until_open = (calendar.next_open(now) - now).total_seconds()
+    return max(live_ttl, min(until_open, MAX_CLOSED_TTL_SECONDS))
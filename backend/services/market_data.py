@@ -5,12 +5,18 @@ Includes caching to avoid Yahoo Finance rate limiting (429 errors).
 Updated January 2026 to fix yfinance API compatibility issues.
 """
 import yfinance as yf
+import numpy as np
+import pandas as pd
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional, Any
 import threading
 import time
 import logging
 
+from services.market_calendar import cache_ttl_seconds
+from services.ohlcv import build_columnar, columnar_to_rows
+from services.price_feed import publish
+
 # Configure logging
 logger = logging.getLogger(__name__)
 
@@ -19,7 +25,8 @@ logger = logging.getLogger(__name__)
 _price_cache = {}
 _cache_lock = threading.Lock()
 
-# Cache duration in seconds (increased to 120 seconds to reduce Yahoo rate limiting)
+# Cache duration in seconds while the market is open (increased to 120 seconds
+# to reduce Yahoo rate limiting). Closed markets are cached until the next open.
 CACHE_DURATION_SECONDS = 120
 
 # Rate limiting configuration
@@ -39,6 +46,9 @@ def _is_cache_valid(cache_entry: dict) -> bool:
     """Check if a cache entry is still valid."""
     if not cache_entry:
         return False
+    expires_at = cache_entry.get('_expires_at')
+    if expires_at:
+        return datetime.utcnow() < expires_at
     cached_time = cache_entry.get('_cached_at')
     if not cached_time:
         return False
@@ -64,10 +74,15 @@ def _save_to_cache(symbol: str, data: dict) -> None:
     if 'error' in data:
         return  # Don't cache errors
     cache_key = _get_cache_key(symbol)
+    now = datetime.utcnow()
+    # Live TTL while the market trades, until the next open once it closes
+    ttl = cache_ttl_seconds(symbol, CACHE_DURATION_SECONDS, now)
     cache_entry = data.copy()
-    cache_entry['_cached_at'] = datetime.utcnow()
+    cache_entry['_cached_at'] = now
+    cache_entry['_expires_at'] = now + timedelta(seconds=ttl)
     with _cache_lock:
         _price_cache[cache_key] = cache_entry
+    publish(symbol, data.get('current_price'))
 
 
 def _rate_limit_check(symbol: str) -> bool:
@@ -366,7 +381,13 @@ def get_multiple_prices(symbols_list: List[str]) -> List[Dict[str, Any]]:
     return results
 
 
-def get_historical_data(symbol: str, period: str = '1mo', interval: str = '1h') -> Dict[str, Any]:
+def _index_to_unix_seconds(index) -> np.ndarray:
+    """Convert a (possibly tz-aware) DatetimeIndex to Unix seconds."""
+    epoch = pd.Timestamp('1970-01-01', tz='UTC' if index.tz is not None else None)
+    return np.asarray((index - epoch) // pd.Timedelta(seconds=1), dtype=np.int64)
+
+
+def get_historical_data(symbol: str, period: str = '1mo', interval: str = '1h', columnar: bool = False) -> Dict[str, Any]:
     """
     Fetch historical price data for charting.
     
@@ -374,6 +395,7 @@ def get_historical_data(symbol: str, period: str = '1mo', interval: str = '1h')
         symbol: Stock/crypto symbol (e.g., 'AAPL', 'BTC-USD')
         period: Time period (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, max)
         interval: Data interval (1m, 5m, 15m, 30m, 1h, 1d, 1wk, 1mo)
+        columnar: Return parallel arrays {t, o, h, l, c, v} instead of row dicts
     
     Returns:
         dict: Historical OHLCV data formatted for charting
@@ -398,27 +420,24 @@ def get_historical_data(symbol: str, period: str = '1mo', interval: str = '1h')
                 'symbol': symbol_upper
             }
         
-        # Format data for lightweight-charts (TradingView)
-        data = []
-        for idx, row in hist.iterrows():
-            # Convert timestamp to Unix seconds
-            timestamp = int(idx.timestamp())
-            
-            data.append({
-                'time': timestamp,
-                'open': round(float(row['Open']), 2),
-                'high': round(float(row['High']), 2),
-                'low': round(float(row['Low']), 2),
-                'close': round(float(row['Close']), 2),
-                'value': round(float(row['Close']), 2),  # For line charts
-                'volume': int(row['Volume']) if 'Volume' in row else 0
-            })
+        # Build the series straight from the DataFrame's NumPy columns
+        columns = build_columnar(
+            _index_to_unix_seconds(hist.index),
+            hist['Open'].to_numpy(),
+            hist['High'].to_numpy(),
+            hist['Low'].to_numpy(),
+            hist['Close'].to_numpy(),
+            hist['Volume'].to_numpy() if 'Volume' in hist.columns else np.zeros(len(hist)),
+        )
+        
+        # Format data for lightweight-charts (TradingView) unless columnar was requested
+        data = columns if columnar else columnar_to_rows(columns)
         
         return {
             'symbol': symbol_upper,
             'period': period,
             'interval': interval,
-            'count': len(data),
+            'count': len(columns['t']),
             'data': data
         }
     
@@ -429,4 +448,3 @@ def get_historical_data(symbol: str, period: str = '1mo', interval: str = '1h')
             'message': f'Failed to fetch historical data for {symbol_upper}: {str(e)}',
             'symbol': symbol_upper
         }
-
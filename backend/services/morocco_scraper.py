@@ -11,9 +11,13 @@ import time
 import random
 import re
 
+from services.market_calendar import cache_ttl_seconds
+from services.ohlcv import rows_to_columnar
+from services.price_feed import publish
+
 # Cache storage for stock prices (in-memory cache)
 _price_cache = {}
-_cache_duration = timedelta(seconds=60)  # Cache for 60 seconds
+_cache_duration = timedelta(seconds=60)  # Cache for 60 seconds while the market is open
 
 # Headers to mimic a real browser request
 HEADERS = {
@@ -44,8 +48,8 @@ MOROCCO_STOCKS = {
 def _get_from_cache(symbol: str) -> Optional[Dict[str, Any]]:
     """Check if symbol data is in cache and still valid"""
     if symbol in _price_cache:
-        cached_data, cache_time = _price_cache[symbol]
-        if datetime.utcnow() - cache_time < _cache_duration:
+        cached_data, cache_time, expires_at = _price_cache[symbol]
+        if datetime.utcnow() < expires_at:
             return cached_data
         else:
             # Remove expired cache
@@ -54,8 +58,22 @@ def _get_from_cache(symbol: str) -> Optional[Dict[str, Any]]:
 
 
 def _save_to_cache(symbol: str, data: Dict[str, Any]):
-    """Save symbol data to cache"""
-    _price_cache[symbol] = (data, datetime.utcnow())
+    """
+    Save symbol data to cache. Scraped quotes stay cached until the next
+    session opens if the market is closed; mock fallbacks only for the live
+    duration, so a failed scrape is retried soon instead of serving fake
+    prices over a weekend or holiday. Only scraped quotes are published to the
+    price feed.
+    """
+    now = datetime.utcnow()
+    ttl = _cache_duration.total_seconds()
+    mock = data.get('source') == 'mock_data'
+    if not mock:
+        ttl = cache_ttl_seconds(symbol, ttl, now)
+    _price_cache[symbol] = (data, now, now + timedelta(seconds=ttl))
+    # Mock prices are random: they must not drive the risk monitor or fill orders
+    if not mock:
+        publish(symbol, data.get('current_price'))
 
 
 def _generate_mock_data(symbol: str) -> Dict[str, Any]:
@@ -364,14 +382,15 @@ def get_cache_info() -> Dict[str, Any]:
     
     # Calculate age of each cached item
     now = datetime.utcnow()
-    for symbol, (data, cache_time) in _price_cache.items():
+    for symbol, (data, cache_time, expires_at) in _price_cache.items():
         age_seconds = (now - cache_time).total_seconds()
         cache_info[f'{symbol}_age_seconds'] = age_seconds
+        cache_info[f'{symbol}_ttl_seconds'] = max(0.0, (expires_at - now).total_seconds())
     
     return cache_info
 
 
-def generate_mock_historical_data(symbol: str, period: str = '1mo', interval: str = '1h') -> Dict[str, Any]:
+def generate_mock_historical_data(symbol: str, period: str = '1mo', interval: str = '1h', columnar: bool = False) -> Dict[str, Any]:
     """
     Generate mock historical data for Moroccan stocks (for charting).
     
@@ -379,6 +398,7 @@ def generate_mock_historical_data(symbol: str, period: str = '1mo', interval: st
         symbol: Stock symbol (e.g., 'IAM', 'ATW')
         period: Time period (1d, 5d, 1mo, 3mo, 6mo, 1y)
         interval: Data interval (1m, 5m, 15m, 30m, 1h, 1d)
+        columnar: Return parallel arrays {t, o, h, l, c, v} instead of row dicts
     
     Returns:
         dict: Mock historical OHLCV data formatted for charting
@@ -465,7 +485,7 @@ def generate_mock_historical_data(symbol: str, period: str = '1mo', interval: st
         'period': period,
         'interval': interval,
         'count': len(data),
-        'data': data,
+        'data': rows_to_columnar(data) if columnar else data,
         'source': 'mock_data'
     }
 
@@ -0,0 +1,85 @@
+"""
+OHLCV Wire Formats
+Compact encodings for historical price series.
+- rows: list of {time, open, high, low, close, value, volume} dicts (default)
+- columnar: parallel arrays {t, o, h, l, c, v}
+- binary: packed little-endian arrays for application/octet-stream responses
+"""
+import struct
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Supported values for the `format` query parameter
+HISTORY_FORMATS = ('rows', 'columnar', 'binary')
+
+# Binary layout: 8-byte header (uint32 count, uint32 version) followed by
+# int64 t[n], float32 o[n], h[n], l[n], c[n] and int64 v[n].
+# Each array starts at an offset that is a multiple of its element size: t at
+# 8 and v at 8 + 24n are 8-byte aligned, o/h/l/c only 4-byte aligned (for odd n
+# they are not 8-byte aligned). Typed-array views need no copy as long as the
+# buffer itself starts on an 8-byte boundary (e.g. a fetched ArrayBuffer).
+BINARY_VERSION = 1
+BINARY_LAYOUT = 'u32 count; u32 version; i64 t[n]; f32 o[n]; f32 h[n]; f32 l[n]; f32 c[n]; i64 v[n]'
+_HEADER = struct.Struct('<II')
+
+
+def build_columnar(times, opens, highs, lows, closes, volumes) -> Dict[str, List]:
+    """
+    Build the columnar series from NumPy arrays (or sequences).
+    Prices are rounded to 2 decimals, matching the row format.
+    """
+    return {
+        't': np.asarray(times, dtype=np.int64).tolist(),
+        'o': np.round(np.asarray(opens, dtype=np.float64), 2).tolist(),
+        'h': np.round(np.asarray(highs, dtype=np.float64), 2).tolist(),
+        'l': np.round(np.asarray(lows, dtype=np.float64), 2).tolist(),
+        'c': np.round(np.asarray(closes, dtype=np.float64), 2).tolist(),
+        'v': np.nan_to_num(np.asarray(volumes, dtype=np.float64)).astype(np.int64).tolist(),
+    }
+
+
+def columnar_to_rows(columns: Dict[str, List]) -> List[Dict[str, Any]]:
+    """Expand a columnar series into the row format used by lightweight-charts."""
+    return [
+        {
+            'time': t,
+            'open': o,
+            'high': h,
+            'low': l,
+            'close': c,
+            'value': c,  # For line charts
+            'volume': v,
+        }
+        for t, o, h, l, c, v in zip(columns['t'], columns['o'], columns['h'],
+                                    columns['l'], columns['c'], columns['v'])
+    ]
+
+
+def rows_to_columnar(rows: List[Dict[str, Any]]) -> Dict[str, List]:
+    """Collapse a row series into parallel arrays."""
+    return {
+        't': [row['time'] for row in rows],
+        'o': [row['open'] for row in rows],
+        'h': [row['high'] for row in rows],
+        'l': [row['low'] for row in rows],
+        'c': [row['close'] for row in rows],
+        'v': [row.get('volume', 0) for row in rows],
+    }
+
+
+def pack_columnar(columns: Dict[str, List]) -> bytes:
+    """
+    Pack a columnar series into the binary layout described by BINARY_LAYOUT.
+    """
+    count = len(columns['t'])
+    parts = [
+        _HEADER.pack(count, BINARY_VERSION),
+        np.asarray(columns['t'], dtype='<i8').tobytes(),
+        np.asarray(columns['o'], dtype='<f4').tobytes(),
+        np.asarray(columns['h'], dtype='<f4').tobytes(),
+        np.asarray(columns['l'], dtype='<f4').tobytes(),
+        np.asarray(columns['c'], dtype='<f4').tobytes(),
+        np.asarray(columns['v'], dtype='<i8').tobytes(),
+    ]
+    return b''.join(parts)
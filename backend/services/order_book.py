@@ -0,0 +1,329 @@
+"""
+Order Book Service
+Resting limit, stop and take-profit orders for challenges.
+- Orders are persisted in the orders table (status 'pending' until triggered)
+- Pending orders are indexed in memory per symbol in two heaps:
+    falling side: fires when price <= trigger (limit buy, stop sell, take-profit buy)
+    rising side:  fires when price >= trigger (limit sell, stop buy, take-profit sell)
+  so a new quote only pops the orders whose trigger it crossed
+- Triggered orders are executed as market trades through execute_trade on a
+  worker thread; the order is marked filled (guarded on status = 'pending') in
+  the trade's own transaction, so a crash cannot strand it half-claimed and
+  another process cannot fill it twice
+- Every process indexes the pending orders it sees in the database, re-synced
+  every ORDER_BOOK_SYNC_SECONDS (orders placed or cancelled by other workers)
+"""
+import heapq
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from extensions import db
+from models import Challenge, Order, Trade
+from services import price_feed
+from services.challenge_engine import _is_positive_number, execute_trade
+
+logger = logging.getLogger(__name__)
+
+ORDER_TYPES = ('limit', 'stop', 'take_profit')
+ORDER_STATUSES = ('pending', 'filled', 'rejected', 'cancelled')
+
+# Pending orders allowed per challenge
+MAX_PENDING_ORDERS = 100
+
+# Default interval of the re-sync of pending orders from the database
+ORDER_BOOK_SYNC_SECONDS = 30.0
+
+FALLING = 'falling'
+RISING = 'rising'
+
+
+def trigger_side(order_type: str, action: str) -> str:
+    """Price direction that fires an order of this type and action."""
+    if order_type == 'stop':
+        return RISING if action == 'buy' else FALLING
+    # limit and take-profit: buy below, sell above
+    return FALLING if action == 'buy' else RISING
+
+
+class _SymbolOrders:
+    """Trigger heaps of one symbol: (-trigger, id) for the falling side, (trigger, id) for the rising side."""
+    __slots__ = ('falling', 'rising')
+
+    def __init__(self):
+        self.falling: List[Tuple[float, int]] = []
+        self.rising: List[Tuple[float, int]] = []
+
+
+class OrderBook:
+    """In-memory trigger index over pending orders with a fill worker thread."""
+
+    def __init__(self, app, sync_interval: float = ORDER_BOOK_SYNC_SECONDS):
+        self.app = app
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._books: Dict[str, _SymbolOrders] = {}
+        self._live: Dict[int, str] = {}  # order id -> symbol of every indexed order
+        self._fills: 'queue.Queue[Tuple[int, float]]' = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    def add(self, order_id: int, symbol: str, order_type: str, action: str, trigger_price: float) -> None:
+        with self._lock:
+            if order_id in self._live:
+                return
+            book = self._books.setdefault(symbol, _SymbolOrders())
+            if trigger_side(order_type, action) == FALLING:
+                heapq.heappush(book.falling, (-trigger_price, order_id))
+            else:
+                heapq.heappush(book.rising, (trigger_price, order_id))
+            self._live[order_id] = symbol
+        price_feed.watch([symbol])
+
+    def _evict(self, order_id: int, symbol: str) -> None:
+        """Drop an order's entry from its symbol's heaps (caller holds the lock)."""
+        book = self._books.get(symbol)
+        if book is None:
+            return
+        for side in ('falling', 'rising'):
+            heap = getattr(book, side)
+            kept = [entry for entry in heap if entry[1] != order_id]
+            if len(kept) != len(heap):
+                heapq.heapify(kept)
+                setattr(book, side, kept)
+        if not book.falling and not book.rising:
+            del self._books[symbol]
+
+    def remove(self, order_id: int) -> None:
+        with self._lock:
+            symbol = self._live.pop(order_id, None)
+            if symbol is not None:
+                self._evict(order_id, symbol)
+        if symbol is not None:
+            price_feed.unwatch([symbol])
+
+    def load(self) -> int:
+        """
+        Sync the index with the pending orders in the database (call inside an
+        app context): index new ones, evict those no longer pending.
+        """
+        rows = db.session.query(
+            Order.id, Order.symbol, Order.order_type, Order.action, Order.trigger_price
+        ).filter(Order.status == 'pending').all()
+        db.session.rollback()  # release the read transaction
+        pending = {row[0] for row in rows}
+        with self._lock:
+            gone = [order_id for order_id in self._live if order_id not in pending]
+        for order_id in gone:
+            self.remove(order_id)
+        for order_id, symbol, order_type, action, trigger_price in rows:
+            self.add(order_id, symbol, order_type, action, trigger_price)
+        logger.info(f"Order book synced {len(rows)} pending orders ({len(gone)} evicted)")
+        return len(rows)
+
+    def on_price(self, symbol: str, price: float) -> None:
+        """Pop the orders crossed by this quote and queue them for execution."""
+        book = self._books.get(symbol)
+        if book is None:
+            return
+        triggered = []
+        with self._lock:
+            while book.falling and price <= -book.falling[0][0]:
+                _, order_id = heapq.heappop(book.falling)
+                if self._live.pop(order_id, None) is not None:
+                    triggered.append(order_id)
+            while book.rising and price >= book.rising[0][0]:
+                _, order_id = heapq.heappop(book.rising)
+                if self._live.pop(order_id, None) is not None:
+                    triggered.append(order_id)
+        if triggered:
+            price_feed.unwatch([symbol] * len(triggered))
+            for order_id in triggered:
+                self._fills.put((order_id, price))
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='order-fills', daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        last_sync = time.monotonic()
+        while True:
+            try:
+                order_id, price = self._fills.get(timeout=self.sync_interval)
+            except queue.Empty:
+                order_id = None
+            try:
+                with self.app.app_context():
+                    if order_id is not None:
+                        fill_order(order_id, price)
+                    if time.monotonic() - last_sync >= self.sync_interval:
+                        last_sync = time.monotonic()
+                        self.load()
+            except Exception as e:
+                logger.exception(f"Order book run failed (order {order_id}): {e}")
+
+
+class OrderNotPending(Exception):
+    """Raised inside a fill's transaction when the order was filled or cancelled meanwhile."""
+
+
+def fill_order(order_id: int, price: float) -> Optional[Dict[str, Any]]:
+    """
+    Execute a triggered order at `price` (call inside an app context).
+    The order is marked filled in the trade's transaction, guarded on
+    status = 'pending', so it runs at most once even with several processes
+    watching the same quotes, and a crash leaves it pending rather than stranded.
+
+    Returns:
+        The updated order dict, or None if the order was no longer pending
+    """
+    order = db.session.get(Order, order_id)
+    if order is None or order.status != 'pending':
+        db.session.rollback()
+        return None
+    challenge_id, symbol, action, quantity = order.challenge_id, order.symbol, order.action, order.quantity
+    db.session.rollback()  # execute_trade starts its own (locking) transaction
+
+    def mark_filled(trade: Trade) -> None:
+        now = datetime.utcnow()
+        filled = Order.query.filter(Order.id == order_id, Order.status == 'pending').update({
+            'status': 'filled', 'trade_id': trade.id, 'fill_price': price,
+            'triggered_at': now, 'closed_at': now,
+        }, synchronize_session=False)
+        if not filled:
+            raise OrderNotPending(order_id)
+
+    result = execute_trade(challenge_id, symbol, action, quantity, price, before_commit=mark_filled)
+    if 'error' in result:
+        # Also reached when another process filled or cancelled the order first:
+        # then the guarded update matches nothing
+        now = datetime.utcnow()
+        rejected = Order.query.filter(Order.id == order_id, Order.status == 'pending').update({
+            'status': 'rejected', 'reject_reason': (result.get('message') or result['error'])[:255],
+            'triggered_at': now, 'closed_at': now,
+        }, synchronize_session=False)
+        db.session.commit()
+        if not rejected:
+            return None
+    return db.session.get(Order, order_id).to_dict()
+
+
+def _validate_order_input(symbol: str, action: str, order_type: str, quantity: Any,
+                          trigger_price: Any) -> Optional[Dict[str, Any]]:
+    if not symbol:
+        return {'error': 'Missing field', 'message': 'symbol is required'}
+    if action not in ('buy', 'sell'):
+        return {'error': 'Invalid action', 'message': "Action must be 'buy' or 'sell'"}
+    if order_type not in ORDER_TYPES:
+        return {'error': 'Invalid order type', 'message': f"order_type must be one of {', '.join(ORDER_TYPES)}"}
+    if not _is_positive_number(quantity):
+        return {'error': 'Invalid quantity', 'message': 'Quantity must be a finite number > 0'}
+    if not _is_positive_number(trigger_price):
+        return {'error': 'Invalid price', 'message': 'trigger_price must be a finite number > 0'}
+    return None
+
+
+def place_order(challenge_id: int, symbol: str, action: str, order_type: str, quantity: float,
+                trigger_price: float, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Store a resting order and index it for triggering.
+
+    Returns:
+        The order dict, or an error dict
+    """
+    symbol = (symbol or '').upper().strip()
+    validation_error = _validate_order_input(symbol, action, order_type, quantity, trigger_price)
+    if validation_error:
+        return validation_error
+
+    challenge = db.session.get(Challenge, challenge_id)
+    if not challenge:
+        return {'error': 'Challenge not found', 'message': f'Challenge {challenge_id} does not exist'}
+    if user_id is not None and challenge.user_id != user_id:
+        return {'error': 'Unauthorized', 'message': 'This challenge does not belong to you'}
+    if challenge.status != 'active':
+        return {'error': 'Challenge inactive', 'message': f"Challenge {challenge_id} status is '{challenge.status}'"}
+
+    pending = Order.query.filter_by(challenge_id=challenge_id, status='pending').count()
+    if pending >= MAX_PENDING_ORDERS:
+        return {'error': 'Too many orders', 'message': f'At most {MAX_PENDING_ORDERS} pending orders per challenge'}
+
+    order = Order(
+        challenge_id=challenge_id,
+        symbol=symbol,
+        action=action,
+        order_type=order_type,
+        quantity=float(quantity),
+        trigger_price=float(trigger_price),
+        status='pending',
+    )
+    db.session.add(order)
+    db.session.commit()
+
+    book = get_order_book()
+    if book is not None:
+        book.add(order.id, order.symbol, order.order_type, order.action, order.trigger_price)
+    return order.to_dict()
+
+
+def cancel_order(order_id: int, user_id: Optional[int] = None) -> Dict[str, Any]:
+    """Cancel a pending order (returns the order dict or an error dict)."""
+    order = db.session.get(Order, order_id)
+    if not order:
+        return {'error': 'Order not found', 'message': f'Order {order_id} does not exist'}
+    if user_id is not None and order.challenge.user_id != user_id:
+        return {'error': 'Unauthorized', 'message': 'This order does not belong to you'}
+
+    cancelled = Order.query.filter(Order.id == order_id, Order.status == 'pending').update(
+        {'status': 'cancelled', 'closed_at': datetime.utcnow()}, synchronize_session=False
+    )
+    db.session.commit()
+    if not cancelled:
+        return {'error': 'Order not pending', 'message': f"Order {order_id} status is '{order.status}'"}
+
+    book = get_order_book()
+    if book is not None:
+        book.remove(order_id)
+    return db.session.get(Order, order_id).to_dict()
+
+
+def get_orders(challenge_id: int, status: Optional[str] = None) -> List[Order]:
+    """Orders of a challenge, newest first (optionally filtered by status)."""
+    query = Order.query.filter(Order.challenge_id == challenge_id)
+    if status:
+        query = query.filter(Order.status == status)
+    return query.order_by(Order.created_at.desc(), Order.id.desc()).all()
+
+
+_book_lock = threading.Lock()
+
+
+def get_order_book() -> Optional[OrderBook]:
+    """The order book of the current app, or None when triggering is not running."""
+    return current_app.extensions.get('order_book')
+
+
+def start_order_book(app) -> OrderBook:
+    """Create the app's order book, load pending orders and start filling (idempotent)."""
+    with _book_lock:
+        book = app.extensions.get('order_book')
+        if book is None:
+            book = OrderBook(app, sync_interval=app.config.get('ORDER_BOOK_SYNC_SECONDS', ORDER_BOOK_SYNC_SECONDS))
+            try:
+                with app.app_context():
+                    book.load()
+            except Exception as e:
+                logger.warning(f"Could not load pending orders: {e}")
+            price_feed.subscribe(book.on_price)
+            app.extensions['order_book'] = book
+        book.start()
+    return book
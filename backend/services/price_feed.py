@@ -0,0 +1,113 @@
+"""
+Price Feed Service
+In-process publish/subscribe for fresh quotes.
+- The market data services publish every price they fetch from a source
+- Background components (risk monitor, ...) subscribe to price updates
+- An optional poller refreshes the prices of watched symbols periodically
+"""
+import logging
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PriceListener = Callable[[str, float], None]
+
+_listeners: List[PriceListener] = []
+_watched: Dict[str, int] = {}  # symbol -> number of watchers
+_lock = threading.Lock()
+
+_poller_thread: Optional[threading.Thread] = None
+_poller_stop = threading.Event()
+
+
+def subscribe(listener: PriceListener) -> None:
+    """Register a callback called as listener(symbol, price) on each fresh quote."""
+    with _lock:
+        if listener not in _listeners:
+            _listeners.append(listener)
+
+
+def unsubscribe(listener: PriceListener) -> None:
+    """Remove a previously registered callback."""
+    with _lock:
+        if listener in _listeners:
+            _listeners.remove(listener)
+
+
+def publish(symbol: str, price: Optional[float]) -> None:
+    """
+    Publish a fresh quote to all subscribers.
+    Listeners run on the publishing thread, so they must be cheap and must not
+    touch the database session of the request that fetched the price.
+    """
+    if not symbol or price is None or price <= 0:
+        return
+    symbol_upper = symbol.upper().strip()
+    with _lock:
+        listeners = list(_listeners)
+    for listener in listeners:
+        try:
+            listener(symbol_upper, float(price))
+        except Exception as e:
+            logger.warning(f"Price listener failed for {symbol_upper}: {e}")
+
+
+def watch(symbols: Iterable[str]) -> None:
+    """Ask the poller to keep these symbols fresh."""
+    with _lock:
+        for symbol in symbols:
+            symbol_upper = symbol.upper().strip()
+            _watched[symbol_upper] = _watched.get(symbol_upper, 0) + 1
+
+
+def unwatch(symbols: Iterable[str]) -> None:
+    """Release symbols previously passed to watch()."""
+    with _lock:
+        for symbol in symbols:
+            symbol_upper = symbol.upper().strip()
+            count = _watched.get(symbol_upper, 0) - 1
+            if count > 0:
+                _watched[symbol_upper] = count
+            else:
+                _watched.pop(symbol_upper, None)
+
+
+def watched_symbols() -> Set[str]:
+    """Symbols currently watched by at least one component."""
+    with _lock:
+        return set(_watched)
+
+
+def start_price_poller(fetcher: Callable[[str], dict], interval: float = 60.0) -> None:
+    """
+    Start a daemon thread that fetches every watched symbol each `interval` seconds.
+    The fetcher goes through the normal (cached) market data path, which
+    publishes fresh quotes; cache hits cost nothing. Idempotent.
+    """
+    global _poller_thread
+    with _lock:
+        if _poller_thread is not None and _poller_thread.is_alive():
+            return
+        _poller_stop.clear()
+        _poller_thread = threading.Thread(
+            target=_poll_loop, args=(fetcher, interval), name='price-poller', daemon=True
+        )
+        _poller_thread.start()
+
+
+def stop_price_poller() -> None:
+    """Stop the poller thread (used on shutdown and in scripts)."""
+    _poller_stop.set()
+
+
+def _poll_loop(fetcher: Callable[[str], dict], interval: float) -> None:
+    while not _poller_stop.is_set():
+        for symbol in sorted(watched_symbols()):
+            if _poller_stop.is_set():
+                break
+            try:
+                fetcher(symbol)
+            except Exception as e:
+                logger.warning(f"Price poll failed for {symbol}: {e}")
+        _poller_stop.wait(interval)
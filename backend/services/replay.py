@@ -0,0 +1,274 @@
+"""
+Challenge Replay Service
+Re-runs the challenge rules over the stored trade history, e.g. after a
+change to the plan rules or a rule-engine fix, and reports the challenges
+whose status would be different. Nothing is written.
+
+Trades are streamed ordered by (challenge_id, created_at, id) in fixed-size
+chunks, so memory is bounded by the chunk size (plus one small record per
+challenge). Within a chunk the day-open balances, loss and profit percentages
+and the first rule trigger of each challenge are computed with NumPy group
+operations; state for a challenge that spans two chunks is carried over.
+
+The rules match the trade path (see challenge_engine._evaluate_rules), checked
+after every trade:
+  * Daily loss > max_daily_loss_percent -> failed (max_daily_loss)
+  * Total loss > max_total_loss_percent -> failed (max_total_loss)
+  * Profit > profit_target_percent -> passed (profit_target)
+
+Only statuses the trade path can produce are compared. Challenges in any other
+state (e.g. 'pending', or failed for a reason set by an admin) are counted
+under 'skipped'. A stored pass/fail that the replay does not reproduce at all
+may have been decided outside the trade path (risk monitor, day rollover,
+admin), so it is listed under 'not_reproduced' rather than as a change.
+"""
+import time
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from extensions import db
+from models import Challenge, Trade
+
+DEFAULT_CHUNK_SIZE = 50000
+
+# Outcome codes, in rule priority order
+_NONE, _DAILY, _TOTAL, _PROFIT = 0, 1, 2, 3
+_OUTCOMES = {
+    _NONE: ('active', None),
+    _DAILY: ('failed', 'max_daily_loss'),
+    _TOTAL: ('failed', 'max_total_loss'),
+    _PROFIT: ('passed', 'profit_target'),
+}
+
+# Stored states the trade rules can produce
+_TRADE_PATH_STATUSES = ('active', 'passed', 'failed')
+_TRADE_PATH_REASONS = ('max_daily_loss', 'max_total_loss')
+
+_RULE_FIELDS = ('max_daily_loss_percent', 'max_total_loss_percent', 'profit_target_percent')
+_RULE_DEFAULTS = {'max_daily_loss_percent': 5.0, 'max_total_loss_percent': 10.0, 'profit_target_percent': 10.0}
+
+
+class _Challenges:
+    """Per-challenge inputs as arrays sorted by challenge id."""
+
+    def __init__(self, rows: List[tuple], rules_by_plan: Optional[Dict[str, Dict[str, float]]]):
+        rules_by_plan = {k.lower(): v for k, v in (rules_by_plan or {}).items()}
+        n = len(rows)
+        self.ids = np.fromiter((r[0] for r in rows), dtype=np.int64, count=n)
+        self.starting = np.fromiter((r[2] or 0.0 for r in rows), dtype=np.float64, count=n)
+        limits = []
+        for _, plan_type, _, daily, total, target, _, _ in rows:
+            stored = {'max_daily_loss_percent': daily, 'max_total_loss_percent': total, 'profit_target_percent': target}
+            plan_rules = rules_by_plan.get((plan_type or '').lower(), {})
+            limits.append([plan_rules.get(f, stored[f]) or _RULE_DEFAULTS[f] for f in _RULE_FIELDS])
+        limits = np.asarray(limits, dtype=np.float64).reshape(n, 3)
+        self.max_daily, self.max_total, self.target = limits[:, 0], limits[:, 1], limits[:, 2]
+        self.status = [r[6] for r in rows]
+        self.failure_reason = [r[7] for r in rows]
+
+    def index_of(self, challenge_ids: np.ndarray) -> np.ndarray:
+        return np.searchsorted(self.ids, challenge_ids)
+
+
+def _load_challenges(challenge_ids: Optional[List[int]], status: Optional[str],
+                     rules_by_plan: Optional[Dict[str, Dict[str, float]]]) -> _Challenges:
+    query = db.session.query(
+        Challenge.id, Challenge.plan_type, Challenge.starting_balance,
+        Challenge.max_daily_loss_percent, Challenge.max_total_loss_percent, Challenge.profit_target_percent,
+        Challenge.status, Challenge.failure_reason,
+    )
+    if challenge_ids:
+        query = query.filter(Challenge.id.in_(challenge_ids))
+    if status:
+        query = query.filter(Challenge.status == status)
+    return _Challenges(query.order_by(Challenge.id.asc()).all(), rules_by_plan)
+
+
+def _stream_trades(challenge_ids: Optional[List[int]], status: Optional[str], chunk_size: int) -> Iterable[List[tuple]]:
+    """Yield lists of (challenge_id, trade_id, created_at, balance_after_trade) in replay order."""
+    query = db.session.query(Trade.challenge_id, Trade.id, Trade.created_at, Trade.balance_after_trade)
+    if challenge_ids:
+        query = query.filter(Trade.challenge_id.in_(challenge_ids))
+    if status:
+        query = query.join(Challenge, Challenge.id == Trade.challenge_id).filter(Challenge.status == status)
+    rows = iter(query.order_by(Trade.challenge_id.asc(), Trade.created_at.asc(), Trade.id.asc()).yield_per(chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class _Carry:
+    """State of the last challenge of the previous chunk."""
+    __slots__ = ('challenge_id', 'day', 'day_open', 'balance', 'decided')
+
+    def __init__(self):
+        self.challenge_id = -1
+        self.day = -1
+        self.day_open = 0.0
+        self.balance = 0.0
+        self.decided = False
+
+
+def _replay_chunk(chunk: List[tuple], challenges: _Challenges, carry: _Carry,
+                  first_trigger: Dict[int, tuple]) -> None:
+    """Evaluate the rules after every trade of a chunk, recording each challenge's first trigger."""
+    n = len(chunk)
+    cid = np.fromiter((r[0] for r in chunk), dtype=np.int64, count=n)
+    trade_ids = np.fromiter((r[1] for r in chunk), dtype=np.int64, count=n)
+    created = np.array([r[2] for r in chunk], dtype='datetime64[us]')
+    day = created.astype('datetime64[D]').astype(np.int64)
+    balance = np.fromiter((r[3] for r in chunk), dtype=np.float64, count=n)
+
+    idx = challenges.index_of(cid)
+    starting = challenges.starting[idx]
+
+    # Group boundaries (row 0 continues the carried challenge/day when they match)
+    prev_cid = np.empty(n, dtype=np.int64)
+    prev_cid[0] = carry.challenge_id
+    prev_cid[1:] = cid[:-1]
+    prev_day = np.empty(n, dtype=np.int64)
+    prev_day[0] = carry.day
+    prev_day[1:] = day[:-1]
+    new_challenge = cid != prev_cid
+    new_day = new_challenge | (day != prev_day)
+
+    # Balance before each trade: previous trade, or the starting balance
+    prev_balance = np.empty(n, dtype=np.float64)
+    prev_balance[0] = carry.balance
+    prev_balance[1:] = balance[:-1]
+    prev_balance = np.where(new_challenge, starting, prev_balance)
+
+    # Day-open balance: balance before the first trade of each (challenge, day),
+    # forward-filled over the group
+    open_value = np.where(new_day, prev_balance, np.nan)
+    if not new_day[0]:
+        open_value[0] = carry.day_open
+    anchor = np.where(~np.isnan(open_value), np.arange(n), 0)
+    np.maximum.accumulate(anchor, out=anchor)
+    day_open = open_value[anchor]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_loss = np.where(day_open > 0, np.maximum(0.0, day_open - balance) / day_open * 100, 0.0)
+        profit = np.where(starting > 0, (balance - starting) / starting * 100, 0.0)
+    total_loss = np.maximum(0.0, -profit)
+
+    outcome = np.select(
+        [daily_loss > challenges.max_daily[idx],
+         total_loss > challenges.max_total[idx],
+         profit > challenges.target[idx]],
+        [_DAILY, _TOTAL, _PROFIT],
+        default=_NONE,
+    )
+
+    # A challenge already decided in the previous chunk stays decided
+    if carry.decided:
+        outcome[cid == carry.challenge_id] = _NONE
+
+    triggered = np.flatnonzero(outcome)
+    if triggered.size:
+        first_cids, first_pos = np.unique(cid[triggered], return_index=True)
+        for challenge_id, row in zip(first_cids.tolist(), triggered[first_pos].tolist()):
+            first_trigger[challenge_id] = (
+                int(outcome[row]), int(trade_ids[row]), chunk[row][2], float(balance[row]),
+                round(float(daily_loss[row]), 2), round(float(profit[row]), 2),
+            )
+
+    last = n - 1
+    last_cid = int(cid[last])
+    carry.decided = last_cid in first_trigger
+    carry.challenge_id = last_cid
+    carry.day = int(day[last])
+    carry.day_open = float(day_open[last])
+    carry.balance = float(balance[last])
+
+
+def replay_challenges(challenge_ids: Optional[List[int]] = None, status: Optional[str] = None,
+                      rules_by_plan: Optional[Dict[str, Dict[str, float]]] = None,
+                      chunk_size: int = DEFAULT_CHUNK_SIZE, limit: Optional[int] = 1000) -> Dict[str, Any]:
+    """
+    Replay the rules over the trade history of many challenges (call inside an app context).
+
+    Args:
+        challenge_ids: Only these challenges (default: all)
+        status: Only challenges currently in this status (e.g. 'active')
+        rules_by_plan: Rule overrides per plan type, e.g. PLAN_CONFIG; fields missing
+            from a plan (or plans missing from the map) use the stored challenge rules
+        chunk_size: Trades per streamed chunk
+        limit: Maximum number of changes listed in the report (None for all)
+
+    Returns:
+        dict: {challenges_replayed, trades_replayed, changes_count, changes,
+        not_reproduced_count, not_reproduced, skipped, elapsed_ms}
+        where each change (and not_reproduced entry) is {challenge_id, stored_status,
+        stored_reason, replayed_status, replayed_reason, trade_id, at, balance,
+        daily_loss_percent, profit_percent}; skipped counts challenges per stored
+        status the trade path cannot produce
+    """
+    started = time.perf_counter()
+    challenges = _load_challenges(challenge_ids, status, rules_by_plan)
+    if challenges.ids.size == 0:
+        return {'challenges_replayed': 0, 'trades_replayed': 0, 'changes_count': 0, 'changes': [],
+                'not_reproduced_count': 0, 'not_reproduced': [], 'skipped': {}, 'elapsed_ms': 0.0}
+
+    first_trigger: Dict[int, tuple] = {}
+    carry = _Carry()
+    trades_replayed = 0
+    for chunk in _stream_trades(challenge_ids, status, chunk_size):
+        # Trades of challenges outside the selection (e.g. deleted rows) are skipped
+        known = np.isin(np.fromiter((r[0] for r in chunk), dtype=np.int64, count=len(chunk)), challenges.ids)
+        if not known.all():
+            chunk = [row for row, keep in zip(chunk, known.tolist()) if keep]
+            if not chunk:
+                continue
+        _replay_chunk(chunk, challenges, carry, first_trigger)
+        trades_replayed += len(chunk)
+    db.session.rollback()  # end the read transaction
+
+    changes, not_reproduced = [], []
+    skipped: Dict[str, int] = {}
+    for i, challenge_id in enumerate(challenges.ids.tolist()):
+        outcome = first_trigger.get(challenge_id)
+        replayed_status, replayed_reason = _OUTCOMES[outcome[0] if outcome else _NONE]
+        stored_status = challenges.status[i]
+        stored_reason = challenges.failure_reason[i] if stored_status == 'failed' else None
+        if stored_status not in _TRADE_PATH_STATUSES or (
+                stored_status == 'failed' and stored_reason not in _TRADE_PATH_REASONS):
+            key = f'failed:{stored_reason}' if stored_status == 'failed' else str(stored_status)
+            skipped[key] = skipped.get(key, 0) + 1
+            continue
+        if replayed_status == 'passed':
+            replayed_reason = None  # the trade path only records failure reasons
+        if (stored_status, stored_reason) == (replayed_status, replayed_reason):
+            continue
+        change = {
+            'challenge_id': challenge_id,
+            'stored_status': stored_status,
+            'stored_reason': stored_reason,
+            'replayed_status': replayed_status,
+            'replayed_reason': _OUTCOMES[outcome[0]][1] if outcome else None,
+            'trade_id': None, 'at': None, 'balance': None,
+            'daily_loss_percent': None, 'profit_percent': None,
+        }
+        if outcome:
+            _, trade_id, at, balance, daily_loss, profit = outcome
+            change.update(trade_id=trade_id, at=at, balance=balance,
+                          daily_loss_percent=daily_loss, profit_percent=profit)
+        if outcome is None and stored_status != 'active':
+            not_reproduced.append(change)
+        else:
+            changes.append(change)
+
+    return {
+        'challenges_replayed': int(challenges.ids.size),
+        'trades_replayed': trades_replayed,
+        'changes_count': len(changes),
+        'changes': changes if limit is None else changes[:limit],
+        'not_reproduced_count': len(not_reproduced),
+        'not_reproduced': not_reproduced if limit is None else not_reproduced[:limit],
+        'skipped': skipped,
+        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+    }
@@ -0,0 +1,473 @@
+"""
+Risk Monitor Service
+Mark-to-market loss rules for every active challenge, outside the trade path.
+- Open positions of all active challenges are kept as NumPy arrays in
+  coordinate form (challenge row, symbol column, quantity)
+- On each price refresh the whole book is revalued in one pass:
+  equity = cash + bincount(rows, quantity * price)
+- Max daily loss / max total loss breaches are applied with bulk UPDATEs
+
+The trade path still checks rules against cash on every trade; the monitor
+catches open positions that lose value between trades. It runs as one daemon
+thread per process and is enabled with RISK_MONITOR_ENABLED.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, time as day_time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from flask import current_app
+from sqlalchemy import Date, DateTime, Float, Integer, case, func, literal, select
+
+from extensions import db
+from models import Challenge, ChallengeDailyBalance, Position, Trade
+from services import price_feed
+from services.challenge_cache import bump_challenge_version
+from services.challenge_engine import QUANTITY_EPSILON, register_trade_listener
+
+logger = logging.getLogger(__name__)
+
+# Defaults used when a challenge has no explicit limits (same as the rule engine)
+DEFAULT_MAX_DAILY_LOSS_PERCENT = 5.0
+DEFAULT_MAX_TOTAL_LOSS_PERCENT = 10.0
+
+# Ids per bulk UPDATE statement (keeps SQLite under its bound-parameter limit)
+UPDATE_CHUNK_SIZE = 500
+
+
+class RiskMonitor:
+    """
+    In-memory book of active challenges and their open positions.
+
+    Day-open equity (the daily loss baseline) only comes from a real opening mark:
+    - When the monitor is running as the UTC day rolls over, the equity at the
+      first valuation of the new day; it is stored in the day's
+      ChallengeDailyBalance.open_equity so a restart keeps it
+    - On load, the stored open_equity, or the day's open cash when the
+      challenge carried no position into the day
+    A challenge without one (positions carried into a day the monitor did not
+    see open) is not checked for daily loss until the next day; its total loss
+    is still checked.
+    """
+
+    def __init__(self, app, interval: float = 1.0, reload_interval: float = 300.0):
+        self.app = app
+        self.interval = interval
+        self.reload_interval = reload_interval
+        self.last_run: Dict[str, Any] = {}
+
+        self._lock = threading.Lock()
+        self._dirty = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pending_trades: List[Dict[str, Any]] = []
+        self._opening_marks: Dict[int, float] = {}  # captured at the day rollover, not stored yet
+
+        # Symbol columns survive reloads so known prices are kept
+        self.symbols: List[str] = []
+        self._col_of: Dict[str, int] = {}
+        self.prices = np.empty(0, dtype=np.float64)
+        self._watching = set()  # symbols this monitor asked the price poller for
+
+        self._day = None
+        self._clear_book()
+
+    # ------------------------------------------------------------------
+    # Book maintenance
+    # ------------------------------------------------------------------
+
+    def _clear_book(self) -> None:
+        self.challenge_ids = np.empty(0, dtype=np.int64)
+        self.cash = np.empty(0, dtype=np.float64)
+        self.starting = np.empty(0, dtype=np.float64)
+        self.max_daily = np.empty(0, dtype=np.float64)
+        self.max_total = np.empty(0, dtype=np.float64)
+        self.day_open = np.empty(0, dtype=np.float64)
+        self.active = np.empty(0, dtype=bool)
+        self._row_of: Dict[int, int] = {}
+
+        self.pos_rows = np.empty(0, dtype=np.int64)
+        self.pos_cols = np.empty(0, dtype=np.int64)
+        self.pos_qty = np.empty(0, dtype=np.float64)
+        self.pos_cost = np.empty(0, dtype=np.float64)
+        self._pos_of: Dict[tuple, int] = {}
+
+    def _column(self, symbol: str) -> int:
+        """Column of a symbol, adding it (with an unknown price) if new."""
+        col = self._col_of.get(symbol)
+        if col is None:
+            col = len(self.symbols)
+            self.symbols.append(symbol)
+            self._col_of[symbol] = col
+            self.prices = np.append(self.prices, np.nan)
+        if symbol not in self._watching:
+            self._watching.add(symbol)
+            price_feed.watch([symbol])
+        return col
+
+    def load(self) -> None:
+        """Rebuild the book from the database (call inside an app context)."""
+        challenges = db.session.query(
+            Challenge.id,
+            Challenge.current_balance,
+            Challenge.starting_balance,
+            Challenge.max_daily_loss_percent,
+            Challenge.max_total_loss_percent,
+        ).filter(Challenge.status == 'active').order_by(Challenge.id.asc()).all()
+
+        positions = db.session.query(
+            Position.challenge_id, Position.symbol, Position.quantity, Position.avg_cost
+        ).join(Challenge, Challenge.id == Position.challenge_id).filter(
+            Challenge.status == 'active', Position.quantity != 0
+        ).all()
+        today = datetime.utcnow().date()
+        seeds = self._day_open_seeds(today, challenges)
+        db.session.rollback()  # release the read transaction
+
+        with self._lock:
+            # Baselines captured live today win over the snapshot seeds
+            day_open = dict(seeds)
+            if self._day == today:
+                day_open.update((cid, value) for cid, value in zip(self.challenge_ids.tolist(), self.day_open.tolist())
+                                if not np.isnan(value))
+            self._day = today
+            self._clear_book()
+
+            n = len(challenges)
+            self.challenge_ids = np.fromiter((c[0] for c in challenges), dtype=np.int64, count=n)
+            self.cash = np.fromiter((c[1] or 0.0 for c in challenges), dtype=np.float64, count=n)
+            self.starting = np.fromiter((c[2] or 0.0 for c in challenges), dtype=np.float64, count=n)
+            self.max_daily = np.fromiter(
+                (c[3] or DEFAULT_MAX_DAILY_LOSS_PERCENT for c in challenges), dtype=np.float64, count=n)
+            self.max_total = np.fromiter(
+                (c[4] or DEFAULT_MAX_TOTAL_LOSS_PERCENT for c in challenges), dtype=np.float64, count=n)
+            self.day_open = np.fromiter(
+                (day_open.get(c[0], np.nan) for c in challenges), dtype=np.float64, count=n)
+            self.active = np.ones(n, dtype=bool)
+            self._row_of = {int(cid): row for row, cid in enumerate(self.challenge_ids)}
+
+            rows, cols, qty, cost = [], [], [], []
+            for challenge_id, symbol, quantity, avg_cost in positions:
+                row = self._row_of.get(challenge_id)
+                if row is None:
+                    continue
+                col = self._column(symbol)
+                self._pos_of[(row, col)] = len(rows)
+                rows.append(row)
+                cols.append(col)
+                qty.append(quantity)
+                cost.append(avg_cost or 0.0)
+            self.pos_rows = np.asarray(rows, dtype=np.int64)
+            self.pos_cols = np.asarray(cols, dtype=np.int64)
+            self.pos_qty = np.asarray(qty, dtype=np.float64)
+            self.pos_cost = np.asarray(cost, dtype=np.float64)
+
+            # Stop polling symbols nobody holds anymore
+            held = {self.symbols[col] for col in set(cols)}
+            stale = self._watching - held
+            if stale:
+                price_feed.unwatch(stale)
+                self._watching -= stale
+                for symbol in stale:
+                    self.prices[self._col_of[symbol]] = np.nan
+
+        logger.info(f"Risk monitor loaded {n} active challenges, {len(positions)} open positions")
+
+    @staticmethod
+    def _day_open_seeds(today, challenges) -> Dict[int, float]:
+        """
+        Day-open equity of the active challenges that have a real opening mark for
+        `today`: the stored open_equity, or else the open cash (the day's
+        open_balance, or the current balance when nothing traded today) when no
+        position was carried into the day. Positions closed today count as carried.
+        """
+        snapshots = {
+            challenge_id: (open_balance, open_equity)
+            for challenge_id, open_balance, open_equity in db.session.query(
+                ChallengeDailyBalance.challenge_id, ChallengeDailyBalance.open_balance, ChallengeDailyBalance.open_equity
+            ).join(Challenge, Challenge.id == ChallengeDailyBalance.challenge_id).filter(
+                Challenge.status == 'active', ChallengeDailyBalance.day == today
+            ).all()
+        }
+
+        signed = case((Trade.action == 'buy', Trade.quantity), else_=-Trade.quantity)
+        traded_today = {
+            (challenge_id, symbol): net for challenge_id, symbol, net in db.session.query(
+                Trade.challenge_id, Trade.symbol, func.sum(signed)
+            ).join(Challenge, Challenge.id == Trade.challenge_id).filter(
+                Challenge.status == 'active', Trade.created_at >= datetime.combine(today, day_time.min)
+            ).group_by(Trade.challenge_id, Trade.symbol).all()
+        }
+
+        # Every position row, flat ones included: a position closed today was carried
+        carried = set()
+        for challenge_id, symbol, quantity in db.session.query(
+            Position.challenge_id, Position.symbol, Position.quantity
+        ).join(Challenge, Challenge.id == Position.challenge_id).filter(Challenge.status == 'active').all():
+            if abs(quantity - (traded_today.get((challenge_id, symbol)) or 0.0)) > QUANTITY_EPSILON:
+                carried.add(challenge_id)
+
+        seeds: Dict[int, float] = {}
+        for challenge_id, current_balance, *_ in challenges:
+            open_balance, open_equity = snapshots.get(challenge_id, (None, None))
+            if open_equity is not None:
+                seeds[challenge_id] = open_equity
+            elif challenge_id not in carried:
+                # No snapshot yet means no trade today: the balance is still the open cash
+                seeds[challenge_id] = open_balance if open_balance is not None else (current_balance or 0.0)
+        return seeds
+
+    @staticmethod
+    def _store_opening_marks(day, marks: Dict[int, float], now: datetime) -> None:
+        """
+        Store day-open equity in the day's balance snapshots, opening the
+        snapshots that do not exist yet (no commit; existing marks are kept).
+        """
+        challenges = Challenge.__table__
+        snapshots = ChallengeDailyBalance.__table__
+        challenge_ids = list(marks)
+        for start in range(0, len(challenge_ids), UPDATE_CHUNK_SIZE):
+            chunk = challenge_ids[start:start + UPDATE_CHUNK_SIZE]
+            missing = ~select(literal(1)).where(
+                snapshots.c.challenge_id == challenges.c.id, snapshots.c.day == day
+            ).exists()
+            db.session.execute(
+                snapshots.insert().from_select(
+                    ['challenge_id', 'day', 'open_balance', 'high_balance', 'low_balance', 'close_balance',
+                     'trade_count', 'volume', 'updated_at'],
+                    select(
+                        challenges.c.id, literal(day, Date), challenges.c.current_balance,
+                        challenges.c.current_balance, challenges.c.current_balance, challenges.c.current_balance,
+                        literal(0, Integer), literal(0.0, Float), literal(now, DateTime),
+                    ).where(challenges.c.id.in_(chunk), missing),
+                )
+            )
+            db.session.execute(
+                snapshots.update()
+                .where(snapshots.c.challenge_id.in_(chunk), snapshots.c.day == day, snapshots.c.open_equity.is_(None))
+                .values(open_equity=case({cid: marks[cid] for cid in chunk}, value=snapshots.c.challenge_id))
+            )
+
+    def _apply_trade_event(self, event: Dict[str, Any]) -> None:
+        """Fold a committed trade into the book (caller holds the lock)."""
+        challenge_id = event['challenge_id']
+        row = self._row_of.get(challenge_id)
+
+        if event.get('status') != 'active':
+            if row is not None:
+                self.active[row] = False
+            return
+
+        if row is None:
+            row = len(self.challenge_ids)
+            self._row_of[challenge_id] = row
+            self.challenge_ids = np.append(self.challenge_ids, challenge_id)
+            self.cash = np.append(self.cash, 0.0)
+            self.starting = np.append(self.starting, event.get('starting_balance') or 0.0)
+            self.max_daily = np.append(
+                self.max_daily, event.get('max_daily_loss_percent') or DEFAULT_MAX_DAILY_LOSS_PERCENT)
+            self.max_total = np.append(
+                self.max_total, event.get('max_total_loss_percent') or DEFAULT_MAX_TOTAL_LOSS_PERCENT)
+            self.day_open = np.append(self.day_open, np.nan)
+            self.active = np.append(self.active, True)
+
+        self.cash[row] = event['current_balance']
+
+        col = self._column(event['symbol'])
+        k = self._pos_of.get((row, col))
+        if k is None:
+            self._pos_of[(row, col)] = len(self.pos_rows)
+            self.pos_rows = np.append(self.pos_rows, row)
+            self.pos_cols = np.append(self.pos_cols, col)
+            self.pos_qty = np.append(self.pos_qty, event['position_quantity'])
+            self.pos_cost = np.append(self.pos_cost, event.get('avg_cost') or 0.0)
+        else:
+            self.pos_qty[k] = event['position_quantity']
+            self.pos_cost[k] = event.get('avg_cost') or 0.0
+
+    # ------------------------------------------------------------------
+    # Event handlers (called from request threads; must stay cheap)
+    # ------------------------------------------------------------------
+
+    def on_price(self, symbol: str, price: float) -> None:
+        col = self._col_of.get(symbol)
+        if col is None:
+            return
+        with self._lock:
+            self.prices[col] = price
+        self._dirty.set()
+
+    def on_trade(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            self._pending_trades.append(event)
+        self._dirty.set()
+
+    # ------------------------------------------------------------------
+    # Valuation
+    # ------------------------------------------------------------------
+
+    def revalue(self, now: Optional[datetime] = None) -> Dict[str, np.ndarray]:
+        """
+        Revalue every challenge against the current price vector (caller holds the lock).
+        Positions without a known price are valued at their average cost.
+
+        Returns:
+            dict of per-row arrays: equity, daily_loss_percent, total_loss_percent,
+            daily_breach, total_breach
+        """
+        now = now or datetime.utcnow()
+        n = len(self.challenge_ids)
+
+        prices = self.prices[self.pos_cols]
+        prices = np.where(np.isnan(prices), self.pos_cost, prices)
+        market_value = np.bincount(self.pos_rows, weights=self.pos_qty * prices, minlength=n)
+        equity = self.cash + market_value
+
+        # Day-open equity: at UTC midnight, the first valuation of the new day is
+        # the opening mark of every challenge whose positions all have a price
+        today = now.date()
+        if self._day != today:
+            self._day = today
+            unpriced = np.bincount(self.pos_rows, weights=np.isnan(self.prices[self.pos_cols]), minlength=n)
+            self.day_open = np.where(unpriced == 0, equity, np.nan)
+            marked = np.flatnonzero(~np.isnan(self.day_open) & self.active)
+            self._opening_marks = dict(zip(self.challenge_ids[marked].tolist(), self.day_open[marked].tolist()))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # No opening mark (NaN): no daily loss check
+            daily_loss = np.where(self.day_open > 0, (self.day_open - equity) / self.day_open * 100, 0.0)
+            total_loss = np.where(self.starting > 0, (self.starting - equity) / self.starting * 100, 0.0)
+
+        daily_breach = self.active & (daily_loss > self.max_daily)
+        total_breach = self.active & ~daily_breach & (total_loss > self.max_total)
+        return {
+            'equity': equity,
+            'daily_loss_percent': daily_loss,
+            'total_loss_percent': total_loss,
+            'daily_breach': daily_breach,
+            'total_breach': total_breach,
+        }
+
+    def check(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Apply pending trades, revalue the book and fail breached challenges
+        (call inside an app context).
+
+        Returns:
+            dict: {checked, failed_daily, failed_total, elapsed_ms}
+        """
+        started = time.perf_counter()
+        now = now or datetime.utcnow()
+
+        with self._lock:
+            pending, self._pending_trades = self._pending_trades, []
+            for event in pending:
+                self._apply_trade_event(event)
+            result = self.revalue(now)
+            daily_rows = np.flatnonzero(result['daily_breach'])
+            total_rows = np.flatnonzero(result['total_breach'])
+            daily_ids = self.challenge_ids[daily_rows].tolist()
+            total_ids = self.challenge_ids[total_rows].tolist()
+            checked = int(self.active.sum())
+            marks, self._opening_marks = self._opening_marks, {}
+
+        if marks:
+            self._store_opening_marks(now.date(), marks, now)
+            db.session.commit()
+
+        if daily_ids or total_ids:
+            self._fail_challenges(daily_ids, 'max_daily_loss', now)
+            self._fail_challenges(total_ids, 'max_total_loss', now)
+            db.session.commit()
+            bump_challenge_version(*daily_ids, *total_ids)
+            with self._lock:
+                self.active[daily_rows] = False
+                self.active[total_rows] = False
+            logger.info(f"Risk monitor failed {len(daily_ids)} challenges on daily loss, "
+                        f"{len(total_ids)} on total loss")
+
+        self.last_run = {
+            'checked': checked,
+            'failed_daily': len(daily_ids),
+            'failed_total': len(total_ids),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 3),
+            'at': now,
+        }
+        return self.last_run
+
+    @staticmethod
+    def _fail_challenges(challenge_ids: List[int], reason: str, now: datetime) -> None:
+        """Bulk-fail still-active challenges (no commit)."""
+        table = Challenge.__table__
+        for start in range(0, len(challenge_ids), UPDATE_CHUNK_SIZE):
+            chunk = challenge_ids[start:start + UPDATE_CHUNK_SIZE]
+            db.session.execute(
+                table.update()
+                .where(table.c.id.in_(chunk), table.c.status == 'active')
+                .values(status='failed', failure_reason=reason, ended_at=now)
+            )
+
+    # ------------------------------------------------------------------
+    # Background thread
+    # ------------------------------------------------------------------
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='risk-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._dirty.set()
+
+    def _run(self) -> None:
+        last_reload = 0.0
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    if time.monotonic() - last_reload >= self.reload_interval:
+                        self.load()
+                        last_reload = time.monotonic()
+                    self.check()
+            except Exception as e:
+                logger.exception(f"Risk monitor run failed: {e}")
+                try:
+                    with self.app.app_context():
+                        db.session.rollback()
+                except Exception:
+                    pass
+
+            # Wait for the next price/trade event; bursts within `interval`
+            # are coalesced into one revaluation
+            self._dirty.wait(self.reload_interval)
+            self._dirty.clear()
+            self._stop.wait(self.interval)
+
+
+_monitor_lock = threading.Lock()
+
+
+def get_risk_monitor() -> Optional[RiskMonitor]:
+    """The risk monitor of the current app, or None when it is not running."""
+    return current_app.extensions.get('risk_monitor')
+
+
+def start_risk_monitor(app) -> RiskMonitor:
+    """Create, wire and start the app's risk monitor (idempotent)."""
+    with _monitor_lock:
+        monitor = app.extensions.get('risk_monitor')
+        if monitor is None:
+            monitor = RiskMonitor(
+                app,
+                interval=app.config.get('RISK_MONITOR_INTERVAL', 1.0),
+                reload_interval=app.config.get('RISK_MONITOR_RELOAD_SECONDS', 300.0),
+            )
+            price_feed.subscribe(monitor.on_price)
+            register_trade_listener(monitor.on_trade)
+            app.extensions['risk_monitor'] = monitor
+        monitor.start()
+    return monitor
@@ -0,0 +1,126 @@
+"""
+Scheduler Service
+In-process scheduled jobs that are safe to run on several workers.
+- Each worker runs a daemon thread per job that wakes at the scheduled UTC time
+- Before running, a worker claims the run in the job_runs table (unique per
+  job and run key); the others see the claim and skip it
+- A claim left 'running' by a crashed worker can be taken over after
+  STALE_CLAIM_MINUTES, so jobs must be idempotent
+"""
+import json
+import logging
+import threading
+from datetime import datetime, time, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import JobRun
+
+logger = logging.getLogger(__name__)
+
+# A 'running' claim older than this is assumed abandoned
+STALE_CLAIM_MINUTES = 30
+
+
+def claim_job_run(job_name: str, run_key: str, now: Optional[datetime] = None) -> bool:
+    """
+    Claim a job run for this worker (call inside an app context).
+
+    Returns:
+        True if this worker should run the job, False if another worker
+        has it (or already completed it)
+    """
+    now = now or datetime.utcnow()
+    try:
+        db.session.add(JobRun(job_name=job_name, run_key=run_key, status='running', started_at=now))
+        db.session.commit()
+        return True
+    except IntegrityError:
+        db.session.rollback()
+
+    # Take over a failed or abandoned run
+    cutoff = now - timedelta(minutes=STALE_CLAIM_MINUTES)
+    taken = JobRun.query.filter(
+        JobRun.job_name == job_name,
+        JobRun.run_key == run_key,
+        db.or_(JobRun.status == 'failed', db.and_(JobRun.status == 'running', JobRun.started_at < cutoff)),
+    ).update({'status': 'running', 'started_at': now, 'finished_at': None}, synchronize_session=False)
+    db.session.commit()
+    return bool(taken)
+
+
+def finish_job_run(job_name: str, run_key: str, status: str, details: Any = None) -> None:
+    """Record the outcome of a claimed run."""
+    JobRun.query.filter_by(job_name=job_name, run_key=run_key).update({
+        'status': status,
+        'finished_at': datetime.utcnow(),
+        'details': details if isinstance(details, str) or details is None else json.dumps(details, default=str),
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def run_claimed(job_name: str, run_key: str, func: Callable[[], Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    Run `func` if this worker wins the claim for (job_name, run_key).
+
+    Returns:
+        The job result, or None when another worker owns the run
+    """
+    if not claim_job_run(job_name, run_key):
+        return None
+    try:
+        result = func()
+    except Exception as e:
+        db.session.rollback()
+        finish_job_run(job_name, run_key, 'failed', str(e)[:1000])
+        raise
+    finish_job_run(job_name, run_key, 'completed', result)
+    return result
+
+
+class DailyJob:
+    """
+    Thread that runs a job once per UTC day at `at` (and once at startup, so a
+    run missed while no worker was up is caught up).
+    """
+
+    def __init__(self, app, name: str, func: Callable[[datetime], Dict[str, Any]], at: time = time(0, 0, 5)):
+        self.app = app
+        self.name = name
+        self.func = func
+        self.at = at
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def next_run(self, now: datetime) -> datetime:
+        scheduled = datetime.combine(now.date(), self.at)
+        return scheduled if scheduled > now else scheduled + timedelta(days=1)
+
+    def run_once(self, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        """Run the job for the UTC day of `now` unless another worker has (call inside an app context)."""
+        now = now or datetime.utcnow()
+        return run_claimed(self.name, now.date().isoformat(), lambda: self.func(now))
+
+    def start(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=f'job-{self.name}', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                with self.app.app_context():
+                    result = self.run_once()
+                if result is not None:
+                    logger.info(f"Job {self.name} completed: {result}")
+            except Exception as e:
+                logger.exception(f"Job {self.name} failed: {e}")
+            now = datetime.utcnow()
+            self._stop.wait((self.next_run(now) - now).total_seconds())
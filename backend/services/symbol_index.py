@@ -0,0 +1,212 @@
+"""
+Symbol Search Service
+In-memory index over the bundled symbol universe (data/symbols.csv plus the
+Moroccan stocks known to the scraper).
+- Trie over tickers and name words for prefix matches
+- Trigram index over names for fuzzy matches
+Queries never touch the network.
+"""
+import csv
+import os
+import threading
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from services.morocco_scraper import MOROCCO_STOCKS
+
+SYMBOLS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'symbols.csv')
+
+# Exchange label used for Casablanca Stock Exchange symbols
+MOROCCO_EXCHANGE = 'CSE'
+
+# Ranking weights (higher is better)
+SCORE_EXACT_SYMBOL = 100.0
+SCORE_SYMBOL_PREFIX = 80.0
+SCORE_NAME_PREFIX = 60.0
+SCORE_FUZZY = 50.0
+
+# Minimum trigram similarity (Dice coefficient) for a fuzzy match
+FUZZY_THRESHOLD = 0.3
+
+
+def _normalize(text: str) -> str:
+    """Lowercase and strip accents so 'Crédit' matches 'credit'."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold().strip()
+
+
+def _words(text: str) -> List[str]:
+    """Split normalized text into alphanumeric words."""
+    cleaned = ''.join(ch if ch.isalnum() else ' ' for ch in text)
+    return cleaned.split()
+
+
+def _trigrams(text: str) -> Set[str]:
+    """Padded character trigrams of a normalized string."""
+    padded = f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class _TrieNode:
+    __slots__ = ('children', 'ids')
+
+    def __init__(self):
+        self.children: Dict[str, '_TrieNode'] = {}
+        self.ids: Set[int] = set()
+
+
+class _Trie:
+    """Prefix tree where every node holds the ids of all keys below it."""
+
+    def __init__(self):
+        self.root = _TrieNode()
+
+    def insert(self, key: str, entry_id: int) -> None:
+        node = self.root
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+            node.ids.add(entry_id)
+
+    def prefix(self, key: str) -> Set[int]:
+        node = self.root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return set()
+        return node.ids
+
+
+class SymbolIndex:
+    """Ranked prefix and fuzzy search over a fixed list of symbols."""
+
+    def __init__(self, entries: List[Dict[str, str]]):
+        self.entries = entries
+        self._symbols: List[str] = []
+        self._symbol_trie = _Trie()
+        self._name_trie = _Trie()
+        self._name_trigrams: List[Set[str]] = []
+        self._trigram_index: Dict[str, Set[int]] = {}
+
+        for entry_id, entry in enumerate(entries):
+            symbol = _normalize(entry['symbol'])
+            name = _normalize(entry['name'])
+            self._symbols.append(symbol)
+            self._symbol_trie.insert(symbol, entry_id)
+            for word in _words(name):
+                self._name_trie.insert(word, entry_id)
+
+            grams = _trigrams(name)
+            self._name_trigrams.append(grams)
+            for gram in grams:
+                self._trigram_index.setdefault(gram, set()).add(entry_id)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def search(self, query: str, limit: int = 10) -> List[Dict[str, object]]:
+        """
+        Search symbols by ticker or company name.
+
+        Args:
+            query: Ticker or name fragment (e.g., 'AA', 'attijari', 'micrsoft')
+            limit: Maximum number of results
+
+        Returns:
+            List of {symbol, name, exchange, score} ordered by relevance
+        """
+        q = _normalize(query or '')
+        if not q or limit <= 0:
+            return []
+
+        scores: Dict[int, float] = {}
+
+        def _offer(entry_id: int, score: float) -> None:
+            if score > scores.get(entry_id, 0.0):
+                scores[entry_id] = score
+
+        # Ticker prefix (exact ticker ranks first, shorter tickers next)
+        for entry_id in self._symbol_trie.prefix(q):
+            if self._symbols[entry_id] == q:
+                _offer(entry_id, SCORE_EXACT_SYMBOL)
+            else:
+                _offer(entry_id, SCORE_SYMBOL_PREFIX - (len(self._symbols[entry_id]) - len(q)))
+
+        # Name word prefix: every query word must prefix some word of the name
+        query_words = _words(q)
+        if query_words:
+            matched: Optional[Set[int]] = None
+            for word in query_words:
+                ids = self._name_trie.prefix(word)
+                matched = set(ids) if matched is None else matched & ids
+                if not matched:
+                    break
+            for entry_id in matched or ():
+                _offer(entry_id, SCORE_NAME_PREFIX)
+
+        # Fuzzy name match via trigram overlap
+        query_grams = _trigrams(q)
+        overlap: Dict[int, int] = {}
+        for gram in query_grams:
+            for entry_id in self._trigram_index.get(gram, ()):
+                overlap[entry_id] = overlap.get(entry_id, 0) + 1
+        for entry_id, shared in overlap.items():
+            similarity = 2.0 * shared / (len(query_grams) + len(self._name_trigrams[entry_id]))
+            if similarity >= FUZZY_THRESHOLD:
+                _offer(entry_id, SCORE_FUZZY * similarity)
+
+        ranked: List[Tuple[float, int, str, int]] = sorted(
+            (-score, len(self._symbols[entry_id]), self._symbols[entry_id], entry_id)
+            for entry_id, score in scores.items()
+        )
+
+        results = []
+        for neg_score, _, _, entry_id in ranked[:limit]:
+            entry = self.entries[entry_id]
+            results.append({
+                'symbol': entry['symbol'],
+                'name': entry['name'],
+                'exchange': entry['exchange'],
+                'score': round(-neg_score, 2),
+            })
+        return results
+
+
+def load_symbol_entries(path: str = SYMBOLS_FILE) -> List[Dict[str, str]]:
+    """Load the bundled symbol list and merge in the Moroccan stocks."""
+    entries: Dict[str, Dict[str, str]] = {}
+    try:
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                symbol = (row.get('symbol') or '').upper().strip()
+                if symbol:
+                    entries[symbol] = {
+                        'symbol': symbol,
+                        'name': (row.get('name') or '').strip(),
+                        'exchange': (row.get('exchange') or '').strip(),
+                    }
+    except FileNotFoundError:
+        pass
+
+    for symbol, name in MOROCCO_STOCKS.items():
+        entries[symbol] = {'symbol': symbol, 'name': name, 'exchange': MOROCCO_EXCHANGE}
+
+    return list(entries.values())
+
+
+_index: Optional[SymbolIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_symbol_index() -> SymbolIndex:
+    """Return the process-wide symbol index, building it on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SymbolIndex(load_symbol_entries())
+    return _index
+
+
+def search_symbols(query: str, limit: int = 10) -> List[Dict[str, object]]:
+    """Search the bundled symbol universe (see SymbolIndex.search)."""
+    return get_symbol_index().search(query, limit)
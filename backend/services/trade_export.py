@@ -0,0 +1,85 @@
+"""
+Trade Ledger Export
+Streams trade ledgers as CSV or NDJSON without materializing them:
+rows are read through a server-side cursor (yield_per) as plain column
+tuples and encoded chunk by chunk, so memory stays flat whatever the
+ledger size. Rows are ordered by (challenge_id, created_at, id).
+"""
+import csv
+import io
+from typing import Iterator, List, Optional
+
+from extensions import db
+from models import Challenge, Trade
+from utils.json_provider import dumps_bytes
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Rows fetched per round trip and encoded per yielded chunk
+EXPORT_CHUNK_SIZE = 1000
+
+
+def _ledger_rows(challenge_ids: Optional[List[int]], status: Optional[str]) -> Iterator[tuple]:
+    query = db.session.query(*Trade.dict_columns())
+    if challenge_ids is not None:
+        query = query.filter(Trade.challenge_id.in_(challenge_ids))
+    if status:
+        query = query.join(Challenge, Challenge.id == Trade.challenge_id).filter(Challenge.status == status)
+    query = query.order_by(Trade.challenge_id.asc(), Trade.created_at.asc(), Trade.id.asc())
+    return iter(query.execution_options(yield_per=EXPORT_CHUNK_SIZE))
+
+
+def _chunks(rows: Iterator[tuple]) -> Iterator[List[tuple]]:
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _csv_stream(rows: Iterator[tuple]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(Trade.DICT_FIELDS)
+    for chunk in _chunks(rows):
+        writer.writerows(
+            tuple(value.isoformat() if hasattr(value, 'isoformat') else value for value in row)
+            for row in chunk
+        )
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode('utf-8')
+
+
+def _ndjson_stream(rows: Iterator[tuple]) -> Iterator[bytes]:
+    for chunk in _chunks(rows):
+        yield b''.join(dumps_bytes(Trade.row_to_dict(row)) + b'\n' for row in chunk)
+
+
+def stream_trade_export(fmt: str, challenge_ids: Optional[List[int]] = None,
+                        status: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Encoded export of a trade ledger (iterate inside an app context, e.g.
+    through stream_with_context).
+
+    Args:
+        fmt: 'csv' or 'ndjson' (see EXPORT_FORMATS)
+        challenge_ids: Only these challenges (default: all)
+        status: Only challenges currently in this status
+
+    Yields:
+        bytes chunks of the document
+    """
+    encode = _csv_stream if fmt == 'csv' else _ndjson_stream
+    try:
+        yield from encode(_ledger_rows(challenge_ids, status))
+    finally:
+        db.session.rollback()  # close the read transaction and its cursor
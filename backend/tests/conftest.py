@@ -0,0 +1,30 @@
+import os
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Before config is imported: the module-level app in app.py must not touch a
+# real database or start background jobs
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+for flag in ('RISK_MONITOR_ENABLED', 'ORDER_TRIGGERS_ENABLED', 'EOD_ROLLOVER_ENABLED',
+             'LEADERBOARD_ENABLED', 'LEADERBOARD_SNAPSHOTS_ENABLED'):
+    os.environ[flag] = 'false'
+
+from app import create_app  # noqa: E402
+from config import Config  # noqa: E402
+from extensions import db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'test.db'}"
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        yield app
+        db.session.remove()
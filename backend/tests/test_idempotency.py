@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+from flask import g
+
+from utils.idempotency import REPLAY_HEADER, clear_idempotency_store, idempotent
+
+calls = []
+
+
+@idempotent
+def _create(amount):
+    calls.append(amount)
+    return {'created': len(calls)}, 201
+
+
+def _post(app, key, body, handler=_create):
+    with app.test_request_context('/api/things', method='POST', json=body, headers={'Idempotency-Key': key}):
+        g.current_user = SimpleNamespace(id=1)
+        return handler(body['amount'])
+
+
+def test_retry_on_another_worker_replays_the_stored_response(app):
+    calls.clear()
+    assert _post(app, 'k1', {'amount': 5}) == ({'created': 1}, 201)
+
+    clear_idempotency_store()  # another worker: nothing cached in its process
+    data, status, headers = _post(app, 'k1', {'amount': 5})
+
+    assert (data, status) == ({'created': 1}, 201)
+    assert headers[REPLAY_HEADER] == 'true'
+    assert calls == [5]
+
+    clear_idempotency_store()
+    assert _post(app, 'k1', {'amount': 6})[1] == 422
+
+
+def test_server_error_releases_the_key(app):
+    @idempotent
+    def failing(amount):
+        calls.append(amount)
+        return {'error': 'Trade failed'}, 500
+
+    calls.clear()
+    assert _post(app, 'k2', {'amount': 1}, failing)[1] == 500
+    clear_idempotency_store()
+    assert _post(app, 'k2', {'amount': 1})[1] == 201
+    assert calls == [1, 1]
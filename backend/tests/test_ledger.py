@@ -0,0 +1,86 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import services.challenge_engine as challenge_engine
+from extensions import db
+from models import Challenge, ChallengeDailyBalance, Position, Trade, User
+from services.ledger import amend_trade, delete_trade
+
+TRADES = [
+    ('AAPL', 'buy', 10, 100),
+    ('AAPL', 'sell', 4, 110),
+    ('TSLA', 'sell', 5, 200),
+    ('AAPL', 'sell', 8, 105),
+    ('TSLA', 'buy', 5, 190),
+    ('AAPL', 'buy', 2, 95),
+    ('BTC', 'buy', 1, 1000),
+]
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='trader', email='trader@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def _build(monkeypatch, user, entries):
+    """A challenge with `entries` ((created_at, (symbol, action, quantity, price))) executed in order."""
+    challenge = Challenge(
+        user_id=user.id, plan_type='starter', starting_balance=100000, current_balance=100000,
+        status='active', profit_target_percent=90, max_total_loss_percent=90, max_daily_loss_percent=90,
+    )
+    db.session.add(challenge)
+    db.session.commit()
+
+    real_datetime = challenge_engine.datetime
+    for created_at, (symbol, action, quantity, price) in entries:
+        class FrozenDatetime(real_datetime):
+            @classmethod
+            def utcnow(cls, _now=created_at):
+                return _now
+
+        monkeypatch.setattr(challenge_engine, 'datetime', FrozenDatetime)
+        result = challenge_engine.execute_trade(challenge.id, symbol, action, quantity, price)
+        assert 'error' not in result, result
+    monkeypatch.setattr(challenge_engine, 'datetime', real_datetime)
+    return challenge.id
+
+
+def _ledger_state(challenge_id):
+    db.session.expire_all()
+    challenge = db.session.get(Challenge, challenge_id)
+    trades = [
+        (t.symbol, t.action, t.quantity, t.price, t.balance_after_trade, t.profit_loss)
+        for t in Trade.query.filter_by(challenge_id=challenge_id).order_by(Trade.created_at, Trade.id)
+    ]
+    positions = sorted(
+        (p.symbol, round(p.quantity, 6), round(p.avg_cost, 6), p.realized_pnl, p.opened_at)
+        for p in Position.query.filter_by(challenge_id=challenge_id)
+    )
+    rollups = [
+        (b.day, b.open_balance, b.high_balance, b.low_balance, b.close_balance, b.trade_count, b.volume)
+        for b in ChallengeDailyBalance.query.filter_by(challenge_id=challenge_id).order_by(ChallengeDailyBalance.day)
+    ]
+    return challenge.current_balance, trades, positions, rollups
+
+
+def test_delete_and_amend_match_a_full_replay(monkeypatch, user):
+    start = datetime.utcnow() - timedelta(days=3)
+    times = [start + timedelta(hours=10 * i) for i in range(len(TRADES))]
+    challenge_id = _build(monkeypatch, user, list(zip(times, TRADES)))
+    trade_ids = [t.id for t in Trade.query.filter_by(challenge_id=challenge_id).order_by(Trade.id)]
+
+    assert 'error' not in delete_trade(trade_ids[1])
+    amended = amend_trade(trade_ids[3], quantity=6, price=104)
+    assert 'error' not in amended
+    edited = _ledger_state(challenge_id)
+
+    replayed_trades = list(TRADES)
+    replayed_trades[3] = ('AAPL', 'sell', 6, 104)
+    replay_id = _build(monkeypatch, user, [entry for i, entry in enumerate(zip(times, replayed_trades)) if i != 1])
+
+    assert edited == _ledger_state(replay_id)
+    assert amended['current_balance'] == edited[0]
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from extensions import db
+from models import Challenge, ChallengeDailyBalance, Position, User
+from services.risk_monitor import RiskMonitor
+
+
+@pytest.fixture
+def challenge(app):
+    """10,000 cash plus 900 AAPL bought at 100 before today (starting balance 100,000)."""
+    user = User(username='trader', email='trader@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    challenge = Challenge(
+        user_id=user.id, plan_type='starter', starting_balance=100000, current_balance=10000, status='active',
+        max_daily_loss_percent=5, max_total_loss_percent=10, profit_target_percent=10,
+    )
+    db.session.add(challenge)
+    db.session.commit()
+    db.session.add(Position(challenge_id=challenge.id, symbol='AAPL', quantity=900, avg_cost=100,
+                            opened_at=datetime.utcnow() - timedelta(days=1)))
+    db.session.add(ChallengeDailyBalance(
+        challenge_id=challenge.id, day=datetime.utcnow().date(), open_balance=10000, high_balance=10000,
+        low_balance=10000, close_balance=10000, trade_count=0, volume=0,
+    ))
+    db.session.commit()
+    return challenge
+
+
+def _monitor(app, price):
+    monitor = RiskMonitor(app)
+    monitor.load()
+    monitor.on_price('AAPL', price)
+    return monitor
+
+
+def test_carried_losses_are_not_daily_losses_after_a_reload(app, challenge):
+    # AAPL fell to 94 before today and does not move today: equity 94,600,
+    # no daily loss, total loss 5.4% (under the 10% limit)
+    result = _monitor(app, 94.0).check()
+
+    assert result['failed_daily'] == 0
+    assert result['failed_total'] == 0
+    db.session.expire_all()
+    assert db.session.get(Challenge, challenge.id).status == 'active'
+
+
+def test_stored_opening_mark_is_the_daily_baseline(app, challenge):
+    ChallengeDailyBalance.query.filter_by(challenge_id=challenge.id).update({'open_equity': 100000})
+    db.session.commit()
+
+    result = _monitor(app, 94.0).check()
+
+    assert result['failed_daily'] == 1
+    db.session.expire_all()
+    assert db.session.get(Challenge, challenge.id).failure_reason == 'max_daily_loss'
+
+
+def test_day_rollover_stores_the_opening_mark(app, challenge):
+    monitor = _monitor(app, 94.0)
+    monitor._day = datetime.utcnow().date() - timedelta(days=1)  # running since yesterday
+
+    assert monitor.check()['failed_daily'] == 0
+    db.session.expire_all()
+    snapshot = ChallengeDailyBalance.query.filter_by(challenge_id=challenge.id).one()
+    assert snapshot.open_equity == pytest.approx(94600)
+
+    # A restart keeps the baseline
+    monitor = _monitor(app, 94.0 * 0.94)
+    assert monitor.check()['failed_daily'] == 1
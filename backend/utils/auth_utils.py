@@ -5,6 +5,7 @@ from functools import wraps
 from flask import request, jsonify, current_app, g
 from extensions import db
 from models import User
+from utils.timing import stage
 
 # Generate a secret key using secrets module (or use from config)
 def get_jwt_secret():
@@ -101,21 +102,22 @@ def token_required(f):
                 'message': 'Authorization token is required'
             }), 401
         
-        # Verify token
-        payload = verify_token(token)
-        if not payload:
-            return jsonify({
-                'error': 'Token is invalid or expired',
-                'message': 'Please login again'
-            }), 401
+        with stage('auth'):
+            # Verify token
+            payload = verify_token(token)
+            if not payload:
+                return jsonify({
+                    'error': 'Token is invalid or expired',
+                    'message': 'Please login again'
+                }), 401
         
-        # Get user from database
-        user = User.query.get(payload.get('user_id'))
-        if not user:
-            return jsonify({
-                'error': 'User not found',
-                'message': 'Token is invalid'
-            }), 401
+            # Get user from database
+            user = User.query.get(payload.get('user_id'))
+            if not user:
+                return jsonify({
+                    'error': 'User not found',
+                    'message': 'Token is invalid'
+                }), 401
         
         # Store user in Flask's g object for access in the route
         g.current_user = user
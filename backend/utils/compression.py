@@ -0,0 +1,147 @@
+"""
+Response Compression
+Opt-in gzip/brotli compression for large JSON payloads (history series,
+admin listings, trade histories).
+Compressed bodies are kept in a small LRU cache keyed by a digest of the
+uncompressed payload, so repeated hits on cached data are not compressed again.
+"""
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional
+    brotli = None
+
+
+# ============ CACHE CONFIGURATION ============
+# Compressed payloads keyed by (encoding, level, sha1 of body)
+_compressed_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _negotiate_encoding(accept_encoding: str) -> Optional[str]:
+    """Pick the best supported encoding from an Accept-Encoding header."""
+    accepted = {}
+    for part in accept_encoding.split(','):
+        token, _, params = part.strip().partition(';')
+        token = token.strip().lower()
+        if not token:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[token] = quality
+
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+def _compress(data: bytes, encoding: str, level: int) -> bytes:
+    """Compress raw bytes with the given encoding."""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+
+def _get_compressed(data: bytes, encoding: str, level: int, cache_size: int) -> Tuple[bytes, bool]:
+    """
+    Return compressed bytes for a payload, reusing a cached copy when the same
+    payload was already compressed.
+
+    Returns:
+        Tuple of (compressed bytes, whether the result came from cache)
+    """
+    cache_key = (encoding, level, hashlib.sha1(data).digest())
+    with _cache_lock:
+        cached = _compressed_cache.get(cache_key)
+        if cached is not None:
+            _compressed_cache.move_to_end(cache_key)
+            return cached, True
+
+    compressed = _compress(data, encoding, level)
+
+    if cache_size > 0:
+        with _cache_lock:
+            _compressed_cache[cache_key] = compressed
+            while len(_compressed_cache) > cache_size:
+                _compressed_cache.popitem(last=False)
+    return compressed, False
+
+
+def clear_compression_cache() -> None:
+    """Clear all cached compressed payloads."""
+    with _cache_lock:
+        _compressed_cache.clear()
+
+
+def get_compression_stats() -> dict:
+    """Get compression cache statistics for monitoring."""
+    with _cache_lock:
+        return {
+            'cached_payloads': len(_compressed_cache),
+            'cached_bytes': sum(len(v) for v in _compressed_cache.values()),
+            'brotli_available': brotli is not None,
+        }
+
+
+def init_compression(app) -> None:
+    """
+    Register an after_request hook that compresses eligible responses.
+
+    Controlled by the app config:
+        COMPRESS_ENABLED: turn compression on (default: False)
+        COMPRESS_MIN_SIZE: minimum body size in bytes to compress
+        COMPRESS_LEVEL: gzip level (1-9)
+        COMPRESS_BROTLI_LEVEL: brotli quality (0-11)
+        COMPRESS_MIMETYPES: content types eligible for compression
+        COMPRESS_CACHE_SIZE: number of compressed payloads kept in memory
+    """
+    if not app.config.get('COMPRESS_ENABLED'):
+        return
+
+    min_size = app.config.get('COMPRESS_MIN_SIZE', 1024)
+    gzip_level = app.config.get('COMPRESS_LEVEL', 6)
+    brotli_level = app.config.get('COMPRESS_BROTLI_LEVEL', 4)
+    mimetypes = set(app.config.get('COMPRESS_MIMETYPES', ['application/json']))
+    cache_size = app.config.get('COMPRESS_CACHE_SIZE', 256)
+
+    @app.after_request
+    def compress_response(response):
+        # Skip streamed, non-success and already encoded responses
+        if response.direct_passthrough or response.is_streamed:
+            return response
+        if response.status_code < 200 or response.status_code >= 300:
+            return response
+        if response.mimetype not in mimetypes or 'Content-Encoding' in response.headers:
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        encoding = _negotiate_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+
+        level = brotli_level if encoding == 'br' else gzip_level
+        compressed, _ = _get_compressed(data, encoding, level, cache_size)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(compressed))
+        return response
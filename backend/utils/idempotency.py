@@ -0,0 +1,251 @@
+"""
+Idempotency Keys
+Replays the stored response when a client retries a non-idempotent request
+with the same Idempotency-Key header, instead of running it again.
+- Keys are scoped per user and endpoint and expire after IDEMPOTENCY_TTL_SECONDS
+- A retry that arrives while the first request is still running waits for
+  its result (up to IDEMPOTENCY_WAIT_SECONDS), then gets 409 if still running
+- Reusing a key with a different request body is rejected with 422
+- Only 2xx/4xx responses are stored; after a 5xx the request may be retried
+
+Keys are claimed in the idempotency_keys table (unique per user, endpoint and
+key, claimed by INSERT), which also holds the stored response, so a retry
+routed to another worker is deduplicated too. Each process keeps the keys it
+has seen in memory as a cache: replays of its own responses and waits on its
+own running requests do not touch the database.
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from functools import wraps
+from typing import Any, Optional, Tuple
+
+from flask import current_app, g, request
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+# How often a retry polls the database for a request running on another worker
+POLL_INTERVAL_SECONDS = 0.1
+
+StoreKey = Tuple[int, str, str]
+Response = Tuple[Any, int, dict]
+
+
+class _Entry:
+    __slots__ = ('fingerprint', 'done', 'response', 'expires_at')
+
+    def __init__(self, fingerprint: str, expires_at: float):
+        self.fingerprint = fingerprint
+        self.done = threading.Event()
+        self.response: Optional[Response] = None
+        self.expires_at = expires_at
+
+
+_entries: 'OrderedDict[StoreKey, _Entry]' = OrderedDict()
+_lock = threading.Lock()
+
+
+def _evict(now: float, max_entries: int) -> None:
+    """Drop expired entries, then the oldest ones beyond max_entries (caller holds the lock)."""
+    for key in [k for k, e in _entries.items() if e.expires_at <= now and e.done.is_set()]:
+        del _entries[key]
+    while len(_entries) > max_entries:
+        _entries.popitem(last=False)
+
+
+def _split_response(rv) -> Response:
+    """Normalize a Flask-RESTful return value to (data, status, headers)."""
+    if isinstance(rv, tuple):
+        data = rv[0]
+        status = rv[1] if len(rv) > 1 else 200
+        headers = dict(rv[2]) if len(rv) > 2 and rv[2] else {}
+        return data, status, headers
+    return rv, 200, {}
+
+
+def clear_idempotency_store() -> None:
+    """Clear this process's cache (the claims in the database are kept)."""
+    with _lock:
+        _entries.clear()
+
+
+# ----------------------------------------------------------------------
+# Shared store (own connection: independent of the request's session)
+# ----------------------------------------------------------------------
+
+def _where(store_key: StoreKey):
+    table = IdempotencyKey.__table__
+    user_id, endpoint, key = store_key
+    return table.c.user_id == user_id, table.c.endpoint == endpoint, table.c.idempotency_key == key
+
+
+def _claim(store_key: StoreKey, fingerprint: str, ttl: float) -> Tuple[bool, Any]:
+    """
+    Claim the key for this request.
+
+    Returns:
+        (True, None) if this request owns the key, else (False, the existing
+        row or None if its owner released it meanwhile)
+    """
+    table = IdempotencyKey.__table__
+    user_id, endpoint, key = store_key
+    now = datetime.utcnow()
+    try:
+        with db.engine.begin() as conn:
+            # Expired keys of the user go first (also frees this key if it expired)
+            conn.execute(table.delete().where(table.c.user_id == user_id, table.c.expires_at <= now))
+            conn.execute(table.insert().values(
+                user_id=user_id, endpoint=endpoint, idempotency_key=key, fingerprint=fingerprint,
+                status='running', created_at=now, expires_at=now + timedelta(seconds=ttl),
+            ))
+        return True, None
+    except IntegrityError:
+        with db.engine.connect() as conn:
+            return False, conn.execute(select(table).where(*_where(store_key))).first()
+
+
+def _wait_stored(store_key: StoreKey, wait: float):
+    """Poll until the request of another worker stores its response; the row, or None."""
+    table = IdempotencyKey.__table__
+    deadline = time.monotonic() + wait
+    while True:
+        with db.engine.connect() as conn:
+            row = conn.execute(select(table).where(*_where(store_key))).first()
+        if row is None or row.status == 'done' or time.monotonic() >= deadline:
+            return row
+        time.sleep(POLL_INTERVAL_SECONDS)
+
+
+def _store(store_key: StoreKey, response: Optional[Response], ttl: float) -> None:
+    """Record the response of the owning request, or release the key after a failure."""
+    table = IdempotencyKey.__table__
+    with db.engine.begin() as conn:
+        if response is None:
+            conn.execute(table.delete().where(*_where(store_key)))
+            return
+        data, status, headers = response
+        conn.execute(table.update().where(*_where(store_key)).values(
+            status='done',
+            response_status=status,
+            response_body=json.dumps(data, default=str),
+            response_headers=json.dumps(headers, default=str),
+            expires_at=datetime.utcnow() + timedelta(seconds=ttl),
+        ))
+
+
+def _release(store_key: StoreKey, entry: _Entry) -> None:
+    """Drop this process's entry of a key it does not own (waiters see no response)."""
+    with _lock:
+        if _entries.get(store_key) is entry:
+            del _entries[store_key]
+    entry.done.set()
+
+
+def _row_response(row) -> Response:
+    return json.loads(row.response_body), row.response_status, json.loads(row.response_headers or '{}')
+
+
+def _in_progress():
+    return {'error': 'Request in progress', 'message': 'A request with this Idempotency-Key is still being processed'}, 409
+
+
+def _key_reused():
+    return {'error': 'Idempotency-Key reused', 'message': 'This key was already used with a different request'}, 422
+
+
+def _replay(response: Response):
+    data, status, headers = response
+    return data, status, {**headers, REPLAY_HEADER: 'true'}
+
+
+def idempotent(f):
+    """
+    Decorator for Flask-RESTful methods that honours the Idempotency-Key header.
+    Must run after authentication (g.current_user is part of the key).
+    Requests without the header run normally.
+    """
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        idempotency_key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not idempotency_key:
+            return f(*args, **kwargs)
+        if len(idempotency_key) > MAX_KEY_LENGTH:
+            return {'error': 'Invalid Idempotency-Key', 'message': f'Key must be at most {MAX_KEY_LENGTH} characters'}, 400
+
+        config = current_app.config
+        ttl = config.get('IDEMPOTENCY_TTL_SECONDS', 3600)
+        wait = config.get('IDEMPOTENCY_WAIT_SECONDS', 10)
+        user = getattr(g, 'current_user', None)
+        store_key = (getattr(user, 'id', None) or 0, request.path, idempotency_key)
+        fingerprint = hashlib.sha256(request.get_data()).hexdigest()
+
+        # Cache: keys this process has seen
+        now = time.monotonic()
+        with _lock:
+            entry = _entries.get(store_key)
+            if entry is not None and entry.done.is_set() and entry.expires_at <= now:
+                del _entries[store_key]
+                entry = None
+            owner = entry is None
+            if owner:
+                entry = _Entry(fingerprint, now + ttl)
+                _entries[store_key] = entry
+                _evict(now, config.get('IDEMPOTENCY_MAX_ENTRIES', 10000))
+
+        if not owner:
+            if entry.fingerprint != fingerprint:
+                return _key_reused()
+            if not entry.done.wait(wait) or entry.response is None:
+                return _in_progress()
+            return _replay(entry.response)
+
+        # Shared store: another worker may own the key
+        try:
+            claimed, row = _claim(store_key, fingerprint, ttl)
+            if not claimed and row is not None and row.fingerprint == fingerprint and row.status != 'done':
+                row = _wait_stored(store_key, wait)
+        except Exception:
+            _release(store_key, entry)
+            raise
+        if not claimed:
+            if row is not None and row.fingerprint != fingerprint:
+                _release(store_key, entry)
+                return _key_reused()
+            if row is None or row.status != 'done':
+                _release(store_key, entry)
+                return _in_progress()
+            entry.response = _row_response(row)
+            entry.done.set()
+            return _replay(entry.response)
+
+        response = None
+        try:
+            rv = f(*args, **kwargs)
+            data, status, headers = _split_response(rv)
+            if status < 500:
+                response = (data, status, headers)
+            return rv
+        finally:
+            try:
+                _store(store_key, response, ttl)
+            finally:
+                with _lock:
+                    if response is None:
+                        # Failed or 5xx: forget the key so the client can retry
+                        _entries.pop(store_key, None)
+                    else:
+                        entry.response = response
+                        entry.expires_at = time.monotonic() + ttl
+                entry.done.set()
+
+    return decorated
@@ -0,0 +1,86 @@
+"""
+JSON Serialization
+Fast JSON encoding for Flask (jsonify) and Flask-RESTful responses.
+Uses orjson when it is installed and falls back to the stdlib json module.
+Datetimes are encoded as ISO 8601 strings in both cases, so models can return
+datetime objects from to_dict() directly.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+
+from flask import current_app, make_response
+from flask.json.provider import DefaultJSONProvider
+
+from utils.timing import stage
+
+try:
+    import orjson
+except ImportError:  # orjson is optional
+    orjson = None
+
+if orjson is not None:
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+
+def _default(obj: Any) -> Any:
+    """Encode types the JSON encoders do not support natively."""
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, Decimal):
+        return float(obj)
+    # NumPy scalars and arrays (stdlib fallback only; orjson handles them)
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def dumps_bytes(obj: Any, pretty: bool = False) -> bytes:
+    """
+    Serialize an object to UTF-8 encoded JSON bytes.
+
+    Args:
+        obj: Object to serialize
+        pretty: Indent the output (for debug responses)
+
+    Returns:
+        bytes: JSON document
+    """
+    if orjson is not None:
+        option = _ORJSON_OPTIONS | orjson.OPT_INDENT_2 if pretty else _ORJSON_OPTIONS
+        return orjson.dumps(obj, default=_default, option=option)
+    if pretty:
+        return json.dumps(obj, default=_default, indent=2, ensure_ascii=False).encode('utf-8')
+    return json.dumps(obj, default=_default, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson when available."""
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if kwargs or orjson is None:
+            kwargs.setdefault('default', _default)
+            kwargs.setdefault('ensure_ascii', False)
+            return json.dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS).decode('utf-8')
+
+    def loads(self, s, **kwargs: Any) -> Any:
+        if kwargs or orjson is None:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args: Any, **kwargs: Any):
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = self.compact is False or (self.compact is None and self._app.debug)
+        return self._app.response_class(dumps_bytes(obj, pretty=pretty), mimetype=self.mimetype)
+
+
+def output_json(data: Any, code: int, headers=None):
+    """Flask-RESTful representation for application/json using the fast encoder."""
+    with stage('serialize'):
+        body = dumps_bytes(data, pretty=current_app.debug)
+    resp = make_response(body, code)
+    resp.headers.extend(headers or {})
+    resp.headers['Content-Type'] = 'application/json'
+    return resp
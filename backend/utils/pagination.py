@@ -0,0 +1,97 @@
+"""
+Keyset Pagination
+Cursor-based paging over (created_at, id) in descending order.
+Each page is a range scan starting right after the previous page's last row,
+so page 500 costs the same as page 1 (no OFFSET).
+Cursors are opaque to clients: base64url("<created_at ISO>|<id>").
+Rank cursors (in-memory leaderboards) use the same encoding of "<score>|<id>".
+"""
+import base64
+import math
+from datetime import datetime
+from typing import Any, Callable, List, Optional, Tuple
+
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+Cursor = Tuple[datetime, int]
+
+
+def _encode(head: str, row_id: int) -> str:
+    raw = f'{head}|{row_id}'.encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode(cursor: str) -> Tuple[str, int]:
+    padded = cursor + '=' * (-len(cursor) % 4)
+    head, _, row_id = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8').partition('|')
+    return head, int(row_id)
+
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    return _encode(created_at.isoformat(), row_id)
+
+
+def decode_cursor(cursor: str) -> Cursor:
+    """Decode a cursor (raises ValueError if it is malformed)."""
+    try:
+        created_at, row_id = _decode(cursor)
+        return datetime.fromisoformat(created_at), row_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def encode_rank_cursor(score: float, row_id: int) -> str:
+    # repr() round-trips floats exactly, so the next page starts at the exact key
+    return _encode(repr(score), row_id)
+
+
+def decode_rank_cursor(cursor: str) -> Tuple[float, int]:
+    """Decode a rank cursor (raises ValueError if it is malformed)."""
+    try:
+        score, row_id = _decode(cursor)
+        if not math.isfinite(float(score)):
+            raise ValueError(score)
+        return float(score), row_id
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(args) -> Tuple[int, Optional[Cursor]]:
+    """
+    Read `limit` and `cursor` from request args.
+
+    Returns:
+        Tuple of (limit, decoded cursor or None); raises ValueError on bad input
+    """
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or limit < 1:
+        raise ValueError('limit must be a positive integer')
+    cursor = args.get('cursor')
+    return min(limit, MAX_PAGE_SIZE), decode_cursor(cursor) if cursor else None
+
+
+def keyset_page(query, created_col, id_col, limit: int, cursor: Optional[Cursor],
+                key: Callable[[Any], Cursor] = lambda row: (row.created_at, row.id)) -> Tuple[List[Any], Optional[str]]:
+    """
+    Fetch one page of a query, newest first.
+
+    Args:
+        query: SQLAlchemy query (ORM entities or column tuples)
+        created_col, id_col: Columns of the (created_at, id) sort key
+        limit: Page size
+        cursor: Decoded cursor of the previous page's last row
+        key: Extracts (created_at, id) from a result row
+
+    Returns:
+        Tuple of (rows, next_cursor); next_cursor is None on the last page
+    """
+    if cursor is not None:
+        query = query.filter(tuple_(created_col, id_col) < tuple_(*cursor))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(*key(rows[-1]))
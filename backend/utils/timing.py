@@ -0,0 +1,168 @@
+"""
+Request Stage Timing
+Per-stage latency for hot request paths (auth, price lookup, DB write,
+rule check, serialization).
+- Code marks stages with `with stage('db'):`; nothing is recorded outside a request
+- With SERVER_TIMING_ENABLED (off by default), responses carry the stages in
+  a Server-Timing header, readable cross-origin only by CORS_ORIGINS
+- Every stage is folded into a fixed-bucket histogram per endpoint, readable
+  from the admin API (GET /api/admin/latency)
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from flask import g, has_request_context, request
+
+# Histogram bucket upper bounds in milliseconds (last bucket is unbounded)
+BUCKET_BOUNDS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class _Histogram:
+    __slots__ = ('counts', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, value_ms: float) -> None:
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, value_ms)] += 1
+        self.count += 1
+        self.total += value_ms
+        if value_ms > self.max:
+            self.max = value_ms
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile."""
+        if not self.count:
+            return 0.0
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return BUCKET_BOUNDS_MS[i] if i < len(BUCKET_BOUNDS_MS) else self.max
+        return self.max
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else 0.0,
+            'p50_ms': self.percentile(50),
+            'p90_ms': self.percentile(90),
+            'p99_ms': self.percentile(99),
+            'max_ms': round(self.max, 3),
+            'buckets': {
+                (f'le_{bound}' if i < len(BUCKET_BOUNDS_MS) else 'inf'): n
+                for i, (bound, n) in enumerate(zip(BUCKET_BOUNDS_MS + (None,), self.counts))
+                if n
+            },
+        }
+
+
+# endpoint -> stage -> histogram
+_histograms: Dict[str, Dict[str, _Histogram]] = {}
+_lock = threading.Lock()
+
+
+class _Stage:
+    __slots__ = ('name', 'desc')
+
+    def __init__(self, name: str, desc: Optional[str]):
+        self.name = name
+        self.desc = desc
+
+
+@contextmanager
+def stage(name: str, desc: Optional[str] = None):
+    """
+    Time a block as a named stage of the current request.
+    The yielded object's `desc` can be set inside the block (e.g. the price source
+    once it is known); it is shown in Server-Timing and splits the histogram.
+    """
+    if not has_request_context():
+        yield _Stage(name, desc)
+        return
+    marker = _Stage(name, desc)
+    started = time.perf_counter()
+    try:
+        yield marker
+    finally:
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        timings = g.setdefault('_stage_timings', [])
+        timings.append((marker.name, marker.desc, elapsed_ms))
+
+
+def _merge_stages(timings: List[tuple]) -> Dict[tuple, float]:
+    """Sum repeated stages (e.g. two DB round trips) keeping first-seen order."""
+    merged: Dict[tuple, float] = {}
+    for name, desc, elapsed_ms in timings:
+        merged[(name, desc)] = merged.get((name, desc), 0.0) + elapsed_ms
+    return merged
+
+
+def record(endpoint: str, stage_name: str, elapsed_ms: float) -> None:
+    with _lock:
+        stages = _histograms.setdefault(endpoint, {})
+        histogram = stages.get(stage_name)
+        if histogram is None:
+            histogram = stages[stage_name] = _Histogram()
+        histogram.add(elapsed_ms)
+
+
+def get_stage_histograms(endpoint: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+    """Histograms per endpoint and stage (optionally for one endpoint)."""
+    with _lock:
+        return {
+            name: {stage_name: h.to_dict() for stage_name, h in stages.items()}
+            for name, stages in _histograms.items()
+            if endpoint is None or name == endpoint
+        }
+
+
+def reset_stage_histograms() -> None:
+    with _lock:
+        _histograms.clear()
+
+
+def init_timing(app) -> None:
+    """Register the hooks that emit Server-Timing and collect histograms."""
+
+    @app.before_request
+    def _start_request_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _emit_server_timing(response):
+        timings = g.pop('_stage_timings', None)
+        started = g.pop('_request_started', None)
+        if not timings or started is None:
+            return response
+
+        total_ms = (time.perf_counter() - started) * 1000
+        endpoint = request.endpoint or request.path
+        merged = _merge_stages(timings)
+
+        for (name, desc), elapsed_ms in merged.items():
+            record(endpoint, f'{name}:{desc}' if desc else name, elapsed_ms)
+        record(endpoint, 'total', total_ms)
+
+        if app.config.get('SERVER_TIMING_ENABLED', False):
+            parts = []
+            for (name, desc), elapsed_ms in merged.items():
+                part = f'{name};dur={elapsed_ms:.2f}'
+                if desc:
+                    part += f';desc="{desc}"'
+                parts.append(part)
+            parts.append(f'total;dur={total_ms:.2f}')
+            response.headers['Server-Timing'] = ', '.join(parts)
+            # Expose the timings to our own frontends only (never a wildcard)
+            origin = request.headers.get('Origin')
+            if origin and origin in app.config.get('CORS_ORIGINS', ()):
+                response.headers['Timing-Allow-Origin'] = origin
+                response.vary.add('Origin')
+        return response
@@ -4,6 +4,13 @@
 -- Development: SQLite | Production: PostgreSQL
 
 -- Drop existing tables (order matters due to foreign key constraints)
+DROP TABLE IF EXISTS leaderboard_snapshot_months CASCADE;
+DROP TABLE IF EXISTS leaderboard_snapshots CASCADE;
+DROP TABLE IF EXISTS idempotency_keys CASCADE;
+DROP TABLE IF EXISTS job_runs CASCADE;
+DROP TABLE IF EXISTS orders CASCADE;
+DROP TABLE IF EXISTS positions CASCADE;
+DROP TABLE IF EXISTS challenge_daily_balances CASCADE;
 DROP TABLE IF EXISTS payments CASCADE;
 DROP TABLE IF EXISTS trades CASCADE;
 DROP TABLE IF EXISTS portfolio CASCADE;
@@ -73,6 +80,106 @@ CREATE TABLE portfolio (
     last_updated TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Create Positions table (per-challenge holdings with average cost)
+CREATE TABLE positions (
+    id SERIAL PRIMARY KEY,
+    challenge_id INTEGER NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    symbol VARCHAR(20) NOT NULL,
+    quantity FLOAT NOT NULL DEFAULT 0.0,
+    avg_cost FLOAT NOT NULL DEFAULT 0.0,
+    realized_pnl FLOAT NOT NULL DEFAULT 0.0,
+    opened_at TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_positions_challenge_symbol UNIQUE (challenge_id, symbol)
+);
+
+-- Create Leaderboard snapshots table (final monthly rankings, frozen when the month closes)
+CREATE TABLE leaderboard_snapshots (
+    id SERIAL PRIMARY KEY,
+    month DATE NOT NULL,
+    rank INTEGER NOT NULL,
+    challenge_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    username VARCHAR(80),
+    plan_type VARCHAR(20) NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    starting_balance FLOAT NOT NULL,
+    current_balance FLOAT NOT NULL,
+    profit_percent FLOAT NOT NULL,
+    frozen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_leaderboard_snapshots_month_rank UNIQUE (month, rank)
+);
+
+-- Create Leaderboard snapshot months table (one row per frozen month, even an empty one)
+CREATE TABLE leaderboard_snapshot_months (
+    id SERIAL PRIMARY KEY,
+    month DATE UNIQUE NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0,
+    frozen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create Job runs table (one row per scheduled job run, claimed by one worker)
+CREATE TABLE job_runs (
+    id SERIAL PRIMARY KEY,
+    job_name VARCHAR(50) NOT NULL,
+    run_key VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    details TEXT,
+    CONSTRAINT uq_job_runs_job_run_key UNIQUE (job_name, run_key)
+);
+
+-- Create Idempotency keys table (claimed request keys and their stored responses)
+CREATE TABLE idempotency_keys (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    endpoint VARCHAR(255) NOT NULL,
+    idempotency_key VARCHAR(255) NOT NULL,
+    fingerprint VARCHAR(64) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'running',
+    response_status INTEGER,
+    response_body TEXT,
+    response_headers TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    expires_at TIMESTAMP NOT NULL,
+    CONSTRAINT uq_idempotency_keys_user_endpoint_key UNIQUE (user_id, endpoint, idempotency_key)
+);
+
+-- Create Orders table (resting limit / stop / take-profit orders)
+CREATE TABLE orders (
+    id SERIAL PRIMARY KEY,
+    challenge_id INTEGER NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    symbol VARCHAR(20) NOT NULL,
+    action VARCHAR(10) NOT NULL,
+    order_type VARCHAR(20) NOT NULL,
+    quantity FLOAT NOT NULL,
+    trigger_price FLOAT NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    trade_id INTEGER REFERENCES trades(id) ON DELETE SET NULL,
+    fill_price FLOAT,
+    reject_reason VARCHAR(255),
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    triggered_at TIMESTAMP,
+    closed_at TIMESTAMP
+);
+
+-- Create Challenge daily balances table (day-open snapshots for rule checks)
+CREATE TABLE challenge_daily_balances (
+    id SERIAL PRIMARY KEY,
+    challenge_id INTEGER NOT NULL REFERENCES challenges(id) ON DELETE CASCADE,
+    day DATE NOT NULL,
+    open_balance FLOAT NOT NULL,
+    high_balance FLOAT NOT NULL,
+    low_balance FLOAT NOT NULL,
+    close_balance FLOAT NOT NULL,
+    trade_count INTEGER NOT NULL DEFAULT 0,
+    volume FLOAT NOT NULL DEFAULT 0,
+    open_equity FLOAT,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_challenge_daily_balances_challenge_day UNIQUE (challenge_id, day)
+);
+
 -- Insert data into users
 INSERT INTO users (id, username, email, password_hash, created_at, is_admin, is_superadmin) VALUES (1, 'trader1', 'trader1@tradesense.ai', 'scrypt:32768:8:1$uZzIgIwaXArpQjHG$3b503ec4305e5fd024f148e6bcb1bf1823cdc4ae34c1d106e10259aaa57ee72ef376ac927ebf90c93e494385557dd57bdd01552a115e05a332f8a413311dbfd8', '2026-01-19 12:13:19.499653', FALSE, FALSE);
 INSERT INTO users (id, username, email, password_hash, created_at, is_admin, is_superadmin) VALUES (2, 'trader2', 'trader2@tradesense.ai', 'scrypt:32768:8:1$ozMIgBqMhzbmrunM$7da0bdc5fbf6af426b3df274ce60f96cd979cdd2e690dbab10257574d9394d68fe11f84e0dcf3f30642929ffaa0587b6be46dd9ea51e42303cb1a6a2dc321080', '2026-01-19 12:13:19.499661', FALSE, FALSE);
@@ -135,10 +242,16 @@ CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_challenges_user_id ON challenges(user_id);
 CREATE INDEX IF NOT EXISTS idx_challenges_status ON challenges(status);
+CREATE INDEX IF NOT EXISTS ix_challenges_created_at_status ON challenges(created_at, status);
 CREATE INDEX IF NOT EXISTS idx_trades_challenge_id ON trades(challenge_id);
 CREATE INDEX IF NOT EXISTS idx_trades_symbol ON trades(symbol);
 CREATE INDEX IF NOT EXISTS idx_trades_created_at ON trades(created_at);
+CREATE INDEX IF NOT EXISTS ix_trades_challenge_id_created_at_id ON trades(challenge_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_payments_user_id ON payments(user_id);
 CREATE INDEX IF NOT EXISTS idx_payments_status ON payments(status);
+CREATE INDEX IF NOT EXISTS idx_positions_challenge_id ON positions(challenge_id);
+CREATE INDEX IF NOT EXISTS idx_orders_challenge_id ON orders(challenge_id);
+CREATE INDEX IF NOT EXISTS ix_orders_status_symbol ON orders(status, symbol);
+CREATE INDEX IF NOT EXISTS idx_challenge_daily_balances_challenge_id ON challenge_daily_balances(challenge_id);
 
 -- Database export completed successfully
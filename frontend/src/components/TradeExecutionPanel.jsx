@@ -1,4 +1,4 @@
-import { useState, useEffect, useCallback } from "react";
+import { useState, useEffect, useCallback, useRef } from "react";
 import { tradesService } from "../services/trades";
 
 /**
@@ -36,6 +36,11 @@ const TradeExecutionPanel = ({
   const [showConfirmation, setShowConfirmation] = useState(false);
   const [pendingTrade, setPendingTrade] = useState(null);
 
+  // One Idempotency-Key per order intent (challenge, symbol, side, quantity):
+  // a double click or a retry after a network error/5xx resends the same key,
+  // so the server executes the order once. Dropped after a definitive answer.
+  const intentRef = useRef(null);
+
   // Calculate total value
   const price =
     orderType === "limit" && limitPrice ? parseFloat(limitPrice) : currentPrice;
@@ -96,13 +101,20 @@ const TradeExecutionPanel = ({
       setExecutingSide(side);
       setMessage({ type: "", text: "" });
 
+      const intent = `${challengeId}|${symbol}|${side}|${qty}`;
+      if (intentRef.current?.intent !== intent) {
+        intentRef.current = { intent, key: crypto.randomUUID() };
+      }
+
       try {
         const response = await tradesService.executeTrade(
           challengeId,
           symbol,
           side,
           qty,
+          intentRef.current.key,
         );
+        intentRef.current = null;
 
         // Success message
         const executedPrice = response.price_info?.price_used || price;
@@ -148,6 +160,12 @@ const TradeExecutionPanel = ({
           });
         }
       } catch (error) {
+        // Keep the key for retries unless the server gave a final answer
+        // (4xx other than 409 "still running")
+        const status = error.response?.status;
+        if (status && status < 500 && status !== 409) {
+          intentRef.current = null;
+        }
         const errorMessage =
           error.response?.data?.message ||
           error.message ||
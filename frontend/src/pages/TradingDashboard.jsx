@@ -89,6 +89,8 @@ const TradingDashboard = () => {
   const [searchTerm, setSearchTerm] = useState("");
   const [activeMarket, setActiveMarket] = useState("ALL");
   const [trades, setTrades] = useState([]);
+  const [tradesCount, setTradesCount] = useState(0);
+  const [winRate, setWinRate] = useState(0);
   const [isRefreshing, setIsRefreshing] = useState(false);
   const [chartData, setChartData] = useState([]);
   const [chartLoading, setChartLoading] = useState(false);
@@ -166,8 +168,16 @@ const TradingDashboard = () => {
 
   const fetchTrades = async (challengeId) => {
     try {
-      const response = await tradesService.getTradeHistory(challengeId);
+      // The history is one page; the win rate covers the whole ledger (server-side analytics)
+      const [response, analytics] = await Promise.all([
+        tradesService.getTradeHistory(challengeId),
+        tradesService.getAnalytics(challengeId).catch(() => null),
+      ]);
       setTrades(response.trades || []);
+      setTradesCount(response.summary?.trades_count ?? response.count ?? 0);
+      if (analytics) {
+        setWinRate(analytics.win_rate ?? 0);
+      }
     } catch (err) {
       console.error("Failed to load trades:", err);
     }
@@ -653,20 +663,13 @@ const TradingDashboard = () => {
               <div className="grid grid-cols-2 gap-3">
                 <div className="rounded-lg bg-white/5 p-3 text-center shadow-inner shadow-black/30">
                   <p className="text-2xl font-bold text-primary-300">
-                    {trades.length}
+                    {tradesCount}
                   </p>
                   <p className="text-xs text-gray-300">Total Trades</p>
                 </div>
                 <div className="rounded-lg bg-white/5 p-3 text-center shadow-inner shadow-black/30">
                   <p className="text-2xl font-bold text-green-300">
-                    {trades.length > 0
-                      ? Math.round(
-                          (trades.filter((t) => t.profit > 0).length /
-                            trades.length) *
-                            100,
-                        )
-                      : 0}
-                    %
+                    {Math.round(winRate)}%
                   </p>
                   <p className="text-xs text-gray-300">Win Rate</p>
                 </div>
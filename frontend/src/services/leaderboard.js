@@ -1,8 +1,26 @@
 import api from './api';
 
 export const leaderboardService = {
-  getMonthlyLeaderboard: async () => {
-    const response = await api.get('/leaderboard/monthly');
+  // Omit year/month for the current month; closed months return their frozen ranking
+  getMonthlyLeaderboard: async ({ year, month, limit } = {}) => {
+    const response = await api.get('/leaderboard/monthly', { params: { year, month, limit } });
+    return response.data;
+  },
+
+  // period: 'week' | 'month' | 'all'; plan: 'Starter' | 'Pro' | 'Elite' (omit for all plans).
+  // Pass the previous response's next_cursor to get the following page.
+  getLeaderboard: async ({ period = 'all', plan, limit = 10, cursor, offset } = {}) => {
+    const response = await api.get('/leaderboard', { params: { period, plan, limit, cursor, offset } });
+    return response.data;
+  },
+
+  getTop: async (limit = 10, { period = 'all', plan } = {}) => {
+    const response = await api.get('/leaderboard/top', { params: { limit, period, plan } });
+    return response.data;
+  },
+
+  getUserRanking: async (userId, { period = 'all', plan } = {}) => {
+    const response = await api.get(`/leaderboard/user/${userId}`, { params: { period, plan } });
     return response.data;
   },
 };
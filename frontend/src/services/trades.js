@@ -1,18 +1,49 @@
 import api from './api';
 
 export const tradesService = {
-  executeTrade: async (challengeId, symbol, action, quantity) => {
-    const response = await api.post('/trades/execute', {
-      challenge_id: challengeId,
-      symbol,
-      action,
-      quantity,
+  // idempotencyKey identifies one order intent: create it once per order and pass
+  // the same key on every resubmit/retry of that order so it executes only once
+  executeTrade: async (challengeId, symbol, action, quantity, idempotencyKey) => {
+    const response = await api.post(
+      '/trades/execute',
+      {
+        challenge_id: challengeId,
+        symbol,
+        action,
+        quantity,
+      },
+      idempotencyKey ? { headers: { 'Idempotency-Key': idempotencyKey } } : undefined,
+    );
+    return response.data;
+  },
+
+  // Newest trades first; pass the previous response's next_cursor for the next page
+  getTradeHistory: async (challengeId, { limit, cursor } = {}) => {
+    const response = await api.get(`/trades/history/${challengeId}`, {
+      params: { limit, cursor },
     });
     return response.data;
   },
 
-  getTradeHistory: async (challengeId) => {
-    const response = await api.get(`/trades/history/${challengeId}`);
+  getAnalytics: async (challengeId) => {
+    const response = await api.get(`/trades/analytics/${challengeId}`);
+    return response.data;
+  },
+
+  // resolution: 'day' (daily rollups), 'hour' or 'trade'; from/to: 'YYYY-MM-DD'
+  getEquityCurve: async (challengeId, { resolution = 'day', from, to } = {}) => {
+    const response = await api.get(`/trades/equity/${challengeId}`, {
+      params: { resolution, from, to },
+    });
+    return response.data;
+  },
+
+  // Full ledger download as a Blob (format: 'csv' or 'ndjson')
+  exportTrades: async (challengeId, format = 'csv') => {
+    const response = await api.get(`/trades/export/${challengeId}`, {
+      params: { format },
+      responseType: 'blob',
+    });
     return response.data;
   },
 
@@ -21,8 +52,8 @@ export const tradesService = {
     return response.data;
   },
 
-  getAllTrades: async () => {
-    const response = await api.get('/trades');
+  getAllTrades: async ({ limit, cursor } = {}) => {
+    const response = await api.get('/trades', { params: { limit, cursor } });
     return response.data;
   },
 };